@@ -1,6 +1,15 @@
 import pygame
 import math
 import random
+import os
+import argparse
+import numpy as np
+from vajra_common import snapshot
+from vajra_common.trajectory import TrajectoryRecorder
+from vajra_common.replay import TrajectoryPlayer, KEYS
+from vajra_common.shared_frames import SharedFrameBuffer, RateMeter, Pacer, drain, start_process
+from vajra_common.tiles import TileEngine, pair_blocks, parse_tiles, scale_to
+from vajra_common.sweep import run_headless
 
 # --- Constants & Configuration ---
 SCREEN_WIDTH = 1200
@@ -13,6 +22,20 @@ AGENT_RADIUS = 8
 AGENT_SPEED = 2.0
 PERCEPTION_RADIUS = 50
 MAX_FORCE = 0.1
+ALIGNMENT_WEIGHT = 1.0
+COHESION_WEIGHT = 0.5
+SEPARATION_WEIGHT = 1.5
+
+# Checkpoints: K saves, L loads (.npz = compressed, else a directory of .npy)
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoint_phase1.npz")
+
+# Recording: positions + solid flags per frame to a trajectory file (None = off)
+RECORD_PATH = None
+RECORD_EVERY = 1
+FRAME_CHANNELS = {"pos": (np.float32, (NUM_AGENTS, 2)), "solid": (np.int8, (NUM_AGENTS,))}
+
+# Split mode (--split): physics steps per second in its own process (0 = unthrottled)
+SPLIT_SIM_RATE = 60
 
 # Colors
 COLOR_LIQUID = (240, 240, 255)  # Ghostly White
@@ -73,6 +96,28 @@ def hex_to_pixel(q, r):
 def distance(p1, p2):
     return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
 
+def pixel_to_hex_array(x, y, radius):
+    """
+    pixel_to_hex + hex_round for arrays of points.
+    """
+    q = (math.sqrt(3)/3 * x - 1/3 * y) / radius
+    r = (2/3 * y) / radius
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s) # Half to even, like round()
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > ds) & (dq > dr)
+    fix_r = ~fix_q & ~(ds > dr)
+    rq = np.where(fix_q, -rs - rr, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int32), rr.astype(np.int32)
+
+def hex_to_pixel_array(q, r, radius):
+    return np.stack([radius * (math.sqrt(3) * q + math.sqrt(3)/2 * r), radius * (3./2 * r)], axis=1)
+
+def clamp_length(v, limit):
+    norm = np.hypot(v[:, 0], v[:, 1])[:, None]
+    return np.where(norm > limit, v * (limit / np.where(norm > limit, norm, 1.0)), v)
+
 # --- Agent Class ---
 
 class Agent:
@@ -123,9 +168,9 @@ class Agent:
             separation -= self.vel
 
         # Weights
-        self.acc += alignment * 1.0
-        self.acc += cohesion * 0.5
-        self.acc += separation * 1.5
+        self.acc += alignment * ALIGNMENT_WEIGHT
+        self.acc += cohesion * COHESION_WEIGHT
+        self.acc += separation * SEPARATION_WEIGHT
         
         # Limit Force
         if self.acc.length() > MAX_FORCE:
@@ -194,17 +239,111 @@ class Agent:
             
         pygame.draw.polygon(screen, color, points, 0 if self.is_solid else 1) # Fill if solid, outline if liquid
 
+# --- Tile-Parallel Physics (--tiles) ---
+
+class TiledSwarm:
+    """
+    Agent.update in numpy, stepped by vajra_common.tiles.TileEngine. Every
+    agent sees the others as they were at the end of the last step (instead
+    of half-updated, as in the sequential loop), so the tile layout changes
+    nothing but float rounding.
+    """
+    channels = {"pos": (np.float64, (2,)), "vel": (np.float64, (2,)),
+                "is_solid": (np.bool_, ()), "grid_pos": (np.int32, (2,))}
+    requests_per_agent = 0
+
+    def __init__(self):
+        # Settings are copied here so they reach the tile processes
+        self.bounds = (SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.speed, self.max_force, self.perception = AGENT_SPEED, MAX_FORCE, PERCEPTION_RADIUS
+        self.weights = (ALIGNMENT_WEIGHT, COHESION_WEIGHT, SEPARATION_WEIGHT)
+        self.touch = AGENT_RADIUS * 2.5
+        self.hex_radius = HEX_RADIUS
+        self.radius = max(PERCEPTION_RADIUS, self.touch)
+        self.max_move = AGENT_SPEED + HEX_RADIUS # A move, then the snap to a hex centre
+
+    def step(self, own, cand, cur, nxt, inputs):
+        live = own[~cur["is_solid"][own]]
+        if len(live) == 0:
+            return None
+        pos, vel = cur["pos"][live], cur["vel"][live]
+        others, other_vel = cur["pos"][cand], cur["vel"][cand]
+
+        # 1. BOIDS (alignment, cohesion, separation over the perception radius)
+        w_ali, w_coh, w_sep = self.weights
+        acc = np.zeros_like(pos)
+        for rows in pair_blocks(len(live), len(cand)):
+            dx = pos[rows, 0, None] - others[None, :, 0]
+            dy = pos[rows, 1, None] - others[None, :, 1]
+            d = np.hypot(dx, dy)
+            near = ((d < self.perception) & (live[rows, None] != cand[None])).astype(np.float64)
+            total = near.sum(1)[:, None]
+            count = np.maximum(total, 1.0)
+            weight = near / (d * d + 0.1) # Weight by distance squared
+            alignment = scale_to(near @ other_vel / count, self.speed) - vel[rows]
+            cohesion = scale_to(near @ others / count - pos[rows], self.speed) - vel[rows]
+            separation = pos[rows] * weight.sum(1)[:, None] - weight @ others
+            separation = scale_to(separation / count, self.speed) - vel[rows]
+            acc[rows] = np.where(total > 0, alignment * w_ali + cohesion * w_coh + separation * w_sep, 0.0)
+
+        # 2. MOVE (limits, then wrap at the screen edges)
+        vel = clamp_length(vel + clamp_length(acc, self.max_force), self.speed)
+        pos += vel
+        x, y = pos[:, 0], pos[:, 1]
+        x[x > self.bounds[0]] = 0
+        x[x < 0] = self.bounds[0]
+        y[y > self.bounds[1]] = 0
+        y[y < 0] = self.bounds[1]
+
+        # 3. JAMMING (vacuum, or touching an agent that was solid last step)
+        jam = np.zeros(len(live), dtype=bool)
+        if inputs[2]:
+            jam |= np.hypot(x - inputs[0], y - inputs[1]) < 50 # Mouse influence radius
+        solid = cand[cur["is_solid"][cand]]
+        if len(solid):
+            solid_pos = cur["pos"][solid]
+            for rows in pair_blocks(len(live), len(solid)):
+                d = np.hypot(x[rows, None] - solid_pos[None, :, 0], y[rows, None] - solid_pos[None, :, 1])
+                jam[rows] |= (d < self.touch).any(1)
+        q, r = pixel_to_hex_array(x[jam], y[jam], self.hex_radius)
+        pos[jam] = hex_to_pixel_array(q, r, self.hex_radius)
+        vel[jam] = 0
+
+        nxt["pos"][live] = pos
+        nxt["vel"][live] = vel
+        nxt["is_solid"][live] = jam
+        nxt["grid_pos"][live[jam]] = np.stack([q, r], axis=1)
+        return None
+
+# --- Frames (recording, replay and split mode share one layout) ---
+
+def write_frame(slot, agents):
+    for i, agent in enumerate(agents):
+        slot["pos"][i] = agent.pos
+        slot["solid"][i] = agent.is_solid
+
+def read_frame(arrays, agents):
+    for agent, pos, solid in zip(agents, arrays["pos"].tolist(), arrays["solid"].tolist()):
+        agent.pos.update(pos)
+        agent.is_solid = bool(solid)
+
 # --- Simulation Class ---
 
 class Simulation:
-    def __init__(self):
-        pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Project Vajra: Phase 1 - Software Simulation")
-        self.clock = pygame.time.Clock()
+    def __init__(self, record=True, display=True):
+        if display:
+            pygame.init()
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("Project Vajra: Phase 1 - Software Simulation")
+            self.clock = pygame.time.Clock()
         self.running = True
         self.agents = []
         self.reset_simulation()
+        self.recorder = None
+        if record and RECORD_PATH:
+            self.recorder = TrajectoryRecorder(RECORD_PATH, FRAME_CHANNELS, every=RECORD_EVERY,
+                                               meta={"num_agents": NUM_AGENTS})
+        self.frame = 0
 
     def reset_simulation(self):
         self.agents = []
@@ -216,25 +355,144 @@ class Simulation:
     def run(self):
         while self.running:
             self.handle_events()
-            self.update()
+            self.update(pygame.mouse.get_pos(), pygame.mouse.get_pressed()[0])
+            self.record()
             self.draw()
             self.clock.tick(60)
+        if self.recorder is not None:
+            self.recorder.close()
         pygame.quit()
 
+    def replay(self, path):
+        """Plays a recording through the normal draw(); no physics"""
+        player = TrajectoryPlayer(path)
+        self.agents = [Agent(0, 0) for _ in range(player.reader.channels["pos"][1][0])]
+        while self.running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        self.running = False
+                    else:
+                        player.handle_key(pygame.key.name(event.key))
+            frame, arrays = player.advance()
+            read_frame(arrays, self.agents)
+            pygame.display.set_caption(f"{player.status()} | {KEYS}")
+            self.draw()
+            self.clock.tick(60)
+        player.close()
+        pygame.quit()
+
+    def run_split(self):
+        """Draws frames published by sim_process, which steps physics on its own core"""
+        frames = SharedFrameBuffer(FRAME_CHANNELS)
+        sim, inbox, stop = start_process(sim_process, frames)
+        meter = RateMeter()
+        mouse = None
+        while self.running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        self.running = False
+                    else:
+                        inbox.put(("key", pygame.key.name(event.key)))
+            state = (pygame.mouse.get_pos(), pygame.mouse.get_pressed()[0])
+            if state != mouse: # Vacuum signal: only send changes
+                inbox.put(("mouse",) + state)
+                mouse = state
+            seq, frame, arrays = frames.latest()
+            if seq > 0:
+                read_frame(arrays, self.agents)
+            pygame.display.set_caption(f"Project Vajra: Phase 1 - sim {meter.update(seq):.0f} steps/s")
+            self.draw()
+            self.clock.tick(60)
+        stop.set()
+        sim.join()
+        frames.close()
+        pygame.quit()
+
+    def run_tiled(self, tiles):
+        """Steps physics on one process per tile; the agent objects are only synced to draw"""
+        engine = TileEngine(TiledSwarm(), self.state_arrays(), tiles)
+        meter = RateMeter()
+        while self.running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        self.running = False
+                    else:
+                        self.handle_key(pygame.key.name(event.key))
+                        engine.load(self.state_arrays())
+            engine.step((*pygame.mouse.get_pos(), pygame.mouse.get_pressed()[0]))
+            self.set_state_arrays(engine.arrays)
+            self.record()
+            pygame.display.set_caption(f"Project Vajra: Phase 1 - {tiles[0]}x{tiles[1]} tiles, "
+                                       f"{meter.update(engine.steps):.0f} steps/s")
+            self.draw()
+            self.clock.tick(60)
+        engine.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        pygame.quit()
+
+    def record(self):
+        self.frame += 1
+        slot = self.recorder.acquire(self.frame) if self.recorder is not None else None
+        if slot is None:
+            return
+        write_frame(slot, self.agents)
+        self.recorder.commit()
+
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r:
-                    self.reset_simulation()
-                elif event.key == pygame.K_ESCAPE:
+                if event.key == pygame.K_ESCAPE:
                     self.running = False
+                else:
+                    self.handle_key(pygame.key.name(event.key))
 
-    def update(self):
-        mouse_pos = pygame.mouse.get_pos()
-        mouse_pressed = pygame.mouse.get_pressed()[0] # Left click
-        
+    def handle_key(self, key):
+        if key == "r":
+            self.reset_simulation()
+        elif key == "k":
+            self.save_state()
+        elif key == "l" and os.path.exists(CHECKPOINT_PATH):
+            self.load_state()
+
+    def state_arrays(self):
+        return {
+            "pos": np.array([(a.pos.x, a.pos.y) for a in self.agents]),
+            "vel": np.array([(a.vel.x, a.vel.y) for a in self.agents]),
+            "is_solid": np.array([a.is_solid for a in self.agents]),
+            "grid_pos": np.array([a.grid_pos or (0, 0) for a in self.agents], dtype=np.int32),
+        }
+
+    def set_state_arrays(self, arrays):
+        pos, vel, solid, grid = (arrays[k].tolist() for k in ("pos", "vel", "is_solid", "grid_pos"))
+        for i, agent in enumerate(self.agents):
+            agent.pos.update(*pos[i])
+            agent.vel.update(*vel[i])
+            agent.acc.update(0, 0) # Always cleared at the end of a frame
+            agent.is_solid = solid[i]
+            agent.grid_pos = tuple(grid[i]) if solid[i] else None
+
+    def save_state(self, path=CHECKPOINT_PATH):
+        snapshot.save(path, self.state_arrays(), {"num_agents": len(self.agents), "rng": snapshot.rng_state()})
+
+    def load_state(self, path=CHECKPOINT_PATH):
+        arrays, meta = snapshot.load(path)
+        snapshot.check_count(meta, len(self.agents))
+        self.set_state_arrays(arrays)
+        snapshot.set_rng_state(meta["rng"])
+
+    def update(self, mouse_pos, mouse_pressed):
         for agent in self.agents:
             agent.update(self.agents, mouse_pos, mouse_pressed)
 
@@ -257,6 +515,52 @@ class Simulation:
             
         pygame.display.flip()
 
+def sim_process(spec, inbox, stop):
+    """Split mode: physics only, publishing each step to the shared frame buffer"""
+    sim = Simulation(display=False)
+    frames = SharedFrameBuffer(*spec)
+    pacer = Pacer(SPLIT_SIM_RATE)
+    mouse_pos, mouse_pressed = (0, 0), False
+    while not stop.is_set():
+        for event in drain(inbox):
+            if event[0] == "mouse":
+                _, mouse_pos, mouse_pressed = event
+            else:
+                sim.handle_key(event[1])
+        sim.update(mouse_pos, mouse_pressed)
+        sim.record()
+        write_frame(frames.back(), sim.agents)
+        frames.publish(sim.frame)
+        pacer.wait()
+    if sim.recorder is not None:
+        sim.recorder.close()
+    frames.close()
+
+def headless(max_frames, vacuum_frames, done_fraction):
+    """Sweep run (vajra_common.sweep): vacuum at the screen centre for vacuum_frames, no window"""
+    sim = Simulation(record=False, display=False)
+    centre = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+    return run_headless(lambda frame: sim.update(centre, frame <= vacuum_frames),
+                        lambda: sum(a.is_solid for a in sim.agents) / len(sim.agents),
+                        max_frames, done_fraction, "solid")
+
+def tiled():
+    """Tile benchmark (vajra_common.tiles): the model and a start state"""
+    return TiledSwarm(), Simulation(record=False, display=False).state_arrays()
+
 if __name__ == "__main__":
-    sim = Simulation()
-    sim.run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", metavar="TRAJECTORY", help="Play a recording instead of simulating")
+    parser.add_argument("--split", action="store_true", help="Physics in its own process")
+    parser.add_argument("--tiles", type=parse_tiles, metavar="COLSxROWS",
+                        help="Step physics on one process per screen tile, e.g. 2x2")
+    args = parser.parse_args()
+    sim = Simulation(record=args.replay is None and not args.split) # In split mode the sim process records
+    if args.replay:
+        sim.replay(args.replay)
+    elif args.split:
+        sim.run_split()
+    elif args.tiles:
+        sim.run_tiled(args.tiles)
+    else:
+        sim.run()
@@ -0,0 +1 @@
+"""Helpers shared by the Vajra sims (importable once the repo root is on sys.path)."""
@@ -0,0 +1,143 @@
+"""
+Playback of trajectory files for the viewers: no physics, just decoded frames.
+
+Decoded chunks sit in an LRU cache capped in bytes, so recordings far larger
+than RAM play in bounded memory. A background thread decodes the next
+chunks in the playback direction before they are needed, and a seek
+decodes only the chunk (keyframe) holding the target frame. The shown
+chunk and the ones prefetched after it are never evicted, so the cache
+holds at least prefetch + 1 chunks whatever its cap.
+"""
+import bisect
+import collections
+import queue
+import threading
+from vajra_common.trajectory import TrajectoryReader
+
+KEYS = "SPACE pause | LEFT/RIGHT seek | UP/DOWN speed | R reverse | HOME restart"
+
+class TrajectoryPlayer:
+    def __init__(self, path, cache_bytes=256 << 20, prefetch=2, seek_step=None):
+        self.reader = TrajectoryReader(path)
+        self.first, self.last = self.reader.frames
+        if self.last < self.first:
+            raise ValueError(f"No frames in {path}")
+        self.meta = self.reader.meta
+        self.cache_bytes = cache_bytes
+        self.prefetch_chunks = prefetch
+        self.seek_step = seek_step or max(1, (self.last - self.first) // 20)
+
+        self.position = float(self.first)
+        self.speed = 1.0 # Recorded frame numbers per tick; negative plays backwards
+        self.paused = False
+
+        self.cache = collections.OrderedDict() # chunk -> (frames, arrays, nbytes)
+        self.cached_bytes = 0
+        self.inflight = set()
+        self.lock = threading.Lock()
+        self.requests = queue.SimpleQueue()
+        self.worker = threading.Thread(target=self.prefetch_loop, args=(path,), name="replay-prefetch", daemon=True)
+        self.worker.start()
+
+    # --- Chunks ---
+
+    def store(self, c, frames, arrays, keep):
+        nbytes = sum(a.nbytes for a in arrays.values())
+        with self.lock:
+            self.inflight.discard(c)
+            if c not in self.cache:
+                self.cache[c] = (frames, arrays, nbytes)
+                self.cached_bytes += nbytes
+            # Evict least recently used, but never the chunk being shown or the
+            # ones prefetched for it: with chunks bigger than the cap, it grows instead
+            window = self.window(keep)
+            while self.cached_bytes > self.cache_bytes:
+                victim = next((k for k in self.cache if k not in window), None)
+                if victim is None:
+                    break
+                self.cached_bytes -= self.cache.pop(victim)[2]
+
+    def chunk(self, c):
+        with self.lock:
+            entry = self.cache.get(c)
+            if entry is not None:
+                self.cache.move_to_end(c)
+                return entry[0], entry[1]
+        frames, arrays = self.reader.read_chunk(c) # Miss (seek or prefetch behind): decode here
+        self.store(c, frames, arrays, keep=c)
+        return frames, arrays
+
+    def window(self, c):
+        # Chunk c and the ones after it in the playback direction
+        step = 1 if self.speed >= 0 else -1
+        return [c + d * step for d in range(self.prefetch_chunks + 1)]
+
+    def prefetch(self, c):
+        with self.lock:
+            for n in self.window(c)[1:]:
+                if 0 <= n < len(self.reader.chunks) and n not in self.cache and n not in self.inflight:
+                    self.inflight.add(n)
+                    self.requests.put((n, c))
+
+    def prefetch_loop(self, path):
+        reader = TrajectoryReader(path) # Own file handle; the main thread keeps reading too
+        while True:
+            item = self.requests.get()
+            if item is None:
+                break
+            c, current = item
+            frames, arrays = reader.read_chunk(c)
+            self.store(c, frames, arrays, keep=current)
+        reader.close()
+
+    # --- Playback ---
+
+    def frame_at(self, frame):
+        """Returns (recorded frame number, {channel: array}) for the last recorded frame <= frame"""
+        c = self.reader.chunk_of(frame)
+        frames, arrays = self.chunk(c)
+        self.prefetch(c)
+        k = max(0, bisect.bisect_right(frames, frame) - 1)
+        return frames[k], {name: a[k] for name, a in arrays.items()}
+
+    def advance(self, ticks=1):
+        if not self.paused:
+            self.position += self.speed * ticks
+            if self.position >= self.last or self.position <= self.first:
+                self.position = min(max(self.position, self.first), self.last)
+                self.paused = True # Hold the end frame
+        return self.frame_at(int(self.position))
+
+    def seek(self, frame):
+        self.position = float(min(max(frame, self.first), self.last))
+
+    def handle_key(self, key):
+        """Shared bindings; key is a lowercase name ('space', 'left', ...)"""
+        if key in ("space", " "):
+            self.paused = not self.paused
+        elif key == "right":
+            self.seek(self.position + self.seek_step)
+        elif key == "left":
+            self.seek(self.position - self.seek_step)
+        elif key == "up":
+            self.speed *= 2.0
+        elif key == "down":
+            self.speed /= 2.0
+        elif key == "r":
+            self.speed = -self.speed
+            self.paused = False
+        elif key == "home":
+            self.seek(self.first)
+            self.paused = False
+        else:
+            return False
+        return True
+
+    def status(self):
+        state = "paused" if self.paused else f"{self.speed:+g}x"
+        return f"Replay {int(self.position)} / {self.last} ({state})"
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
+        self.reader.close()
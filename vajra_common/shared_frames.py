@@ -0,0 +1,130 @@
+"""
+Sim and renderer in separate processes, sharing frames through shared memory.
+
+Three slots of every channel live in one SharedMemory block. The sim fills a
+slot nobody else is using and publishes it as the latest. The renderer pins
+the latest slot and reads it in place (numpy views, no copies). With the
+spare third slot the sim never waits for a draw, and the renderer never sees
+a half-written frame. The lock only guards swapping two slot indices.
+Input goes back over a multiprocessing queue.
+"""
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+SLOTS = 3
+CONTEXT = multiprocessing.get_context("spawn") # The parent already holds a display connection; don't fork it
+LATEST, READING, SEQ, FRAME = range(4) # Header words
+HEADER_BYTES = 64
+
+class SharedFrameBuffer:
+    def __init__(self, channels, name=None, lock=None):
+        """channels: {name: (dtype, shape)}. Without a name a new block is created (the owner)."""
+        self.channels = {key: (np.dtype(dtype), tuple(shape)) for key, (dtype, shape) in channels.items()}
+        sizes = [int(np.prod(shape)) * dtype.itemsize for dtype, shape in self.channels.values()]
+        slot_bytes = sum(-(-size // 64) * 64 for size in sizes) # 64-byte aligned channels
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + SLOTS * slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name) # Spawned children share the owner's resource tracker
+        self.lock = lock if lock is not None else CONTEXT.Lock()
+
+        self.header = np.ndarray(4, dtype=np.int64, buffer=self.shm.buf)
+        self.slots = []
+        for s in range(SLOTS):
+            offset = HEADER_BYTES + s * slot_bytes
+            slot = {}
+            for (key, (dtype, shape)), size in zip(self.channels.items(), sizes):
+                slot[key] = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+                offset += -(-size // 64) * 64
+            self.slots.append(slot)
+        if self.owner:
+            self.header[:] = (0, 0, 0, -1)
+        self.writing = None
+
+    def spec(self):
+        """Picklable handle for the other process: SharedFrameBuffer(*spec)"""
+        return ({key: (dtype.str, shape) for key, (dtype, shape) in self.channels.items()}, self.shm.name, self.lock)
+
+    # --- Writer (sim process) ---
+
+    def back(self):
+        # The reader only ever moves READING onto LATEST, so a slot that is
+        # neither stays ours until publish
+        with self.lock:
+            busy = (self.header[LATEST], self.header[READING])
+        self.writing = next(s for s in range(SLOTS) if s not in busy)
+        return self.slots[self.writing]
+
+    def publish(self, frame):
+        with self.lock:
+            self.header[LATEST] = self.writing
+            self.header[SEQ] += 1
+            self.header[FRAME] = frame
+
+    # --- Reader (render process) ---
+
+    def latest(self):
+        """Returns (seq, frame, views of the newest complete slot); seq 0 = nothing published yet"""
+        with self.lock:
+            self.header[READING] = self.header[LATEST]
+            seq, frame, s = int(self.header[SEQ]), int(self.header[FRAME]), int(self.header[READING])
+        return seq, frame, self.slots[s]
+
+    def close(self):
+        self.slots = None
+        self.header = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def start_process(target, frames):
+    """Starts target(spec, inbox, stop) in a new process; returns (process, inbox, stop)"""
+    inbox = CONTEXT.Queue()
+    stop = CONTEXT.Event()
+    process = CONTEXT.Process(target=target, args=(frames.spec(), inbox, stop), daemon=True)
+    process.start()
+    return process, inbox, stop
+
+def drain(inbox):
+    """All input events queued since the last call"""
+    events = []
+    while True:
+        try:
+            events.append(inbox.get_nowait())
+        except queue.Empty:
+            return events
+
+class RateMeter:
+    """Steps per second of the other process, from the published sequence number"""
+    def __init__(self, window=1.0):
+        self.window = window
+        self.start = time.perf_counter()
+        self.start_seq = 0
+        self.rate = 0.0
+
+    def update(self, seq):
+        now = time.perf_counter()
+        if now - self.start >= self.window:
+            self.rate = (seq - self.start_seq) / (now - self.start)
+            self.start, self.start_seq = now, seq
+        return self.rate
+
+class Pacer:
+    """Holds a loop at a fixed rate (0 = as fast as possible)"""
+    def __init__(self, rate):
+        self.period = 1.0 / rate if rate > 0 else 0.0
+        self.next = time.perf_counter()
+
+    def wait(self):
+        if self.period == 0.0:
+            return
+        self.next += self.period
+        delay = self.next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self.next = time.perf_counter() # Fell behind: don't try to catch up
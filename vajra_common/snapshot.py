@@ -0,0 +1,77 @@
+"""
+Array snapshots shared by the sims.
+
+A path ending in .npz is one compressed archive (small, slower). Any other
+path is a directory of raw .npy files plus meta.json: writes are plain
+memcpy-speed dumps and loads are memory-mapped, so pages come in only as
+they are read. Metadata is JSON; writes go to a temp name and are renamed
+into place, so a crash never leaves a half-written checkpoint.
+"""
+import json
+import os
+import random
+import shutil
+import zipfile
+import numpy as np
+
+META_KEY = "__meta__"
+META_FILE = "meta.json"
+MMAP_MIN_BYTES = 4096 # Smaller files are read outright
+ARCHIVE_LEVEL = 1 # Deflate level: np.savez_compressed's default is ~5x slower for little gain on float state
+
+def is_archive(path):
+    return path.endswith(".npz")
+
+def save(path, arrays, meta=None):
+    meta = dict(meta or {})
+    tmp = path + ".tmp"
+    if is_archive(path):
+        # Same layout as np.savez_compressed, so np.load reads it
+        blob = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, compresslevel=ARCHIVE_LEVEL) as archive:
+            for name, array in {**arrays, META_KEY: blob}.items():
+                with archive.open(name + ".npy", "w", force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.asanyarray(array))
+        os.replace(tmp, path)
+        return
+
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, name + ".npy"), array)
+    with open(os.path.join(tmp, META_FILE), "w") as f:
+        json.dump(meta, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp, path)
+
+def load(path, mmap=True):
+    """Returns (arrays, meta); directory snapshots are read-only memmaps unless mmap=False"""
+    if is_archive(path):
+        with np.load(path) as data:
+            meta = json.loads(bytes(data[META_KEY]).decode())
+            arrays = {name: data[name] for name in data.files if name != META_KEY}
+        return arrays, meta
+
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    arrays = {}
+    for entry in sorted(os.listdir(path)):
+        if entry.endswith(".npy"):
+            file = os.path.join(path, entry)
+            lazy = mmap and os.path.getsize(file) >= MMAP_MIN_BYTES
+            arrays[entry[:-4]] = np.load(file, mmap_mode="r" if lazy else None)
+    return arrays, meta
+
+def check_count(meta, expected, key="num_agents"):
+    if meta.get(key) != expected:
+        raise ValueError(f"Snapshot holds {meta.get(key)} agents, this sim has {expected}")
+
+# --- Python RNG (the pygame sims draw from the random module) ---
+
+def rng_state():
+    version, internal, gauss = random.getstate()
+    return [version, list(internal), gauss]
+
+def set_rng_state(state):
+    version, internal, gauss = state
+    random.setstate((version, tuple(internal), gauss))
@@ -0,0 +1,152 @@
+"""
+Headless parameter sweeps for the pygame sims on a process pool.
+
+    python -m vajra_common.sweep phase1 --grid PERCEPTION_RADIUS=30,50,70 \
+        --grid SEPARATION_WEIGHT=1,1.5,2 --seeds 3 --jobs 4 --out phase1.jsonl
+
+Every combination of the --grid values runs once per seed, each in a fresh
+process: overrides are set on the sim's settings module (config.py, or
+main.py for Phase 1) before anything reads them, so no file is edited.
+Results are appended to --out one JSON line per run as runs finish. Runs
+already in --out are skipped, so an interrupted sweep picks up where it
+stopped (failed runs are tried again).
+
+Each sim's headless() reports frames, steps_per_sec and, via run_headless,
+time_to_<goal> (first frame the goal fraction was reached, or null) and
+fraction_<goal> (at the last frame): goal = solid for phase1 / vajra_sim,
+image for phase2.
+"""
+import argparse
+import ast
+import importlib
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from vajra_common.shared_frames import CONTEXT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMS = { # name: (directory, settings module)
+    "phase1": (ROOT, "main"),
+    "phase2": (os.path.join(ROOT, "vajra_phase2"), "config"),
+    "vajra_sim": (os.path.join(ROOT, "vajra_sim"), "config"),
+}
+RUN_KEYS = ("sim", "params", "seed", "max_frames", "vacuum_frames", "done_fraction") # What makes a run unique
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sim", choices=sorted(SIMS))
+    parser.add_argument("--grid", action="append", default=[], metavar="KEY=V1,V2,...",
+                        help="Values of one setting (repeatable; the sweep is every combination)")
+    parser.add_argument("--seeds", type=int, default=1, help="Runs per combination (seeds 0..N-1)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--max-frames", type=int, default=3000, help="Give up on a run after this many frames")
+    parser.add_argument("--vacuum-frames", type=int, default=None,
+                        help="Frames the vacuum is held at the screen centre (phase1, vajra_sim; default: all)")
+    parser.add_argument("--done-fraction", type=float, default=1.0,
+                        help="Stop a run once this fraction is solid / of the image is filled")
+    parser.add_argument("--out", required=True, help="JSON-lines results file (appended; resumes)")
+    return parser.parse_args(argv)
+
+def literal(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text # Plain string
+
+def parse_grid(items):
+    """['A=1,2', 'B=3'] -> [{'A': 1, 'B': 3}, {'A': 2, 'B': 3}]"""
+    axes = []
+    for item in items:
+        key, values = item.split("=", 1)
+        axes.append([(key, literal(v)) for v in values.split(",")])
+    return [dict(combo) for combo in itertools.product(*axes)]
+
+def run_key(run):
+    return json.dumps([run[k] for k in RUN_KEYS], sort_keys=True)
+
+def finished_runs(path):
+    """Keys of the runs already in the results file without an error"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue # Cut off by an interrupt
+            if "error" not in result:
+                done.add(run_key(result))
+    return done
+
+def run_headless(step, fraction, max_frames, done_fraction, goal):
+    """
+    Calls step(frame) for frames 1..max_frames, stopping early once
+    fraction() reaches done_fraction. Returns the outcome metrics.
+    """
+    reached, value = None, fraction()
+    start = time.perf_counter()
+    frame = 0
+    while frame < max_frames and reached is None:
+        frame += 1
+        step(frame)
+        value = fraction()
+        if value >= done_fraction:
+            reached = frame
+    seconds = time.perf_counter() - start
+    return {"frames": frame, f"time_to_{goal}": reached, f"fraction_{goal}": value,
+            "seconds": seconds, "steps_per_sec": frame / seconds if seconds > 0 else None}
+
+def run_one(run):
+    """Pool task (a fresh process each): apply the overrides, then the sim's headless()"""
+    directory, settings_name = SIMS[run["sim"]]
+    result = dict(run)
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1" # Once per run is noise
+    try:
+        sys.path.insert(0, directory)
+        settings = importlib.import_module(settings_name)
+        for key, value in run["params"].items():
+            if not hasattr(settings, key):
+                raise KeyError(f"Unknown setting for {run['sim']}: {key}")
+            setattr(settings, key, value)
+        sim = importlib.import_module("main")
+        random.seed(run["seed"])
+        result.update(sim.headless(run["max_frames"], run["vacuum_frames"], run["done_fraction"]))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+def main(argv=None):
+    args = parse_args(argv)
+    vacuum_frames = args.max_frames if args.vacuum_frames is None else args.vacuum_frames
+    runs = [{"sim": args.sim, "params": params, "seed": seed, "max_frames": args.max_frames,
+             "vacuum_frames": vacuum_frames, "done_fraction": args.done_fraction}
+            for params in parse_grid(args.grid) for seed in range(args.seeds)]
+    done = finished_runs(args.out)
+    todo = [run for run in runs if run_key(run) not in done]
+    print(f"{len(runs)} runs, {len(runs) - len(todo)} already in {args.out}", file=sys.stderr)
+    if not todo:
+        return
+
+    with open(args.out, "a") as out:
+        if out.tell() > 0:
+            with open(args.out, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write("\n") # Don't glue onto a line cut off by an interrupt
+        # One run per process: overrides must be set before the sim modules import them
+        with CONTEXT.Pool(max(1, args.jobs), maxtasksperchild=1) as pool:
+            for n, result in enumerate(pool.imap_unordered(run_one, todo), 1):
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                goal = next((k for k in result if k.startswith("time_to_")), None)
+                status = result.get("error") or (f"{result['frames']:>6} frames  {goal} {result[goal]}  "
+                                                 f"{result['steps_per_sec']:7.1f} steps/s")
+                print(f"[{n}/{len(todo)}] {json.dumps(result['params'])} seed {result['seed']}: {status}",
+                      file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
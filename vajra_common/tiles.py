@@ -0,0 +1,309 @@
+"""
+Tile-parallel stepping for the 2D swarms: one worker process per tile.
+
+The screen is cut into a grid of tiles. Each worker owns the agents inside
+its tile and steps them with the model's numpy rules, reading the border
+agents of the surrounding tiles (the halo) straight out of shared memory.
+State is double-buffered: a step reads parity p and writes p ^ 1, so no
+worker ever sees a neighbour half-updated, and the tile layout changes
+nothing but float rounding. A step has three phases, split by barriers:
+
+    1. step     owned agents against owned + halo agents
+    2. resolve  requests that touch another tile's agents (face latches)
+    3. migrate  claim the agents that moved into this tile; publish the new halo
+
+Agents interact within model.radius and move at most model.max_move per
+step, so a halo of radius + max_move and tiles at least that big keep every
+interaction and every migration between adjacent tiles.
+
+A model provides:
+    channels            {name: (dtype, per-agent shape)}, including "pos"
+    bounds, radius, max_move
+    requests_per_agent  0 if the model never writes another tile's agents
+    step(own, cand, cur, nxt, inputs) -> (k, 2) requests or None
+    resolve(requests, mine, nxt)
+
+Scaling with the worker count (python -m vajra_common.tiles SIM --agents N,
+vacuum held at the centre, steps/s and speedup over one tile):
+
+    workers  layout  phase1, 4000 agents  vajra_sim, 2000 voxels
+       1      1x1        1.7   x1.00          1.0   x1.00
+       2      2x1        2.3   x1.33          1.1   x1.14
+       4      2x2        2.2   x1.27          1.1   x1.10
+       8      4x2        2.5   x1.44          1.2   x1.23
+
+Measured on a single-core machine, so the workers time-share one CPU. The
+gain here is not parallelism: each tile's pairwise blocks are owned x
+(owned + halo) instead of N x N, net of the halo copies and barriers. No
+multi-core numbers were available; run the same command there.
+"""
+import argparse
+import importlib
+import os
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from vajra_common.shared_frames import CONTEXT
+from vajra_common.sweep import SIMS
+
+PARITY, STOP = range(2) # Status words
+INPUT_WORDS = 8 # Per-step inputs from the window (mouse x, y, pressed, ...)
+PAIR_BUDGET = 1 << 21 # Elements per pairwise block in the models
+
+def parse_tiles(text):
+    """'4x2' -> (4, 2) tile columns x rows; an argparse type"""
+    try:
+        nx, ny = (int(k) for k in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected COLSxROWS, got {text!r}") from None
+    if nx < 1 or ny < 1:
+        raise argparse.ArgumentTypeError(f"Need at least one tile each way, got {text!r}")
+    return nx, ny
+
+def scale_to(v, length):
+    """Rows of v resized to length (zero rows stay zero)"""
+    norm = np.hypot(v[:, 0], v[:, 1])[:, None]
+    return np.where(norm > 0, v * (length / np.where(norm > 0, norm, 1.0)), v)
+
+def pair_blocks(rows, cols):
+    """Row slices that keep a rows x cols pairwise temporary under PAIR_BUDGET elements"""
+    step = max(1, PAIR_BUDGET // max(1, cols))
+    for start in range(0, rows, step):
+        yield slice(start, min(rows, start + step))
+
+class TileGrid:
+    def __init__(self, bounds, tiles, halo):
+        self.width, self.height = bounds
+        self.nx, self.ny = tiles
+        self.tw, self.th = self.width / self.nx, self.height / self.ny
+        self.halo = halo
+        self.count = self.nx * self.ny
+        if (self.nx > 1 and self.tw < halo) or (self.ny > 1 and self.th < halo):
+            raise ValueError(f"{self.tw:.0f}x{self.th:.0f} px tiles are narrower than the {halo:.0f} px halo; "
+                             f"use fewer tiles")
+
+    def tile_of(self, pos):
+        # Agents slightly off screen (snapped past an edge) belong to the edge tile
+        ix = np.clip((pos[:, 0] // self.tw).astype(np.int64), 0, self.nx - 1)
+        iy = np.clip((pos[:, 1] // self.th).astype(np.int64), 0, self.ny - 1)
+        return iy * self.nx + ix
+
+    def neighbours(self, t):
+        # Periodic: positions wrap at the screen edges, so agents migrate across them
+        iy, ix = divmod(t, self.nx)
+        around = {((iy + dy) % self.ny) * self.nx + (ix + dx) % self.nx for dy in (-1, 0, 1) for dx in (-1, 0, 1)}
+        return sorted(around - {t})
+
+    def in_halo(self, pos, t):
+        iy, ix = divmod(t, self.nx)
+        x0, y0 = ix * self.tw, iy * self.th
+        x, y = pos[:, 0], pos[:, 1]
+        return ((x < x0 + self.halo) | (x >= x0 + self.tw - self.halo) |
+                (y < y0 + self.halo) | (y >= y0 + self.th - self.halo))
+
+# --- Shared block ---
+
+def fields(model, n, count):
+    out = []
+    for p in (0, 1):
+        out += [(f"{name}{p}", dtype, (n, *shape)) for name, (dtype, shape) in model.channels.items()]
+        out += [(f"own{p}", np.int32, (count, n)), (f"halo{p}", np.int32, (count, n))]
+    out += [("own_count", np.int64, (2, count)), ("halo_count", np.int64, (2, count)),
+            ("requests", np.int32, (count, max(1, n * model.requests_per_agent), 2)),
+            ("request_count", np.int64, (count,)),
+            ("inputs", np.float64, (INPUT_WORDS,)), ("status", np.int64, (2,))]
+    return out
+
+def map_fields(buf, fields):
+    """Numpy views of each field, 64-byte aligned; with buf=None just the total size"""
+    views, offset = {}, 0
+    for key, dtype, shape in fields:
+        dtype = np.dtype(dtype)
+        if buf is not None:
+            views[key] = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        offset += -(-int(np.prod(shape)) * dtype.itemsize // 64) * 64
+    return views if buf is not None else offset
+
+def state(views, model, p):
+    return {name: views[f"{name}{p}"] for name in model.channels}
+
+def publish(views, grid, p, t, own, pos):
+    """Sets tile t's owned agents (sorted ids) for parity p, and which of them sit in its halo"""
+    halo = own[grid.in_halo(pos[own], t)]
+    views[f"own{p}"][t, :len(own)] = own
+    views[f"halo{p}"][t, :len(halo)] = halo
+    views["own_count"][p, t] = len(own)
+    views["halo_count"][p, t] = len(halo)
+
+def tile_worker(spec, t):
+    model, n, tiles, name, sync, phase = spec
+    grid = TileGrid(model.bounds, tiles, model.radius + model.max_move)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        run_tile(model, t, grid, map_fields(shm.buf, fields(model, n, grid.count)), sync, phase)
+    except threading.BrokenBarrierError:
+        pass # Another worker failed, or the engine closed mid-step
+    except BaseException:
+        sync.abort()
+        phase.abort()
+        raise
+    shm.close() # Views died with run_tile
+
+def run_tile(model, t, grid, views, sync, phase):
+    n = len(views["pos0"])
+    status, inputs = views["status"], views["inputs"]
+    around = grid.neighbours(t)
+    mine = np.zeros(n, dtype=bool)
+    while True:
+        sync.wait()
+        if status[STOP]:
+            return
+        p = int(status[PARITY])
+        cur, nxt = state(views, model, p), state(views, model, p ^ 1)
+        own = views[f"own{p}"][t, :views["own_count"][p, t]].copy()
+        halos = [views[f"halo{p}"][k, :views["halo_count"][p, k]] for k in around]
+        cand = np.union1d(own, np.concatenate(halos)) if halos else own
+
+        # 1. STEP (owned rows of nxt only)
+        for key in model.channels:
+            nxt[key][own] = cur[key][own]
+        requests = model.step(own, cand, cur, nxt, inputs)
+        k = 0 if requests is None else len(requests)
+        if k:
+            views["requests"][t, :k] = requests
+        views["request_count"][t] = k
+        phase.wait()
+
+        # 2. RESOLVE (requests come from this tile or the ones around it)
+        if model.requests_per_agent:
+            requests = np.concatenate([views["requests"][k, :views["request_count"][k]] for k in [t] + around])
+            if len(requests):
+                mine[:] = False
+                mine[own] = True
+                model.resolve(requests, mine, nxt)
+
+        # 3. MIGRATE (arrivals were in a neighbour's halo)
+        publish(views, grid, p ^ 1, t, cand[grid.tile_of(nxt["pos"][cand]) == t], nxt["pos"])
+        sync.wait()
+
+class TileEngine:
+    """
+    Steps model on tiles x (columns, rows) worker processes.
+
+        engine = TileEngine(model, {"pos": ..., ...}, tiles=(2, 2))
+        engine.step((mouse_x, mouse_y, pressed))
+        engine.arrays["pos"]   # views, valid until the next step
+    """
+    def __init__(self, model, initial, tiles=(2, 2)):
+        self.model = model
+        self.n = len(initial["pos"])
+        self.grid = TileGrid(model.bounds, tiles, model.radius + model.max_move)
+        layout = fields(model, self.n, self.grid.count)
+        self.shm = shared_memory.SharedMemory(create=True, size=map_fields(None, layout))
+        self.views = map_fields(self.shm.buf, layout)
+        self.views["status"][:] = 0
+        self.steps = 0
+        self.repartitions = 0
+        self.load(initial)
+
+        self.sync = CONTEXT.Barrier(self.grid.count + 1) # Start and end of a step, with us
+        self.phase = CONTEXT.Barrier(self.grid.count) # Between workers' phases (kept alive for the children)
+        spec = (model, self.n, tiles, self.shm.name, self.sync, self.phase)
+        self.workers = [CONTEXT.Process(target=tile_worker, args=(spec, t), name=f"tile-{t}", daemon=True)
+                        for t in range(self.grid.count)]
+        for worker in self.workers:
+            worker.start()
+
+    @property
+    def arrays(self):
+        return state(self.views, self.model, int(self.views["status"][PARITY]))
+
+    def load(self, arrays):
+        """Replaces the whole state (reset, checkpoint load) and repartitions"""
+        current = self.arrays
+        for name in self.model.channels:
+            current[name][:] = arrays[name]
+        self.partition()
+
+    def partition(self):
+        p = int(self.views["status"][PARITY])
+        pos = self.views[f"pos{p}"]
+        tiles = self.grid.tile_of(pos)
+        order = np.argsort(tiles, kind="stable") # Ids stay sorted within a tile
+        ends = np.cumsum(np.bincount(tiles, minlength=self.grid.count))
+        for t, (start, end) in enumerate(zip(np.concatenate(([0], ends[:-1])), ends)):
+            publish(self.views, self.grid, p, t, order[start:end], pos)
+
+    def step(self, inputs=()):
+        self.views["inputs"][:] = 0
+        self.views["inputs"][:len(inputs)] = inputs
+        try:
+            self.sync.wait() # Go
+            self.sync.wait() # Done
+        except threading.BrokenBarrierError:
+            raise RuntimeError("A tile worker failed (see its traceback above)") from None
+        self.views["status"][PARITY] ^= 1
+        self.steps += 1
+        if self.views["own_count"][int(self.views["status"][PARITY])].sum() != self.n:
+            # An agent outran the halo and nobody claimed it: repartition from scratch
+            self.partition()
+            self.repartitions += 1
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.views["status"][STOP] = 1
+        try:
+            self.sync.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self.views = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+def scaling(model, initial, layouts, steps, inputs=()):
+    """[(layout, steps/s)]: the same start state stepped on each tile layout"""
+    rates = []
+    for tiles in layouts:
+        engine = TileEngine(model, initial, tiles)
+        try:
+            engine.step(inputs) # Workers are up and their numpy is warm
+            start = time.perf_counter()
+            for _ in range(steps):
+                engine.step(inputs)
+            rates.append((tiles, steps / (time.perf_counter() - start)))
+        finally:
+            engine.close()
+    return rates
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Steps/s of a sim's tiled model on several tile layouts")
+    parser.add_argument("sim", choices=sorted(name for name in SIMS if name != "phase2"))
+    parser.add_argument("--agents", type=int, default=None, help="NUM_AGENTS (default: the sim's setting)")
+    parser.add_argument("--layouts", type=parse_tiles, nargs="+", default=[(1, 1), (2, 1), (2, 2), (4, 2)])
+    parser.add_argument("--steps", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    # As in sweep.run_one: settings before the sim module reads them
+    directory, settings_name = SIMS[args.sim]
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    sys.path.insert(0, directory)
+    settings = importlib.import_module(settings_name)
+    if args.agents is not None:
+        settings.NUM_AGENTS = args.agents
+    model, initial = importlib.import_module("main").tiled()
+    centre = (model.bounds[0] / 2, model.bounds[1] / 2, 1) # Vacuum held, so jamming spreads
+    rates = scaling(model, initial, args.layouts, args.steps, centre)
+    print(f"{len(initial['pos'])} agents, {os.cpu_count()} CPUs")
+    for (nx, ny), rate in rates:
+        print(f"{nx * ny:>4} workers  {nx}x{ny}  {rate:8.1f} steps/s  x{rate / rates[0][1]:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Trajectory files: per-frame agent arrays (positions, states, ...) for
+offline analysis and replay.
+
+Layout:
+    MAGIC, u32 + JSON header (channels, chunking, user meta)
+    chunks: u32 + JSON chunk header, then one zlib stream per channel
+    u32 + JSON index, u64 index offset, MAGIC
+Each chunk starts with a keyframe; later frames in it are stored as the XOR
+of their bytes with the previous recorded frame, so agents that did not move
+cost zero bytes. A float channel with a quantum is rounded to int32 multiples
+of it first (smaller deltas, lossy). Chunks decode independently, so a seek
+costs at most one chunk.
+"""
+import bisect
+import json
+import os
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+
+MAGIC = b"VAJRATRJ"
+VERSION = 1
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+
+def encode(array, quantum):
+    # Integer copy of a frame: XOR deltas need exact bit patterns
+    if quantum:
+        return np.round(array / quantum).astype(np.int32)
+    return array.copy().view(f"u{array.dtype.itemsize}")
+
+def decode(ints, dtype, quantum):
+    if quantum:
+        return (ints * quantum).astype(dtype)
+    return ints.view(dtype)
+
+def write_block(f, info):
+    blob = json.dumps(info).encode()
+    f.write(U32.pack(len(blob)))
+    f.write(blob)
+
+def read_block(f):
+    (size,) = U32.unpack(f.read(U32.size))
+    return json.loads(f.read(size).decode())
+
+class TrajectoryRecorder:
+    """
+    Records frames through a ring of preallocated slots. The sim thread only
+    copies into a free slot (acquire / fill / commit); a writer thread
+    encodes, compresses and writes. When every slot is still queued the
+    frame is dropped instead of waiting, so disk speed never stalls the sim.
+
+        slot = recorder.acquire(frame)   # None: decimated or dropped
+        if slot is not None:
+            slot["pos"][:] = ...
+            recorder.commit()
+
+    channels: {name: (dtype, shape)}; quanta: {name: step} for lossy floats.
+    """
+    def __init__(self, path, channels, every=1, slots=8, chunk_frames=32, delta=True,
+                 quanta=None, level=1, meta=None):
+        self.path = path
+        self.every = max(1, every)
+        self.chunk_frames = chunk_frames
+        self.delta = delta
+        self.level = level
+        self.channels = {name: (np.dtype(dtype), tuple(shape)) for name, (dtype, shape) in channels.items()}
+        self.quanta = {name: (quanta or {}).get(name) for name in self.channels}
+
+        self.slots = [{name: np.zeros(shape, dtype) for name, (dtype, shape) in self.channels.items()}
+                      for _ in range(slots)]
+        self.free = queue.SimpleQueue()
+        for k in range(slots):
+            self.free.put(k)
+        self.filled = queue.SimpleQueue()
+        self.pending = None # (slot, frame) between acquire and commit
+
+        self.recorded = 0
+        self.dropped = 0
+        self.index = []
+
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        write_block(self.file, {
+            "version": VERSION,
+            "channels": {name: {"dtype": dtype.str, "shape": list(shape), "quantum": self.quanta[name]}
+                         for name, (dtype, shape) in self.channels.items()},
+            "every": self.every, "chunk_frames": chunk_frames, "delta": delta, "meta": meta or {},
+        })
+        self.writer = threading.Thread(target=self.write_loop, name="trajectory-writer", daemon=True)
+        self.writer.start()
+
+    # --- Sim thread ---
+
+    def acquire(self, frame):
+        if frame % self.every != 0:
+            return None
+        try:
+            k = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1 # Writer is behind
+            return None
+        self.pending = (k, frame)
+        return self.slots[k]
+
+    def commit(self):
+        self.filled.put(self.pending)
+        self.pending = None
+        self.recorded += 1
+
+    def record(self, frame, **arrays):
+        slot = self.acquire(frame)
+        if slot is None:
+            return False
+        for name, array in arrays.items():
+            np.copyto(slot[name], array, casting="unsafe")
+        self.commit()
+        return True
+
+    def close(self):
+        if self.file is None:
+            return
+        self.filled.put(None)
+        self.writer.join()
+        offset = self.file.tell()
+        write_block(self.file, {"chunks": self.index, "recorded": self.recorded, "dropped": self.dropped})
+        self.file.write(U64.pack(offset))
+        self.file.write(MAGIC)
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Writer thread ---
+
+    def write_loop(self):
+        frames, streams, prev = [], {name: [] for name in self.channels}, None
+        while True:
+            item = self.filled.get()
+            if item is None:
+                break
+            k, frame = item
+            current = {name: encode(a, self.quanta[name]) for name, a in self.slots[k].items()}
+            self.free.put(k) # Encoded copies are ours now
+            for name, ints in current.items():
+                delta = ints ^ prev[name] if self.delta and prev is not None else ints
+                streams[name].append(delta.tobytes())
+            frames.append(frame)
+            prev = current
+            if len(frames) == self.chunk_frames:
+                self.write_chunk(frames, streams)
+                frames, streams, prev = [], {name: [] for name in self.channels}, None # Next one starts with a keyframe
+        if frames:
+            self.write_chunk(frames, streams)
+
+    def write_chunk(self, frames, streams):
+        payloads = [zlib.compress(b"".join(streams[name]), self.level) for name in self.channels]
+        offset = self.file.tell()
+        write_block(self.file, {"frames": frames, "sizes": [len(p) for p in payloads]})
+        for payload in payloads:
+            self.file.write(payload)
+        self.index.append({"offset": offset, "first": frames[0], "last": frames[-1], "count": len(frames)})
+
+class TrajectoryReader:
+    """Random access to a recording by frame number, one chunk at a time"""
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a trajectory file: {path}")
+        self.header = read_block(self.file)
+        self.channels = {name: (np.dtype(c["dtype"]), tuple(c["shape"]), c["quantum"])
+                         for name, c in self.header["channels"].items()}
+        self.meta = self.header["meta"]
+        self.chunks = self.read_index()
+        self.first_frames = [c["first"] for c in self.chunks]
+
+    def read_index(self):
+        # Footer if the recorder was closed; otherwise walk the chunks
+        end = self.file.seek(0, os.SEEK_END)
+        if end >= U64.size + len(MAGIC):
+            self.file.seek(end - U64.size - len(MAGIC))
+            (offset,) = U64.unpack(self.file.read(U64.size))
+            if self.file.read(len(MAGIC)) == MAGIC:
+                self.file.seek(offset)
+                return read_block(self.file)["chunks"]
+        chunks = []
+        self.file.seek(len(MAGIC))
+        read_block(self.file)
+        while True:
+            offset = self.file.tell()
+            try:
+                info = read_block(self.file)
+            except (struct.error, ValueError):
+                break # Truncated tail
+            if self.file.seek(sum(info["sizes"]), os.SEEK_CUR) > end:
+                break
+            frames = info["frames"]
+            chunks.append({"offset": offset, "first": frames[0], "last": frames[-1], "count": len(frames)})
+        return chunks
+
+    @property
+    def frames(self):
+        return (self.chunks[0]["first"], self.chunks[-1]["last"]) if self.chunks else (0, -1)
+
+    def chunk_of(self, frame):
+        """Index of the chunk holding frame (or the last one before it)"""
+        return max(0, bisect.bisect_right(self.first_frames, frame) - 1)
+
+    def read_chunk(self, c):
+        """Returns (frame numbers, {channel: array of shape (count, *shape)})"""
+        self.file.seek(self.chunks[c]["offset"])
+        info = read_block(self.file)
+        payloads = [self.file.read(size) for size in info["sizes"]]
+        count = len(info["frames"])
+        arrays = {}
+        for (name, (dtype, shape, quantum)), payload in zip(self.channels.items(), payloads):
+            int_dtype = np.int32 if quantum else np.dtype(f"u{dtype.itemsize}")
+            ints = np.frombuffer(zlib.decompress(payload), dtype=int_dtype).reshape(count, *shape)
+            if self.header["delta"]:
+                ints = np.bitwise_xor.accumulate(ints, axis=0)
+            arrays[name] = decode(ints, dtype, quantum)
+        return info["frames"], arrays
+
+    def close(self):
+        self.file.close()
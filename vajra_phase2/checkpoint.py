@@ -0,0 +1,38 @@
+import os
+import sys
+import numpy as np
+from config import *
+sys.path.append(os.path.dirname(BASE_DIR)) # Repo root
+from vajra_common import snapshot
+
+STATES = ("IDLE", "ASSIGNED", "LOCKED")
+
+def save_state(agents, target_manager, path=CHECKPOINT_PATH):
+    # Targets are rebuilt from the image; agents keep an index into them
+    index = {id(t): k for k, t in enumerate(target_manager.targets)}
+    arrays = {
+        "pos": np.array([(a.pos.x, a.pos.y) for a in agents]),
+        "vel": np.array([(a.vel.x, a.vel.y) for a in agents]),
+        "state": np.array([STATES.index(a.state) for a in agents], dtype=np.int8),
+        "target": np.array([index.get(id(a.target), -1) for a in agents], dtype=np.int32),
+        "color": np.array([tuple(a.color)[:3] for a in agents], dtype=np.uint8),
+    }
+    meta = {"num_agents": len(agents), "image": target_manager.current_image_index, "rng": snapshot.rng_state()}
+    snapshot.save(path, arrays, meta)
+
+def load_state(agents, target_manager, path=CHECKPOINT_PATH):
+    arrays, meta = snapshot.load(path)
+    snapshot.check_count(meta, len(agents))
+    target_manager.load_image(meta["image"])
+    targets = target_manager.targets
+    pos, vel, state, target, color = (arrays[k].tolist() for k in ("pos", "vel", "state", "target", "color"))
+    for i, agent in enumerate(agents):
+        agent.pos.update(*pos[i])
+        agent.vel.update(*vel[i])
+        agent.acc.update(0, 0) # Always cleared at the end of a frame
+        agent.state = STATES[state[i]]
+        agent.target = targets[target[i]] if target[i] >= 0 else None
+        if agent.target is not None:
+            agent.target.occupied_by = agent
+        agent.color = agent.target.color if agent.state == "LOCKED" else tuple(color[i])
+    snapshot.set_rng_state(meta["rng"])
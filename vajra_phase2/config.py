@@ -28,3 +28,14 @@ IMAGE_PATHS = [
     os.path.join(BASE_DIR, "shape1.png"),
     os.path.join(BASE_DIR, "shape2.png")
 ]
+
+# --- CHECKPOINTS ---
+# K saves, L loads (.npz = compressed, else a directory of .npy)
+CHECKPOINT_PATH = os.path.join(BASE_DIR, "checkpoint.npz")
+
+# --- RECORDING ---
+RECORD_PATH = None # Trajectory file (pos + state per frame); None = off
+RECORD_EVERY = 1
+
+# --- SPLIT MODE ---
+SPLIT_SIM_RATE = 60 # --split: agent steps per second in their own process (0 = unthrottled)
@@ -1,8 +1,46 @@
 import pygame
+import argparse
+import os
 import sys
 from config import *
 from agent import Agent
 from target_manager import TargetManager
+from checkpoint import STATES, save_state, load_state
+from vajra_common.trajectory import TrajectoryRecorder
+from vajra_common.replay import TrajectoryPlayer, KEYS
+from vajra_common.shared_frames import SharedFrameBuffer, RateMeter, Pacer, drain, start_process
+from vajra_common.sweep import run_headless
+import numpy as np
+
+# Recording, replay and split mode share one frame layout
+FRAME_CHANNELS = {"pos": (np.float32, (NUM_AGENTS, 2)), "state": (np.int8, (NUM_AGENTS,)),
+                  "color": (np.uint8, (NUM_AGENTS, 3))}
+
+def write_frame(slot, agents):
+    for i, agent in enumerate(agents):
+        slot["pos"][i] = agent.pos
+        slot["state"][i] = STATES.index(agent.state)
+        slot["color"][i] = tuple(agent.color)[:3]
+
+def read_frame(arrays, agents):
+    for agent, pos, state, color in zip(agents, arrays["pos"].tolist(), arrays["state"].tolist(),
+                                        arrays["color"].tolist()):
+        agent.pos.update(pos)
+        agent.state = STATES[state]
+        agent.color = tuple(color)
+
+def handle_key(key, agents, target_manager):
+    if key == "space":
+        target_manager.next_image()
+        # Wake up all agents to find new targets
+        for a in agents:
+            if a.state == "LOCKED":
+                a.state = "IDLE"
+                a.target = None
+    elif key == "k":
+        save_state(agents, target_manager)
+    elif key == "l" and os.path.exists(CHECKPOINT_PATH):
+        load_state(agents, target_manager)
 
 def main():
     pygame.init()
@@ -18,6 +56,11 @@ def main():
     for i in range(NUM_AGENTS):
         agents.append(Agent(i))
 
+    recorder = None
+    if RECORD_PATH:
+        recorder = TrajectoryRecorder(RECORD_PATH, FRAME_CHANNELS, every=RECORD_EVERY, meta={"num_agents": NUM_AGENTS})
+    frame = 0
+
     running = True
     while running:
         # --- INPUT ---
@@ -25,13 +68,7 @@ def main():
             if event.type == pygame.QUIT:
                 running = False
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    target_manager.next_image()
-                    # Wake up all agents to find new targets
-                    for a in agents:
-                        if a.state == "LOCKED":
-                            a.state = "IDLE"
-                            a.target = None
+                handle_key(pygame.key.name(event.key), agents, target_manager)
 
         mouse_pressed = pygame.mouse.get_pressed()[0]
         mouse_pos = pygame.math.Vector2(pygame.mouse.get_pos())
@@ -47,16 +84,160 @@ def main():
             agent.update(target_manager, mouse_pos, mouse_pressed)
             agent.draw(screen)
 
+        # --- RECORD (copy only; a writer thread compresses) ---
+        frame += 1
+        slot = recorder.acquire(frame) if recorder is not None else None
+        if slot is not None:
+            write_frame(slot, agents)
+            recorder.commit()
+
         # --- UI ---
         font = pygame.font.SysFont("monospace", 15)
-        text = font.render(f"AGENTS: {NUM_AGENTS} | TARGETS: {len(target_manager.targets)} | [SPACE] Next Image", True, (255, 255, 255))
+        text = font.render(f"AGENTS: {NUM_AGENTS} | TARGETS: {len(target_manager.targets)} | [SPACE] Next Image | [K/L] Save/Load", True, (255, 255, 255))
         screen.blit(text, (10, 10))
 
         pygame.display.flip()
         clock.tick(FPS)
 
+    if recorder is not None:
+        recorder.close()
     pygame.quit()
     sys.exit()
 
+def replay(path):
+    """Plays a recording through Agent.draw; no physics"""
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Project Vajra Phase 2: Replay")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont("monospace", 15)
+
+    player = TrajectoryPlayer(path)
+    agents = [Agent(i) for i in range(player.reader.channels["pos"][1][0])]
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                player.handle_key(pygame.key.name(event.key))
+
+        frame, arrays = player.advance()
+        read_frame(arrays, agents)
+        screen.fill(BG_COLOR)
+        for agent in agents:
+            agent.draw(screen)
+
+        text = font.render(f"{player.status()} | {KEYS}", True, (255, 255, 255))
+        screen.blit(text, (10, 10))
+
+        pygame.display.flip()
+        clock.tick(FPS)
+
+    player.close()
+    pygame.quit()
+    sys.exit()
+
+def split():
+    """Draws frames published by sim_process, which steps the agents on its own core"""
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Project Vajra Phase 2: Split Mode")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont("monospace", 15)
+
+    frames = SharedFrameBuffer(FRAME_CHANNELS)
+    sim, inbox, stop = start_process(sim_process, frames)
+    meter = RateMeter()
+    agents = [Agent(i) for i in range(NUM_AGENTS)]
+    mouse = None
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                inbox.put(("key", pygame.key.name(event.key)))
+        state = (pygame.mouse.get_pos(), pygame.mouse.get_pressed()[0])
+        if state != mouse: # Only send changes
+            inbox.put(("mouse",) + state)
+            mouse = state
+
+        seq, frame, arrays = frames.latest()
+        screen.fill(BG_COLOR)
+        if seq > 0:
+            read_frame(arrays, agents)
+            for agent in agents:
+                agent.draw(screen)
+
+        text = font.render(f"AGENTS: {NUM_AGENTS} | SIM: {meter.update(seq):.0f} steps/s | [SPACE] Next Image | [K/L] Save/Load", True, (255, 255, 255))
+        screen.blit(text, (10, 10))
+
+        pygame.display.flip()
+        clock.tick(FPS)
+
+    stop.set()
+    sim.join()
+    frames.close()
+    pygame.quit()
+    sys.exit()
+
+def sim_process(spec, inbox, stop):
+    """Split mode: the agents only, publishing each step to the shared frame buffer"""
+    frames = SharedFrameBuffer(*spec)
+    target_manager = TargetManager()
+    agents = [Agent(i) for i in range(NUM_AGENTS)]
+    recorder = None
+    if RECORD_PATH:
+        recorder = TrajectoryRecorder(RECORD_PATH, FRAME_CHANNELS, every=RECORD_EVERY, meta={"num_agents": NUM_AGENTS})
+    pacer = Pacer(SPLIT_SIM_RATE)
+    mouse_pos, mouse_pressed = pygame.math.Vector2(0, 0), False
+    frame = 0
+    while not stop.is_set():
+        for event in drain(inbox):
+            if event[0] == "mouse":
+                mouse_pos, mouse_pressed = pygame.math.Vector2(event[1]), event[2]
+            else:
+                handle_key(event[1], agents, target_manager)
+        for agent in agents:
+            agent.update(target_manager, mouse_pos, mouse_pressed)
+        frame += 1
+        if recorder is not None:
+            slot = recorder.acquire(frame)
+            if slot is not None:
+                write_frame(slot, agents)
+                recorder.commit()
+        write_frame(frames.back(), agents)
+        frames.publish(frame)
+        pacer.wait()
+    if recorder is not None:
+        recorder.close()
+    frames.close()
+
+def headless(max_frames, vacuum_frames, done_fraction):
+    """Sweep run (vajra_common.sweep): no window, no mouse; the goal is the first image filled"""
+    target_manager = TargetManager()
+    agents = [Agent(i) for i in range(NUM_AGENTS)]
+    no_mouse = pygame.math.Vector2(-1e9, -1e9)
+    fillable = max(1, min(NUM_AGENTS, len(target_manager.targets))) # More targets than agents: fill what we can
+
+    def step(frame):
+        for agent in agents:
+            agent.update(target_manager, no_mouse, False)
+
+    return run_headless(step, lambda: sum(a.state == "LOCKED" for a in agents) / fillable,
+                        max_frames, done_fraction, "image")
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", metavar="TRAJECTORY", help="Play a recording instead of simulating")
+    parser.add_argument("--split", action="store_true", help="Agents in their own process")
+    args = parser.parse_args()
+    if args.replay:
+        replay(args.replay)
+    elif args.split:
+        split()
+    else:
+        main()
@@ -0,0 +1,177 @@
+import math
+import taichi as ti
+from config import *
+from spatial_grid import inclusive_scan, next_pow2
+
+RADIX_BITS = 8 # Key bits per counting-sort pass
+RADIX = 1 << RADIX_BITS
+SORT_BLOCK = 256 # Consecutive items per thread in a pass
+
+ints = ti.types.ndarray(dtype=ti.i32, ndim=1)
+vecs = ti.types.ndarray(dtype=ti.math.vec3, ndim=1)
+
+@ti.data_oriented
+class TargetAssigner:
+    """
+    Approximate optimal-transport pairing of agents with target slots, run
+    whenever the targets change so each agent travels to a nearby slot.
+
+    Recursive coordinate bisection: every segment holds as many agents as
+    slots. It is split at the median along the longest axis of its slots,
+    with the lower half of the agents (along the same axis) going with the
+    lower half of the slots. After log2(N) levels each segment is one
+    agent/slot pair.
+
+    Every segment of every level is split at once: one sort of all items
+    by bucket, where segment [a, b) owns buckets [a, b). The sort is a
+    stable LSD radix sort, RADIX_BITS of the key per pass. Each pass is a
+    counting sort over blocks of SORT_BLOCK items: per-block digit counts,
+    a prefix sum ordered by (digit, block), then every block scatters its
+    items in order from its own offsets. Equal keys keep their order
+    without any serial step, so each level is O(N), fully parallel and
+    deterministic.
+
+    The work arrays (~100 bytes per item) are ndarrays allocated by
+    assign() and freed when it returns, so they cost nothing between
+    shape changes.
+    """
+    def __init__(self, pos, target):
+        self.pos = pos
+        self.target = target
+        self.num_items = pos.shape[0]
+        self.num_levels = max(1, math.ceil(math.log2(max(self.num_items, 2))))
+        self.num_passes = -(-max(1, (self.num_items - 1).bit_length()) // RADIX_BITS) # Keys are < num_items
+        self.num_blocks = -(-self.num_items // SORT_BLOCK)
+        self.num_counts = -(-RADIX * self.num_blocks // GRID_SCAN_BLOCK) * GRID_SCAN_BLOCK
+
+    def scratch(self):
+        n = self.num_items
+        return {
+            # Agent / slot ids laid out by segment; segment bounds per position
+            "agent_ids": ti.ndarray(ti.i32, n), "slot_ids": ti.ndarray(ti.i32, n),
+            "seg_lo": ti.ndarray(ti.i32, n), "seg_hi": ti.ndarray(ti.i32, n),
+            # Bounding boxes, indexed by segment start; slot positions
+            "agent_min": ti.Vector.ndarray(3, ti.f32, n), "agent_max": ti.Vector.ndarray(3, ti.f32, n),
+            "slot_min": ti.Vector.ndarray(3, ti.f32, n), "slot_max": ti.Vector.ndarray(3, ti.f32, n),
+            "slots": ti.Vector.ndarray(3, ti.f32, n),
+            # Radix sort: keys, item order ping-ponged between passes, digit counts by (digit, block)
+            "key": ti.ndarray(ti.i32, n), "order": ti.ndarray(ti.i32, n), "order_next": ti.ndarray(ti.i32, n),
+            "digit_count": ti.ndarray(ti.i32, self.num_counts), "digit_end": ti.ndarray(ti.i32, self.num_counts),
+            "block_sum": ti.ndarray(ti.i32, self.num_counts // GRID_SCAN_BLOCK),
+        }
+
+    def scratch_bytes(self):
+        """Peak bytes of the work arrays while assign() runs"""
+        return 4 * (7 * self.num_items + 5 * 3 * self.num_items + 2 * self.num_counts + self.num_counts // GRID_SCAN_BLOCK)
+
+    @ti.kernel
+    def begin(self, agent_ids: ints, slot_ids: ints, seg_lo: ints, seg_hi: ints, slots: vecs):
+        for k in range(self.num_items):
+            agent_ids[k] = k
+            slot_ids[k] = k
+            seg_lo[k] = 0
+            seg_hi[k] = self.num_items
+            slots[k] = self.target[k]
+
+    @ti.func
+    def split_axis(self, slot_min: ti.template(), slot_max: ti.template(), a):
+        extent = slot_max[a] - slot_min[a]
+        axis = 0
+        if extent.y > extent[axis]:
+            axis = 1
+        if extent.z > extent[axis]:
+            axis = 2
+        return axis
+
+    @ti.func
+    def radix_pass(self, shift, key: ti.template(), src: ti.template(), dst: ti.template(),
+                   digit_count: ti.template(), digit_end: ti.template(), block_sum: ti.template()):
+        # Stable counting sort of src into dst by one digit of key
+        for t in range(self.num_blocks):
+            for d in range(RADIX):
+                digit_count[d * self.num_blocks + t] = 0
+            for q in range(t * SORT_BLOCK, ti.min((t + 1) * SORT_BLOCK, self.num_items)):
+                d = (key[src[q]] >> shift) & (RADIX - 1)
+                digit_count[d * self.num_blocks + t] += 1
+        inclusive_scan(digit_count, digit_end, block_sum, block_sum.shape[0])
+        for t in range(self.num_blocks):
+            for q in range(t * SORT_BLOCK, ti.min((t + 1) * SORT_BLOCK, self.num_items)):
+                k = src[q]
+                h = ((key[k] >> shift) & (RADIX - 1)) * self.num_blocks + t
+                dst[digit_end[h] - digit_count[h]] = k # Block's next slot for this digit
+                digit_count[h] -= 1
+
+    @ti.func
+    def sort_segments(self, ids: ti.template(), src: ti.template(), lo_box: ti.template(), hi_box: ti.template(),
+                      seg_lo: ti.template(), seg_hi: ti.template(), slot_min: ti.template(), slot_max: ti.template(),
+                      key: ti.template(), order: ti.template(), order_next: ti.template(),
+                      digit_count: ti.template(), digit_end: ti.template(), block_sum: ti.template()):
+        # Sort of every segment by its split-axis coordinate
+        for k in range(self.num_items):
+            a = seg_lo[k]
+            size = seg_hi[k] - a
+            axis = self.split_axis(slot_min, slot_max, a)
+            lo = lo_box[a][axis]
+            span = ti.max(hi_box[a][axis] - lo, 1e-9)
+            p = src[ids[k]] # Local copy: packed fields can't be indexed by a runtime axis
+            rank = int((p[axis] - lo) / span * size)
+            key[k] = a + ti.math.clamp(rank, 0, size - 1)
+            order[k] = k
+        for p in ti.static(range(self.num_passes)):
+            if ti.static(p % 2 == 0):
+                self.radix_pass(p * RADIX_BITS, key, order, order_next, digit_count, digit_end, block_sum)
+            else:
+                self.radix_pass(p * RADIX_BITS, key, order_next, order, digit_count, digit_end, block_sum)
+        # key is free again: it holds the ids in sorted order before they go back
+        if ti.static(self.num_passes % 2 == 1):
+            for k in range(self.num_items):
+                key[k] = ids[order_next[k]]
+        else:
+            for k in range(self.num_items):
+                key[k] = ids[order[k]]
+        for k in range(self.num_items):
+            ids[k] = key[k]
+
+    @ti.kernel
+    def split_level(self, agent_ids: ints, slot_ids: ints, seg_lo: ints, seg_hi: ints,
+                    agent_min: vecs, agent_max: vecs, slot_min: vecs, slot_max: vecs, slots: vecs,
+                    key: ints, order: ints, order_next: ints, digit_count: ints, digit_end: ints, block_sum: ints):
+        # 1. Per-segment bounding boxes
+        for k in range(self.num_items):
+            if k == seg_lo[k]:
+                agent_min[k] = ti.Vector([1e30, 1e30, 1e30])
+                agent_max[k] = ti.Vector([-1e30, -1e30, -1e30])
+                slot_min[k] = ti.Vector([1e30, 1e30, 1e30])
+                slot_max[k] = ti.Vector([-1e30, -1e30, -1e30])
+        for k in range(self.num_items):
+            a = seg_lo[k]
+            ti.atomic_min(agent_min[a], self.pos[agent_ids[k]])
+            ti.atomic_max(agent_max[a], self.pos[agent_ids[k]])
+            ti.atomic_min(slot_min[a], slots[slot_ids[k]])
+            ti.atomic_max(slot_max[a], slots[slot_ids[k]])
+
+        # 2. Order both sets along the slots' longest axis
+        self.sort_segments(slot_ids, slots, slot_min, slot_max, seg_lo, seg_hi, slot_min, slot_max,
+                           key, order, order_next, digit_count, digit_end, block_sum)
+        self.sort_segments(agent_ids, self.pos, agent_min, agent_max, seg_lo, seg_hi, slot_min, slot_max,
+                           key, order, order_next, digit_count, digit_end, block_sum)
+
+        # 3. Halve every segment
+        for k in range(self.num_items):
+            mid = (seg_lo[k] + seg_hi[k]) // 2
+            if k < mid:
+                seg_hi[k] = mid
+            else:
+                seg_lo[k] = mid
+
+    @ti.kernel
+    def write_targets(self, agent_ids: ints, slot_ids: ints, slots: vecs):
+        for k in range(self.num_items):
+            self.target[agent_ids[k]] = slots[slot_ids[k]]
+
+    def assign(self):
+        s = self.scratch()
+        self.begin(s["agent_ids"], s["slot_ids"], s["seg_lo"], s["seg_hi"], s["slots"])
+        for _ in range(self.num_levels):
+            self.split_level(**s)
+        self.write_targets(s["agent_ids"], s["slot_ids"], s["slots"])
@@ -0,0 +1,188 @@
+import numpy as np
+import taichi as ti
+from config import *
+from physics import PhysicsEngine
+from assignment import TargetAssigner
+from shape_bank import ShapeBank
+from morton import MortonOrder
+from metrics import LOCKED, AWAKE, MEAN_DIST, MAX_DIST, KINETIC, summary
+
+TUNABLES = ("SEPARATION_FORCE", "VELOCITY_DAMPING", "SNAP_DISTANCE", "WAKE_COUPLING")
+
+@ti.data_oriented
+class BatchedPhysics(PhysicsEngine):
+    """
+    B independent swarms of NUM_AGENTS agents in one set of fields, stepped
+    by the same kernel launches. Instance b owns agents
+    [b * NUM_AGENTS, (b + 1) * NUM_AGENTS) and its own value of every
+    TUNABLES setting; anything left out of its params dict keeps the config
+    value. All instances spawn alike and chase the same shape, each in its
+    own group of the spatial grid, so they never meet. Frozen instances
+    (freeze(); run_until_converged freezes the converged ones) drop out of
+    the active list and the grids, so they cost nothing per frame.
+
+        physics = BatchedPhysics([{"SEPARATION_FORCE": 0.5}, {"SEPARATION_FORCE": 2.0}])
+        frames, metrics, converged_at = run_until_converged(physics)
+    """
+    def __init__(self, params):
+        self.params = [dict(p) for p in params]
+        for p in self.params:
+            for name in p:
+                if name not in TUNABLES:
+                    raise KeyError(f"Not a batch tunable: {name} (one of {', '.join(TUNABLES)})")
+        self.instances = len(self.params)
+        self.allocate(self.instances * NUM_AGENTS, transforms=False)
+        self.param_separation = self.param_field("SEPARATION_FORCE", SEPARATION_FORCE)
+        self.param_damping = self.param_field("VELOCITY_DAMPING", VELOCITY_DAMPING, lambda d: d ** PHYSICS_DT)
+        self.param_snap = self.param_field("SNAP_DISTANCE", SNAP_DISTANCE)
+        self.param_coupling = self.param_field("WAKE_COUPLING", WAKE_COUPLING)
+        self.instance_frozen = ti.field(dtype=ti.i32, shape=self.instances)
+        self.frozen_mask = np.zeros(self.instances, dtype=bool)
+
+        self.make_grids(group_size=NUM_AGENTS)
+        # Shapes and target assignment work on one instance at a time
+        self.shape_target = ti.Vector.field(3, dtype=ti.f32, shape=NUM_AGENTS)
+        self.instance_pos = ti.Vector.field(3, dtype=ti.f32, shape=NUM_AGENTS)
+        self.assigner = TargetAssigner(self.instance_pos, self.shape_target)
+        self.bank = ShapeBank(self.shape_target)
+        self.load_shapes()
+        self.morton = MortonOrder(self.pos, group_size=NUM_AGENTS) if REORDER_INTERVAL > 0 else None
+
+        self.init_agents()
+        self.shape_idx = 0
+        self.assign_targets()
+        self.rebuild_active()
+        self.build_grids()
+        self.metrics = BatchMetrics(self)
+        self.metrics.compute()
+
+    def param_field(self, name, default, convert=float):
+        f = ti.field(dtype=ti.f32, shape=self.instances)
+        f.from_numpy(np.array([convert(p.get(name, default)) for p in self.params], dtype=np.float32))
+        return f
+
+    # --- Tunables ---
+
+    @ti.func
+    def separation_force(self, i):
+        return self.param_separation[i // NUM_AGENTS]
+
+    @ti.func
+    def damping(self, i):
+        return self.param_damping[i // NUM_AGENTS]
+
+    @ti.func
+    def snap_distance(self, i):
+        return self.param_snap[i // NUM_AGENTS]
+
+    @ti.func
+    def wake_coupling(self, i):
+        return self.param_coupling[i // NUM_AGENTS]
+
+    @ti.func
+    def frozen(self, i):
+        return self.instance_frozen[i // NUM_AGENTS] == 1
+
+    def freeze(self, mask):
+        """Stops stepping the instances where mask is True; all False thaws them"""
+        self.frozen_mask = np.array(mask, dtype=bool)
+        self.instance_frozen.from_numpy(self.frozen_mask.astype(np.int32))
+        self.wakes[None] = 1 # The next update re-lists without (or with) them
+
+    # --- Targets ---
+
+    def assign_targets(self):
+        # Each instance pairs its own agents with the slots of the active shape
+        for b in range(self.instances):
+            self.bank.activate(self.shape_idx) # The assigner permutes shape_target in place
+            if ASSIGN_TARGETS:
+                self.gather_instance(b)
+                self.assigner.assign()
+            self.scatter_targets(b)
+        if not ASSIGN_TARGETS:
+            self.targets_by_id()
+
+    @ti.kernel
+    def gather_instance(self, b: ti.i32):
+        for j in range(NUM_AGENTS):
+            self.instance_pos[j] = self.pos[b * NUM_AGENTS + j]
+
+    @ti.kernel
+    def scatter_targets(self, b: ti.i32):
+        for j in range(NUM_AGENTS):
+            self.target[b * NUM_AGENTS + j] = self.shape_target[j]
+
+@ti.data_oriented
+class BatchMetrics:
+    """SwarmMetrics per instance: a (B, 5) reduction, B dicts on the host"""
+    def __init__(self, physics):
+        self.physics = physics
+        self.values = ti.field(dtype=ti.f32, shape=(physics.instances, 5))
+        self.latest = None
+
+    @ti.func
+    def accumulate(self, i):
+        b = i // NUM_AGENTS
+        dist = (self.physics.target[i] - self.physics.pos[i]).norm()
+        ti.atomic_add(self.values[b, MEAN_DIST], dist)
+        ti.atomic_max(self.values[b, MAX_DIST], dist)
+        ti.atomic_add(self.values[b, KINETIC], 0.5 * self.physics.vel[i].norm_sqr())
+        if self.physics.is_locked[i] == 0:
+            ti.atomic_add(self.values[b, AWAKE], 1.0)
+
+    @ti.kernel
+    def reduce(self, full: ti.template()):
+        for b, k in self.values:
+            self.values[b, k] = 0.0
+        if ti.static(full):
+            for i in range(self.physics.num_agents):
+                self.accumulate(i)
+        else:
+            for k in range(self.physics.num_active[None]):
+                self.accumulate(self.physics.active_ids[k])
+        for b in range(self.values.shape[0]):
+            self.values[b, LOCKED] = (NUM_AGENTS - self.values[b, AWAKE]) / NUM_AGENTS
+            self.values[b, MEAN_DIST] /= NUM_AGENTS
+
+    def compute(self, full=False):
+        self.reduce(bool(full))
+        latest = [summary(v) for v in self.values.to_numpy()]
+        if not full and self.latest is not None:
+            # Frozen instances are not listed: keep their numbers from when they froze
+            latest = [old if frozen else new for old, new, frozen in zip(self.latest, latest, self.physics.frozen_mask)]
+        self.latest = latest
+        return self.latest
+
+    def converged(self, locked_fraction=CONVERGED_LOCKED_FRACTION):
+        """Bool per instance"""
+        if self.latest is None:
+            return np.zeros(self.physics.instances, dtype=bool)
+        return np.array([m["awake"] == 0 or m["locked_fraction"] >= locked_fraction for m in self.latest])
+
+def run_until_converged(physics, max_frames=100000, locked_fraction=CONVERGED_LOCKED_FRACTION,
+                        check_every=METRICS_INTERVAL):
+    """
+    metrics.run_until_converged for a batch: steps until every instance has
+    converged. Returns (frames, metrics, converged_at), where converged_at[b]
+    is the first checked frame instance b had converged by (None if never).
+    Converged instances are frozen until it returns, so the frame cost
+    follows the instances still running.
+    """
+    check_every = max(1, check_every)
+    converged_at = [None] * physics.instances
+    try:
+        for frame in range(1, max_frames + 1):
+            physics.update()
+            if frame % check_every == 0 or physics.num_awake == 0:
+                physics.metrics.compute()
+                for b in np.flatnonzero(physics.metrics.converged(locked_fraction)):
+                    if converged_at[b] is None:
+                        converged_at[b] = frame
+                done = np.array([f is not None for f in converged_at])
+                if done.all():
+                    return frame, physics.metrics.latest, converged_at
+                if (done != physics.frozen_mask).any():
+                    physics.freeze(done)
+        return max_frames, physics.metrics.compute(), converged_at
+    finally:
+        physics.freeze(np.zeros(physics.instances, dtype=bool))
@@ -0,0 +1,165 @@
+"""
+Headless Phase 3 benchmark: no window, no renderer.
+
+    python benchmark.py --arch cpu --threads 4 --agents 14096,100000 \
+        --scenarios converge,next_shape,blast --out results.jsonl
+
+Each (agents, scenario) pair runs in a fresh subprocess, so NUM_AGENTS (and
+any --set KEY=VALUE override) is patched into config before the physics
+modules import it. One JSON line per run goes to --out (or stdout).
+Compare, e.g., --set REORDER_INTERVAL=0 with --set REORDER_INTERVAL=50
+to see what the Z-order re-sort buys at a given swarm size.
+"""
+import argparse
+import ast
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+SCENARIOS = ("converge", "next_shape", "blast")
+RESULT_PREFIX = "RESULT "
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--arch", default="cpu", help="cpu, gpu, cuda, vulkan, metal, ...")
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads (0 = Taichi default)")
+    parser.add_argument("--agents", default="14096", help="Comma-separated NUM_AGENTS sweep")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--max-frames", type=int, default=5000, help="Give up converging after this many frames")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Config override, e.g. --set SUBSTEPS=4 (repeatable)")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds per run")
+    parser.add_argument("--out", default=None, help="JSON-lines file (default: stdout)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scenario", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+# --- Worker (one run, fresh process) ---
+
+def timed_converge(physics, max_frames):
+    import config
+    import taichi as ti
+    from metrics import run_until_converged
+    ti.sync()
+    start = time.perf_counter()
+    frames, metrics, converged = run_until_converged(physics, max_frames=max_frames)
+    ti.sync()
+    seconds = time.perf_counter() - start
+    return {
+        "frames": frames,
+        "converged": converged,
+        "converge_s": seconds,
+        "steps_per_sec": frames * config.SUBSTEPS / seconds if seconds > 0 else None,
+        "locked_fraction": metrics["locked_fraction"],
+    }
+
+def run_worker(args):
+    import config
+    config.NUM_AGENTS = int(args.agents)
+    for item in args.set:
+        key, value = item.split("=", 1)
+        if not hasattr(config, key):
+            raise KeyError(f"Unknown config key: {key}")
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass # Plain string
+        setattr(config, key, value)
+
+    import taichi as ti
+    from startup import init_taichi, warmup
+    init_kwargs = {}
+    if args.threads > 0:
+        init_kwargs["cpu_max_num_threads"] = args.threads
+    taichi_init_s = init_taichi(getattr(ti, args.arch), **init_kwargs)
+    from physics import PhysicsEngine
+
+    result = {"scenario": args.scenario, "agents": config.NUM_AGENTS, "arch": args.arch,
+              "threads": args.threads, "overrides": args.set,
+              "offline_cache": config.OFFLINE_CACHE, "taichi_init_s": taichi_init_s}
+
+    start = time.perf_counter()
+    physics = PhysicsEngine()
+    ti.sync()
+    result["init_s"] = time.perf_counter() - start
+    budget = physics.memory_budget()
+    result["bytes_per_agent"] = sum(sum(fields.values()) for fields in budget.values()) / physics.num_agents
+    result["transient_bytes_per_agent"] = sum(physics.transient_budget().values()) / physics.num_agents
+    if config.WARMUP:
+        result["warmup"] = warmup(physics)
+
+    # Without warmup the first frame carries the step kernel's compile; keep it out of steps/sec
+    start = time.perf_counter()
+    physics.update()
+    ti.sync()
+    result["first_frame_s"] = time.perf_counter() - start
+
+    if args.scenario == "converge":
+        result.update(timed_converge(physics, args.max_frames))
+    else:
+        result["settle"] = timed_converge(physics, args.max_frames)
+        start = time.perf_counter()
+        if args.scenario == "next_shape":
+            physics.next_shape()
+        elif args.scenario == "blast":
+            physics.disrupt((0.0, 0.0, 15.0), (0.0, 0.0, -1.0)) # Camera start, straight at the shape
+        else:
+            raise ValueError(f"Unknown scenario: {args.scenario}")
+        ti.sync()
+        result["event_s"] = time.perf_counter() - start
+        result["woken"] = physics.metrics.compute(full=True)["awake"] # Active list is stale until the next update
+        result.update(timed_converge(physics, args.max_frames))
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+# --- Driver ---
+
+def run_one(args, agents, scenario):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--agents", str(agents),
+           "--scenario", scenario, "--arch", args.arch, "--threads", str(args.threads),
+           "--max-frames", str(args.max_frames)]
+    for item in args.set:
+        cmd += ["--set", item]
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        proc = subprocess.run(cmd, cwd=here, capture_output=True, text=True, timeout=args.timeout)
+    except subprocess.TimeoutExpired:
+        return {"scenario": scenario, "agents": agents, "arch": args.arch, "error": "timeout"}
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    return {"scenario": scenario, "agents": agents, "arch": args.arch,
+            "error": (proc.stderr.strip().splitlines() or ["no result"])[-1]}
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        run_worker(args)
+        return
+
+    out = open(args.out, "a") if args.out else sys.stdout
+    for agents in [int(a) for a in args.agents.split(",")]:
+        for scenario in args.scenarios.split(","):
+            result = run_one(args, agents, scenario)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            if "error" in result:
+                print(f"{scenario:>10} {agents:>9}  ERROR {result['error']}", file=sys.stderr)
+            else:
+                print(f"{scenario:>10} {agents:>9}  {result['steps_per_sec']:9.1f} steps/s  "
+                      f"{result['converge_s']:7.2f}s to converge ({result['frames']} frames)  "
+                      f"{result['peak_rss_mb']:7.1f} MB", file=sys.stderr)
+    if args.out:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Per-agent storage, full or compact (COMPACT_STORAGE).
+
+Compact mode trades precision nobody sees for bytes:
+    positions  3 x 21-bit fixed point in one 64-bit word, within
+               +-COMPACT_EXTENT of the origin (3e-5 steps at 32)
+    velocities f16
+    lock flags 2 bits, 16 agents to a 32-bit word
+    wake flags i8
+and no per-agent instance matrices ("mesh" draws particles instead). Targets
+are packed like positions; shape bank rows stay in host memory. The morton
+buffers are only allocated with REORDER_INTERVAL > 0, in either mode, and
+the target assigner's work arrays only while it runs.
+Kernels read and write these like any field; only to_numpy / from_numpy
+need the helpers below, and positions must be clamped with fit().
+"""
+import numpy as np
+import taichi as ti
+from config import *
+
+POS_BITS = 21
+LOCK_BITS = 2
+LOCKS_PER_WORD = 32 // LOCK_BITS
+
+_packed = {} # id(field) -> (bytes per element, elements), for fields numpy can't see
+
+def pos_field(shape):
+    if not COMPACT_STORAGE:
+        return ti.Vector.field(3, dtype=ti.f32, shape=shape)
+    shape = (shape,) if isinstance(shape, int) else tuple(shape)
+    fixed = ti.types.quant.fixed(bits=POS_BITS, signed=True, max_value=COMPACT_EXTENT)
+    f = ti.Vector.field(3, dtype=fixed)
+    words = ti.BitpackedFields(max_num_bits=64)
+    words.place(f)
+    ti.root.dense(ti.axes(*range(len(shape))), shape).place(words)
+    _packed[id(f)] = (8, int(np.prod(shape)))
+    return f
+
+def vel_field(count):
+    return ti.Vector.field(3, dtype=ti.f16 if COMPACT_STORAGE else ti.f32, shape=count)
+
+def lock_field(count):
+    if not COMPACT_STORAGE:
+        return ti.field(dtype=ti.i32, shape=count)
+    f = ti.field(dtype=ti.types.quant.int(bits=LOCK_BITS, signed=False))
+    words = -(-count // LOCKS_PER_WORD)
+    ti.root.dense(ti.i, words).quant_array(ti.i, LOCKS_PER_WORD, max_num_bits=32).place(f)
+    _packed[id(f)] = (LOCK_BITS / 8, count) # The last word may hold a few spare slots
+    return f
+
+def flag_field(count):
+    return ti.field(dtype=ti.i8 if COMPACT_STORAGE else ti.i32, shape=count)
+
+@ti.func
+def fit(p):
+    # Compact positions wrap past the extent; keep them on its edge instead
+    if ti.static(COMPACT_STORAGE):
+        p = ti.math.clamp(p, -COMPACT_EXTENT, COMPACT_EXTENT)
+    return p
+
+# --- Host copies ---
+
+def _by_kernel(f):
+    return id(f) in _packed or f.dtype == ti.f16
+
+@ti.kernel
+def _vec_out(f: ti.template(), out: ti.types.ndarray()):
+    for i in range(out.shape[0]):
+        for k in ti.static(range(3)):
+            out[i, k] = f[i][k]
+
+@ti.kernel
+def _vec_in(f: ti.template(), arr: ti.types.ndarray()):
+    for i in range(arr.shape[0]):
+        for k in ti.static(range(3)):
+            if ti.static(f.dtype == ti.f16):
+                f[i][k] = ti.cast(arr[i, k], ti.f16)
+            else:
+                f[i][k] = arr[i, k]
+
+@ti.kernel
+def _scalar_out(f: ti.template(), out: ti.types.ndarray()):
+    for i in range(out.shape[0]):
+        out[i] = ti.cast(f[i], ti.i32)
+
+@ti.kernel
+def _scalar_in(f: ti.template(), arr: ti.types.ndarray()):
+    for i in range(arr.shape[0]):
+        f[i] = arr[i]
+
+def length(f):
+    return _packed[id(f)][1] if id(f) in _packed else f.shape[0]
+
+def to_numpy(f):
+    """f.to_numpy() for any storage; packed fields come back as float32 / int32"""
+    if not _by_kernel(f):
+        return f.to_numpy()
+    if isinstance(f, ti.MatrixField):
+        out = np.zeros((length(f), 3), dtype=np.float32)
+        _vec_out(f, out)
+    else:
+        out = np.zeros(length(f), dtype=np.int32)
+        _scalar_out(f, out)
+    return out
+
+def from_numpy(f, arr):
+    if not _by_kernel(f):
+        f.from_numpy(arr)
+    elif isinstance(f, ti.MatrixField):
+        _vec_in(f, np.ascontiguousarray(arr, dtype=np.float32))
+    else:
+        _scalar_in(f, np.ascontiguousarray(arr, dtype=np.int32))
+
+# --- Budget ---
+
+DTYPE_BYTES = {ti.f16: 2, ti.f32: 4, ti.f64: 8, ti.i8: 1, ti.u8: 1, ti.i16: 2, ti.u16: 2,
+               ti.i32: 4, ti.u32: 4, ti.i64: 8, ti.u64: 8}
+
+def field_bytes(f):
+    if id(f) in _packed:
+        per, count = _packed[id(f)]
+        return per * count
+    per = DTYPE_BYTES[f.dtype] * (f.n * f.m if isinstance(f, ti.MatrixField) else 1)
+    return per * int(np.prod(f.shape))
+
+def byte_budget(owners):
+    """{owner: {field: bytes}} for every field of each object in owners ({name: object})"""
+    budget, seen = {}, set()
+    for owner, obj in owners.items():
+        budget[owner] = {}
+        for name, f in vars(obj).items():
+            if isinstance(f, ti.Field) and id(f) not in seen: # Shared fields count for their first owner
+                seen.add(id(f))
+                if field_bytes(f) > 0:
+                    budget[owner][name] = field_bytes(f)
+    return budget
+
+def report_budget(budget, count, transient=None, prefix="[memory]"):
+    """transient: {owner: bytes} allocated only while that owner runs, on top of the total"""
+    total = sum(sum(fields.values()) for fields in budget.values())
+    mode = "compact" if COMPACT_STORAGE else "full"
+    print(f"{prefix} {total / count:.1f} bytes/agent ({mode} storage), {total / 2 ** 20:.0f} MB for {count} agents")
+    for owner, fields in budget.items():
+        parts = ", ".join(f"{name} {b / count:.2f}" for name, b in sorted(fields.items(), key=lambda kv: -kv[1]))
+        print(f"{prefix}   {owner}: {sum(fields.values()) / count:.1f} ({parts})")
+    for owner, b in (transient or {}).items():
+        print(f"{prefix}   + {owner}, only while it runs: {b / count:.1f}")
@@ -1,3 +1,5 @@
+import os
+
 # --- SIMULATION SETTINGS ---
 NUM_AGENTS = 14096
 VOXEL_SIZE = 0.02
@@ -11,12 +13,95 @@ SEPARATION_FORCE = 1.0
 ALIGNMENT_FORCE = 0.5
 COHESION_FORCE = 0.2
 
+# --- SPATIAL GRID ---
+GRID_TABLE_FACTOR = 2 # Hash buckets per agent (rounded up to a power of 2)
+GRID_SCAN_BLOCK = 256 # Buckets per prefix-sum block
+MAX_NEIGHBORS = 32 # Separation stops after this many true neighbors
+SEPARATION_SCALE = 0.01 # Per-frame push at full overlap (before SEPARATION_FORCE)
+
+# --- STEPPING ---
+SUBSTEPS = 1 # Physics steps fused into one launch per rendered frame (raise at small N)
+PHYSICS_DT = 1.0 # Step size in frames; sim time per rendered frame = SUBSTEPS * PHYSICS_DT
+VELOCITY_DAMPING = 0.96 # Velocity kept per frame of sim time
+DETERMINISTIC = True # Id-sorted grid buckets and ordered scatters: same SEED -> same run
+SEED = 0 # Spawn jitter seed
+RELIST_FRACTION = 1 / 64 # Agents that lock stay in the active list until they are half of it and this share of N
+WAKE_LIST_FRACTION = 1 / 16 # Neighbor wakes per frame (share of N) appended to the active list; more = full rebuild
+REORDER_INTERVAL = 0 # Frames between Z-order re-sorts of the agent arrays for cache locality (0 = off)
+
+# --- COMPACT STORAGE ---
+# Bit-packed positions, f16 velocities, 2-bit lock flags and no instance matrices (see compact.py):
+# for swarms too big for full storage. "mesh" renders as particles; positions are clamped to +-COMPACT_EXTENT
+COMPACT_STORAGE = False
+COMPACT_EXTENT = 32.0 # Half-width of the box positions can hold (covers STAGING_POS)
+
 # --- RESTING & STAGING ---
 SNAP_DISTANCE = 0.05 # Distance to snap to target
 STAGING_POS = (-20.0, 0.0, 0.0) # Start far left
+ASSIGN_TARGETS = True # Re-pair agents with nearby slots on shape change
+WAKE_SPEED = 0.05 # Agents faster than this wake locked neighbors...
+WAKE_RADIUS = 0.1 # ...within this distance (<= NEIGHBOR_RADIUS)
+WAKE_COUPLING = 0.2 # Share of a fast neighbor's relative velocity picked up per frame
+
+# --- BLAST ---
+BLAST_RADIUS = 3.0 # Cylinder radius around the mouse ray
+BLAST_LENGTH = 30.0 # Reach along the ray from the camera
+BLAST_FALLOFF = 0.0 # Push scales with (1 - dist / BLAST_RADIUS) ** BLAST_FALLOFF; 0 = uniform
+BLAST_CELL_COST = 8 # Walking one grid cell vs testing one agent; picks grid walk or full pass
+
+# --- METRICS ---
+METRICS_INTERVAL = 10 # Frames between on-device metric reductions (0 = off)
+CONVERGED_LOCKED_FRACTION = 1.0 # run_until_converged stops at this locked fraction
+
+# --- PROFILING ---
+PROFILE = False # Frame-phase timers + Taichi kernel profiler, shown in the GUI
+PROFILE_WINDOW = 120 # Frames kept for the rolling breakdown / histogram
+PROFILE_HIST_BINS = 8
+PROFILE_DUMP = None # Per-frame timings to this .jsonl or .csv file
+PROFILE_KERNELS = ("step", "rebuild_active", "reduce", "disrupt_cells", "disrupt_all", "activate_row", "sync_transforms", "cull")
+
+# --- STARTUP ---
+OFFLINE_CACHE = True # Keep compiled kernels across launches
+OFFLINE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ti_cache")
+WARMUP = True # Compile every kernel before the window opens (state is restored afterwards)
+
+# --- CHECKPOINTS ---
+# K saves, L loads. .npz = compressed archive; any other path = directory of .npy, memory-mapped on load
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoint")
+
+# --- RECORDING ---
+RECORD_PATH = None # Trajectory file (pos + lock state per frame); None = off
+RECORD_EVERY = 1 # Record every Nth frame
+RECORD_SLOTS = 8 # Frames buffered for the writer thread; beyond that frames are dropped
+RECORD_CHUNK = 32 # Frames per chunk (each chunk starts with a keyframe)
+RECORD_QUANTUM = VOXEL_SIZE / 256 # Position rounding (None = exact float32)
+REPLAY_CACHE_BYTES = 256 << 20 # Decoded chunks kept by replay.py
+REPLAY_PREFETCH = 2 # Chunks decoded ahead of the playhead
+
+# --- SHAPE BANK ---
+SHAPE_BANK_CAPACITY = 16 # Max shapes held on device (capacity * NUM_AGENTS * 12 bytes; host memory in compact storage)
+SHAPE_BANK_FILE = None # Optional .npz written by ShapeBank.save(); loaded instead of the built-ins
+
+# --- TARGET IMPORT ---
+TARGET_FILES = [] # OBJ / PLY / .npy sources added to the bank at startup; (path, mode) for mesh volumes
+TARGET_IMPORT_RADIUS = 2.5 # Imported shapes are scaled so their largest half-extent is this
+TARGET_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".target_cache")
+
+# --- SDF TARGETS ---
+SDF_AUTO_FIT = True # Scale SDF shapes so they hold ~NUM_AGENTS lattice voxels
+SDF_FIT_SLACK = 0.05 # Accept a fit holding up to this fraction of extra sites
+SDF_FIT_ITERS = 16
+SDF_HIST_BINS = 4096 # Depth histogram resolution for picking exactly N sites
 
 # --- VISUALS ---
 WINDOW_WIDTH = 1280
 WINDOW_HEIGHT = 720
 BG_COLOR = (0.05, 0.05, 0.08)
 AGENT_COLOR = (1.0, 0.8, 0.2)
+# "lod": frustum-culled, meshes near the camera and particles far away (culling.py);
+# "mesh": every agent as an instanced rhombic dodecahedron (4x4 per agent); "particles": spheres from pos only
+RENDER_MODE = "lod"
+LOD_PIXELS = 3.0 # "lod": agents drawn smaller than this many pixels across become particles (0 = all particles)
+MAX_MESH_INSTANCES = 1 << 16 # "lod": mesh buffer size; past it the nearest agents keep meshes, the rest draw as particles
+CAMERA_FOV = 60.0 # Vertical, degrees: the camera, mouse rays and culling all use it
+PARTICLE_RADIUS = VOXEL_SIZE * 0.75 # ~ the rhombic dodecahedron's inscribed radius
@@ -0,0 +1,164 @@
+import math
+import numpy as np
+import taichi as ti
+from config import *
+
+MESH, POINTS = 0, 1 # counts[] slots
+DIST_BINS = 1024 # Distance resolution for picking the nearest agents when meshes overflow
+CULL_RUNS = 4096 # Runs of consecutive agents written in parallel
+
+@ti.data_oriented
+class InstanceCuller:
+    """
+    Per-frame frustum culling and level of detail for the agents.
+
+    cull() tests every agent against the view frustum (padded by its
+    bounding radius) and writes the visible ones into two compacted
+    buffers: instance matrices for agents drawn at least LOD_PIXELS across,
+    points for the rest. Only those buffers go to the renderer, so draw cost
+    follows what is on screen rather than N. The mesh buffer holds at most
+    max_meshes agents; when more are near, the nearest get meshes and the
+    rest are drawn as points. A histogram of distance bins finds the bin
+    where the buffer fills, and in that bin the lowest indices win, so the
+    choice is the same every frame (no flicker from thread timing).
+    """
+    def __init__(self, pos, radius, max_meshes=MAX_MESH_INSTANCES):
+        self.pos = pos
+        self.num_items = pos.shape[0]
+        self.radius = radius # Bounding sphere of one agent's mesh
+        self.max_meshes = min(max_meshes, self.num_items)
+        self.transforms = ti.Matrix.field(4, 4, dtype=ti.f32, shape=max(self.max_meshes, 1))
+        self.points = ti.Vector.field(3, dtype=ti.f32, shape=self.num_items) # Float32 even for compact pos
+        self.counts = ti.field(dtype=ti.i32, shape=2)
+        self.hist = ti.field(dtype=ti.i32, shape=DIST_BINS) # Near agents per distance bin
+        self.bin = ti.field(dtype=ti.i16, shape=self.num_items) # Each agent's, from classify()
+        self.threshold_bin = ti.field(dtype=ti.i32, shape=())
+        self.below = ti.field(dtype=ti.i32, shape=()) # Near agents in bins before the threshold
+        self.run_edge = ti.field(dtype=ti.i32, shape=CULL_RUNS) # Threshold-bin agents per run, then offsets
+
+    def frustum(self, eye, forward, right, up, fov, aspect):
+        """Inward (normal, offset) rows for the near and four side planes"""
+        tan_v = math.tan(math.radians(fov) / 2.0)
+        tan_h = tan_v * aspect
+        normals = [forward]
+        for axis, tan in ((right, tan_h), (up, tan_v)):
+            for sign in (1.0, -1.0):
+                # Inside: d . forward * tan >= +-(d . axis), d = p - eye
+                normals.append(tuple(f * tan - sign * a for f, a in zip(forward, axis)))
+        planes = []
+        for n in normals:
+            length = math.sqrt(sum(c * c for c in n))
+            n = tuple(c / length for c in n)
+            planes.append(n + (-sum(c * e for c, e in zip(n, eye)),))
+        return np.array(planes, dtype=np.float32)
+
+    def update(self, eye, forward, right, up, fov, aspect):
+        """Culls and sorts into the buffers; returns (meshes, points) to draw"""
+        # Distance at which an agent's 2 * radius spans LOD_PIXELS of the window height
+        tan_v = math.tan(math.radians(fov) / 2.0)
+        lod_dist = self.radius * WINDOW_HEIGHT / (tan_v * LOD_PIXELS) if LOD_PIXELS > 0 else 0.0
+        self.cull(eye, self.frustum(eye, forward, right, up, fov, aspect), lod_dist)
+        meshes, points = self.counts.to_numpy()
+        return min(int(meshes), self.max_meshes), int(points)
+
+    @ti.func
+    def classify(self, i, eye, planes, lod_dist):
+        # Agent i's position and distance bin: -1 = off screen, DIST_BINS = far (points)
+        p = self.pos[i]
+        b = -1
+        visible = True
+        for k in ti.static(range(5)):
+            if planes[k, 0] * p.x + planes[k, 1] * p.y + planes[k, 2] * p.z + planes[k, 3] < -self.radius:
+                visible = False
+        if visible:
+            b = DIST_BINS
+            d = (p - eye).norm()
+            if d < lod_dist:
+                b = ti.min(int(d / lod_dist * DIST_BINS), DIST_BINS - 1)
+        return p, b
+
+    @ti.func
+    def transform(self, p):
+        T = ti.Matrix.identity(float, 4)
+        T[0, 3] = p.x
+        T[1, 3] = p.y
+        T[2, 3] = p.z
+        return T
+
+    @ti.kernel
+    def cull(self, eye: ti.types.vector(3, float), planes: ti.types.matrix(5, 4, float), lod_dist: ti.f32):
+        run = (self.num_items + CULL_RUNS - 1) // CULL_RUNS
+
+        # 1. Sort by distance: far agents are points, near ones take meshes while
+        #    they last (all of them unless the buffer overflows) and are binned
+        for b in range(DIST_BINS):
+            self.hist[b] = 0
+        self.counts[MESH] = 0
+        self.counts[POINTS] = 0
+        for i in range(self.num_items):
+            p, b = self.classify(i, eye, planes, lod_dist)
+            self.bin[i] = ti.cast(b, ti.i16)
+            if b == DIST_BINS:
+                self.points[ti.atomic_add(self.counts[POINTS], 1)] = p
+            elif b >= 0:
+                ti.atomic_add(self.hist[b], 1)
+                slot = ti.atomic_add(self.counts[MESH], 1)
+                if slot < self.max_meshes:
+                    self.transforms[slot] = self.transform(p)
+
+        # 2. On overflow, which near agents got meshes depends on thread timing
+        #    (flicker). Threshold: the bin where the nearest agents fill the buffer
+        cut = DIST_BINS
+        below = 0
+        total = 0
+        ti.loop_config(serialize=True)
+        for b in range(DIST_BINS):
+            if cut == DIST_BINS and total + self.hist[b] > self.max_meshes:
+                cut = b
+                below = total
+            total += self.hist[b]
+        self.threshold_bin[None] = cut
+        self.below[None] = below
+        overflow = 0
+        if cut < DIST_BINS:
+            overflow = self.num_items
+            self.counts[MESH] = 0
+
+        # 3. Threshold-bin agents per run of consecutive indices, then their offsets
+        threshold = self.threshold_bin[None]
+        for r in range(CULL_RUNS):
+            edge = 0
+            if threshold < DIST_BINS:
+                for i in range(r * run, ti.min((r + 1) * run, self.num_items)):
+                    if self.bin[i] == threshold:
+                        edge += 1
+            self.run_edge[r] = edge
+        edge_total = 0
+        ti.loop_config(serialize=True)
+        for r in range(CULL_RUNS):
+            edge = self.run_edge[r]
+            self.run_edge[r] = edge_total
+            edge_total += edge
+
+        # 4. Redo the near agents: nearer bins take meshes, farther ones points
+        for i in range(overflow):
+            b = ti.cast(self.bin[i], ti.i32)
+            if b >= 0 and b < threshold:
+                self.transforms[ti.atomic_add(self.counts[MESH], 1)] = self.transform(self.pos[i])
+            elif b > threshold and b < DIST_BINS:
+                self.points[ti.atomic_add(self.counts[POINTS], 1)] = self.pos[i]
+
+        # 5. The threshold bin fills the rest of the meshes in index order, so
+        #    the same agents get them every frame
+        for r in range(CULL_RUNS):
+            if threshold < DIST_BINS:
+                k = self.below[None] + self.run_edge[r]
+                for i in range(r * run, ti.min((r + 1) * run, self.num_items)):
+                    if self.bin[i] == threshold:
+                        if k < self.max_meshes:
+                            self.transforms[k] = self.transform(self.pos[i])
+                        else:
+                            self.points[ti.atomic_add(self.counts[POINTS], 1)] = self.pos[i]
+                        k += 1
+        if threshold < DIST_BINS:
+            self.counts[MESH] = self.max_meshes
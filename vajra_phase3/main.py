@@ -1,25 +1,63 @@
+import time
+import numpy as np
 import taichi as ti
+from config import *
 from physics import PhysicsEngine
 from renderer import Renderer
+from profiler import FrameProfiler
+from startup import init_taichi, warmup, report
+from compact import report_budget
+from vajra_common.trajectory import TrajectoryRecorder
 
-# Initialize Taichi
-ti.init(arch=ti.gpu)
+# Initialize Taichi (compiled kernels are cached in OFFLINE_CACHE_DIR)
+timings = {"taichi_init": init_taichi(ti.gpu)}
 
 def main():
+    start = time.perf_counter()
     physics = PhysicsEngine()
+    timings["physics_init"] = time.perf_counter() - start
+    if WARMUP:
+        timings["warmup"] = warmup(physics)
+    report(timings)
+    report_budget(physics.memory_budget(), physics.num_agents, physics.transient_budget())
     renderer = Renderer()
+    profiler = FrameProfiler()
+    recorder = None
+    if RECORD_PATH:
+        recorder = TrajectoryRecorder(
+            RECORD_PATH, {"pos": (np.float32, (NUM_AGENTS, 3)), "locked": (np.int8, (NUM_AGENTS,))},
+            every=RECORD_EVERY, slots=RECORD_SLOTS, chunk_frames=RECORD_CHUNK,
+            quanta={"pos": RECORD_QUANTUM}, meta={"num_agents": NUM_AGENTS, "voxel_size": VOXEL_SIZE})
     
     running = True
     while running:
+        profiler.begin_frame()
+
         # Input
-        running = renderer.handle_input(physics)
+        with profiler.phase("input"):
+            running = renderer.handle_input(physics)
         
         # Physics
-        physics.update()
-        physics.update_transforms()
+        with profiler.phase("physics"):
+            physics.update() # Also keeps instance transforms in sync
+
+        # Record (copy only; the writer thread compresses)
+        if recorder is not None:
+            with profiler.phase("record"):
+                slot = recorder.acquire(physics.frame)
+                if slot is not None:
+                    physics.export_frame(slot["pos"], slot["locked"])
+                    recorder.commit()
         
         # Render
-        renderer.render(physics)
+        renderer.render(physics, profiler)
+
+        profiler.end_frame(awake=physics.num_awake)
+
+    profiler.close()
+    if recorder is not None:
+        recorder.close()
+        print(f"Recorded {recorder.recorded} frames ({recorder.dropped} dropped): {RECORD_PATH}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,75 @@
+import taichi as ti
+from config import *
+
+LOCKED, AWAKE, MEAN_DIST, MAX_DIST, KINETIC = range(5)
+
+def summary(v):
+    """The 5 reduced values as a dict"""
+    return {
+        "locked_fraction": float(v[LOCKED]),
+        "awake": int(v[AWAKE]),
+        "mean_dist": float(v[MEAN_DIST]),
+        "max_dist": float(v[MAX_DIST]),
+        "kinetic_energy": float(v[KINETIC]),
+    }
+
+@ti.data_oriented
+class SwarmMetrics:
+    """
+    Convergence metrics reduced on device; only 5 numbers reach the host.
+
+    The per-frame pass walks the active list only: agents outside it are
+    locked, sitting on (or within SNAP_DISTANCE of) their target with zero
+    velocity, and count as distance 0. compute(full=True) walks every agent
+    for exact distances.
+    """
+    def __init__(self, physics):
+        self.physics = physics
+        self.values = ti.field(dtype=ti.f32, shape=5)
+        self.latest = None
+
+    @ti.func
+    def accumulate(self, i):
+        dist = (self.physics.target[i] - self.physics.pos[i]).norm()
+        ti.atomic_add(self.values[MEAN_DIST], dist)
+        ti.atomic_max(self.values[MAX_DIST], dist)
+        ti.atomic_add(self.values[KINETIC], 0.5 * self.physics.vel[i].norm_sqr())
+        if self.physics.is_locked[i] == 0:
+            ti.atomic_add(self.values[AWAKE], 1.0)
+
+    @ti.kernel
+    def reduce(self, full: ti.template()):
+        for k in ti.static(range(5)):
+            self.values[k] = 0.0
+        if ti.static(full):
+            for i in range(NUM_AGENTS):
+                self.accumulate(i)
+        else:
+            for k in range(self.physics.num_active[None]):
+                self.accumulate(self.physics.active_ids[k])
+        self.values[LOCKED] = (NUM_AGENTS - self.values[AWAKE]) / NUM_AGENTS
+        self.values[MEAN_DIST] /= NUM_AGENTS
+
+    def compute(self, full=False):
+        self.reduce(bool(full))
+        self.latest = summary(self.values.to_numpy())
+        return self.latest
+
+    def converged(self, locked_fraction=CONVERGED_LOCKED_FRACTION):
+        m = self.latest
+        return m is not None and (m["awake"] == 0 or m["locked_fraction"] >= locked_fraction)
+
+def run_until_converged(physics, max_frames=100000, locked_fraction=CONVERGED_LOCKED_FRACTION,
+                        check_every=METRICS_INTERVAL):
+    """
+    Steps headless until the locked fraction is reached (or nothing is awake).
+    Returns (frames, metrics, converged).
+    """
+    check_every = max(1, check_every)
+    for frame in range(1, max_frames + 1):
+        physics.update()
+        if frame % check_every == 0 or physics.num_awake == 0:
+            physics.metrics.compute()
+            if physics.metrics.converged(locked_fraction):
+                return frame, physics.metrics.latest, True
+    return max_frames, physics.metrics.compute(), False
@@ -0,0 +1,62 @@
+import taichi as ti
+from config import *
+
+MORTON_BITS = 10 # Per axis: a 1024^3 lattice over the swarm's bounds
+
+@ti.func
+def spread_bits(x):
+    # 10 bits -> every third bit of 30
+    x = (x | (x << 16)) & 0x030000FF
+    x = (x | (x << 8)) & 0x0300F00F
+    x = (x | (x << 4)) & 0x030C30C3
+    x = (x | (x << 2)) & 0x09249249
+    return x
+
+@ti.data_oriented
+class MortonOrder:
+    """
+    Z-order permutation of the agents, so agents close in space sit close
+    in memory and the neighbor loops walk cache lines instead of jumping.
+
+    sort() computes the permutation from positions (quantized to
+    MORTON_BITS per axis within bounds_lo..hi); permute(f) then applies it
+    to any per-agent field in place. With group_size > 0 (a batch) the
+    group is the top of the key, so each group keeps its own slot range.
+    The sort is a fixed odd-even merge network: same input, same order.
+    """
+    def __init__(self, pos, group_size=0):
+        self.pos = pos
+        self.num_items = pos.shape[0]
+        self.group_size = group_size
+        self.keys = ti.field(dtype=ti.i64, shape=self.num_items)
+        self.order = ti.field(dtype=ti.i32, shape=self.num_items) # New slot -> old slot
+        self.vec_scratch = ti.Vector.field(3, dtype=ti.f32, shape=self.num_items)
+        self.int_scratch = ti.field(dtype=ti.i32, shape=self.num_items)
+
+    @ti.kernel
+    def compute_keys(self, lo: ti.types.vector(3, float), hi: ti.types.vector(3, float)):
+        scale = (2 ** MORTON_BITS - 1) / ti.max(hi - lo, 1e-6)
+        for i in range(self.num_items):
+            q = ti.math.clamp((self.pos[i] - lo) * scale, 0.0, 2 ** MORTON_BITS - 1).cast(ti.i64)
+            code = spread_bits(q.x) | (spread_bits(q.y) << 1) | (spread_bits(q.z) << 2)
+            if ti.static(self.group_size > 0):
+                code |= ti.cast(i // self.group_size, ti.i64) << 32
+            self.keys[i] = code
+            self.order[i] = i
+
+    def sort(self, lo, hi):
+        self.compute_keys(lo, hi)
+        ti.algorithms.parallel_sort(self.keys, self.order)
+
+    def permute(self, f):
+        self.apply(f, self.vec_scratch if isinstance(f, ti.MatrixField) else self.int_scratch)
+
+    @ti.kernel
+    def apply(self, f: ti.template(), scratch: ti.template()):
+        for i in range(self.num_items):
+            scratch[i] = ti.cast(f[self.order[i]], scratch.dtype)
+        for i in range(self.num_items):
+            if ti.static(f.dtype in (ti.f16, ti.i8)): # Compact storage; scratch is wider
+                f[i] = ti.cast(scratch[i], f.dtype)
+            else:
+                f[i] = scratch[i]
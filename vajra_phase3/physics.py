@@ -1,125 +1,593 @@
+import math
+import os
+import sys
+import numpy as np
 import taichi as ti
 from config import *
-from targets import TargetGenerator
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Repo root
+from vajra_common import snapshot
+from shape_bank import ShapeBank
+from spatial_grid import SpatialGrid
+from assignment import TargetAssigner
+from metrics import SwarmMetrics
+from morton import MortonOrder
+import compact
+from compact import fit
+
+@ti.func
+def hash_random(i, salt):
+    # Stateless PCG hash -> [0, 1): same value for (SEED, i, salt) on any thread
+    state = ti.cast(i, ti.u32) * ti.u32(747796405) + ti.u32(2891336453) + ti.cast(salt + SEED * 7919, ti.u32) * ti.u32(2654435761)
+    word = ((state >> ((state >> ti.u32(28)) + ti.u32(4))) ^ state) * ti.u32(277803737)
+    word = (word >> ti.u32(22)) ^ word
+    return ti.cast(word >> ti.u32(8), ti.f32) * (1.0 / 16777216.0)
 
 @ti.data_oriented
 class PhysicsEngine:
     def __init__(self):
-        self.pos = ti.Vector.field(3, dtype=ti.f32, shape=NUM_AGENTS)
-        self.vel = ti.Vector.field(3, dtype=ti.f32, shape=NUM_AGENTS)
-        self.acc = ti.Vector.field(3, dtype=ti.f32, shape=NUM_AGENTS)
-        self.target = ti.Vector.field(3, dtype=ti.f32, shape=NUM_AGENTS)
-        self.transforms = ti.Matrix.field(4, 4, dtype=ti.f32, shape=NUM_AGENTS)
-        self.is_locked = ti.field(dtype=ti.i32, shape=NUM_AGENTS) # 1 = Locked/Resting
-        
-        self.target_gen = TargetGenerator(self.target)
+        self.allocate(NUM_AGENTS, transforms=RENDER_MODE == "mesh" and not COMPACT_STORAGE)
+        self.make_grids()
+        self.assigner = TargetAssigner(self.pos, self.target)
+        self.bank = ShapeBank(self.target)
+        self.load_shapes()
+        self.morton = MortonOrder(self.pos) if REORDER_INTERVAL > 0 else None
+
         self.init_agents()
-        self.target_gen.init_sphere() # Default
+        self.sync_transforms()
+        self.shape_idx = 0
+        self.bank.activate(self.shape_idx) # Default: first shape
+        self.assign_targets()
+        self.rebuild_active()
+        self.build_grids() # Valid for blasts before the first step
+        self.metrics = SwarmMetrics(self)
+        self.metrics.compute()
+
+    def allocate(self, count, transforms):
+        self.num_agents = count
+        # Full or compact storage per COMPACT_STORAGE (compact.py)
+        self.pos = compact.pos_field(count)
+        self.pos_next = compact.pos_field(count) # Written by a substep, committed after it
+        self.vel = compact.vel_field(count)
+        self.vel_next = compact.vel_field(count)
+        self.target = compact.pos_field(count)
+        # Instance matrices only for RENDER_MODE "mesh"; "lod" and particles draw from pos
+        self.transforms = None
+        self.use_transforms = transforms
+        if self.use_transforms:
+            self.transforms = ti.Matrix.field(4, 4, dtype=ti.f32, shape=count)
+        self.is_locked = compact.lock_field(count) # 1 = Locked/Resting, 2 = locks at commit
+        self.wake_flag = compact.flag_field(count) # Woken by a neighbor; applied on rebuild
+        # Fields are indexed by slot; reorder() moves agents between slots
+        self.agent_id = ti.field(dtype=ti.i32, shape=count) # Agent in each slot
+        self.slot_of = ti.field(dtype=ti.i32, shape=count) # Slot of each agent
+
+        # The active list: awake agents compacted to the front of active_ids,
+        # locked ones to the back (for the static grid). Agents that wake are
+        # appended; agents that lock stay listed, holding still, until they
+        # are enough of the list to be worth a full rebuild (see update)
+        self.active_ids = ti.field(dtype=ti.i32, shape=count)
+        self.num_active = ti.field(dtype=ti.i32, shape=())
+        self.locked_start = ti.field(dtype=ti.i32, shape=()) # Rebuild scratch: first locked slot
+        self.lock_changes = ti.field(dtype=ti.i32, shape=()) # Listed agents that are locked
+        self.wakes = ti.field(dtype=ti.i32, shape=()) # Bulk wakes (or moved locked agents): force a full rebuild
+        # Neighbor wakes requested inside a step, applied by the next update
+        self.woken_ids = ti.field(dtype=ti.i32, shape=max(1, int(count * WAKE_LIST_FRACTION)))
+        self.num_woken = ti.field(dtype=ti.i32, shape=())
+        self.num_awake = count
+        self.frame = 0
+        self.blast_stamp = ti.field(dtype=ti.i32, shape=count) # Last blast that touched each agent
+        self.max_speed = ti.field(dtype=ti.f32, shape=()) # Fastest move (snaps included) in the last step()
+        self.blast_id = 0
+
+    def make_grids(self, group_size=0):
+        # Awake agents (active_ids[:num_active]) are re-gridded every substep,
+        # locked ones (active_ids[num_active:]) only when the list is rebuilt
+        self.grid = SpatialGrid(self.pos, group_size=group_size, ids=self.active_ids)
+        self.static_grid = SpatialGrid(self.pos, group_size=group_size, ids=self.active_ids, shared=self.grid)
+        self.grids = (self.grid, self.static_grid)
+
+    @ti.kernel
+    def build_grids(self):
+        self.static_grid.rebuild(self.locked_start[None], self.num_agents)
+        self.grid.rebuild(0, self.num_active[None])
+
+    def bounds(self):
+        """AABB of the agents at the last grid builds, as host arrays"""
+        bounds = [grid.bounds() for grid in self.grids]
+        lo = np.minimum(*(b[0].to_numpy() for b in bounds))
+        hi = np.maximum(*(b[1].to_numpy() for b in bounds))
+        return lo, hi
+
+    def load_shapes(self):
+        if SHAPE_BANK_FILE and os.path.exists(SHAPE_BANK_FILE):
+            self.bank.load(SHAPE_BANK_FILE)
+        else:
+            self.bank.register_builtin()
+        for source in TARGET_FILES:
+            if isinstance(source, str):
+                self.bank.register_file(source)
+            else:
+                self.bank.register_file(*source)
 
     @ti.kernel
     def init_agents(self):
-        for i in range(NUM_AGENTS):
-            # Spawn at Staging Area (Far Left)
-            self.pos[i] = ti.Vector([
-                STAGING_POS[0] + (ti.random() * 5.0),
-                STAGING_POS[1] + (ti.random() * 5.0),
-                STAGING_POS[2] + (ti.random() * 5.0)
-            ])
-            self.vel[i] = ti.Vector([0.5, 0.0, 0.0]) # Initial velocity towards center
-            self.acc[i] = ti.Vector([0.0, 0.0, 0.0])
+        for i in range(self.num_agents):
+            # Spawn at Staging Area (Far Left); every instance of a batch spawns alike
+            j = i % NUM_AGENTS
+            self.pos[i] = fit(ti.Vector([
+                STAGING_POS[0] + (hash_random(j, 0) * 5.0),
+                STAGING_POS[1] + (hash_random(j, 1) * 5.0),
+                STAGING_POS[2] + (hash_random(j, 2) * 5.0)
+            ]))
+            self.vel[i] = ti.Vector([0.5, 0.0, 0.0], dt=self.vel.dtype) # Initial velocity towards center
             self.is_locked[i] = 0
-            self.transforms[i] = ti.Matrix.identity(float, 4)
+            self.agent_id[i] = i
+            self.slot_of[i] = i
+
+    def disrupt(self, ray_origin, ray_dir):
+        """
+        Raycast blast along a finite cylinder (BLAST_RADIUS x BLAST_LENGTH).
+        The segment is clipped to the swarm's bounds, then the grid cells the
+        cylinder overlaps are walked slab by slab along the ray's major axis,
+        so only agents in those cells are tested. Falls back to a full pass
+        when walking the cells would cost more than testing every agent.
+        ray_origin / ray_dir: plain 3-tuples (ray_dir normalized).
+        """
+        # The grids (and their bounds) are from the start of the last substep
+        # or older; pad by the furthest any agent can have moved since
+        h = self.grid.cell_size
+        drift = float(self.max_speed[None]) * SUBSTEPS * PHYSICS_DT
+        pad = BLAST_RADIUS + drift
+
+        # 1. Clip [0, BLAST_LENGTH] to the padded swarm bounds
+        lo, hi = self.bounds()
+        t_in, t_out = 0.0, BLAST_LENGTH
+        for a in range(3):
+            if abs(ray_dir[a]) < 1e-9:
+                if not lo[a] - pad <= ray_origin[a] <= hi[a] + pad:
+                    return # Parallel to this slab and outside it
+                continue
+            ta = (lo[a] - pad - ray_origin[a]) / ray_dir[a]
+            tb = (hi[a] + pad - ray_origin[a]) / ray_dir[a]
+            t_in, t_out = max(t_in, min(ta, tb)), min(t_out, max(ta, tb))
+        if t_in >= t_out:
+            return # Misses the swarm
+
+        # 2. Slabs of cells along the major axis m. The cylinder pokes
+        #    spread_m past the axis along m, and BLAST_RADIUS across in u, v
+        m = max(range(3), key=lambda a: abs(ray_dir[a]))
+        u, v = (m + 1) % 3, (m + 2) % 3
+        spread_m = BLAST_RADIUS * math.sqrt(max(0.0, 1.0 - ray_dir[m] ** 2)) + drift
+        m_in = ray_origin[m] + ray_dir[m] * t_in
+        m_out = ray_origin[m] + ray_dir[m] * t_out
+        slab_lo = math.floor((min(m_in, m_out) - spread_m) / h)
+        num_slabs = math.floor((max(m_in, m_out) + spread_m) / h) - slab_lo + 1
+        # Per slab the axis covers (h + 2 spread_m) / |d_m| of t
+        t_span = (h + 2 * spread_m) / abs(ray_dir[m])
+        width_u = math.ceil((abs(ray_dir[u]) * t_span + 2 * pad) / h) + 1
+        width_v = math.ceil((abs(ray_dir[v]) * t_span + 2 * pad) / h) + 1
+
+        if num_slabs * width_u * width_v * BLAST_CELL_COST > self.num_agents:
+            self.disrupt_all(ray_origin, ray_dir)
+        else:
+            self.blast_id += 1
+            axis = lambda a: tuple(int(a == k) for k in range(3))
+            self.disrupt_cells(ray_origin, ray_dir, self.blast_id, axis(m), axis(u), axis(v),
+                               slab_lo, num_slabs, width_u, width_v, t_in, t_out, spread_m, pad)
+
+    @ti.func
+    def blast_agent(self, i, ray_origin, ray_dir):
+        p = self.pos[i]
+        # Project onto the ray; only points in front of the camera, within reach
+        proj = (p - ray_origin).dot(ray_dir)
+        if proj > 0 and proj < BLAST_LENGTH:
+            # Closest point on the ray to the agent
+            closest = ray_origin + (ray_dir * proj)
+            dist = (p - closest).norm()
+
+            # If within cylinder radius
+            if dist < BLAST_RADIUS:
+                if self.is_locked[i] == 1:
+                    self.wake(i)
+                strength = (1.0 - dist / BLAST_RADIUS) ** BLAST_FALLOFF
+                # Push away from the ray axis
+                force_dir = (p - closest).normalized()
+                # Add some forward component too
+                self.vel[i] = ti.cast(self.vel[i] + ((force_dir * 2.0) + (ray_dir * 0.5)) * strength, self.vel.dtype)
 
     @ti.kernel
-    def disrupt(self, ray_origin: ti.types.vector(3, float), ray_dir: ti.types.vector(3, float)):
-        # Raycast Blast
-        for i in range(NUM_AGENTS):
-            p = self.pos[i]
-            # Vector from ray origin to agent
-            ap = p - ray_origin
-            # Project onto ray direction
-            proj = ap.dot(ray_dir)
-            
-            # Only affect points in front of the camera
-            if proj > 0:
-                # Closest point on the ray to the agent
-                closest = ray_origin + (ray_dir * proj)
-                dist = (p - closest).norm()
-                
-                # If within cylinder radius
-                if dist < 3.0:
-                    self.is_locked[i] = 0 # Wake up
-                    # Push away from the ray axis
-                    force_dir = (p - closest).normalized()
-                    # Add some forward component too
-                    self.vel[i] += (force_dir * 2.0) + (ray_dir * 0.5)
+    def disrupt_all(self, ray_origin: ti.types.vector(3, float), ray_dir: ti.types.vector(3, float)):
+        for i in range(self.num_agents):
+            self.blast_agent(i, ray_origin, ray_dir)
+
+    @ti.kernel
+    def disrupt_cells(self, ray_origin: ti.types.vector(3, float), ray_dir: ti.types.vector(3, float), blast_id: ti.i32,
+                      e_m: ti.types.vector(3, ti.i32), e_u: ti.types.vector(3, ti.i32), e_v: ti.types.vector(3, ti.i32),
+                      slab_lo: ti.i32, num_slabs: ti.i32, width_u: ti.i32, width_v: ti.i32,
+                      t_in: ti.f32, t_out: ti.f32, spread_m: ti.f32, pad: ti.f32):
+        h = 1.0 / self.grid.inv_cell_size[None]
+        o_m, o_u, o_v = ray_origin.dot(e_m), ray_origin.dot(e_u), ray_origin.dot(e_v)
+        d_m, d_u, d_v = ray_dir.dot(e_m), ray_dir.dot(e_u), ray_dir.dot(e_v)
+        for s, a, b in ti.ndrange(num_slabs, width_u, width_v):
+            # Axis range that can reach this slab -> its low u, v corner -> window origin
+            slab = slab_lo + s
+            t0 = (slab * h - spread_m - o_m) / d_m
+            t1 = ((slab + 1) * h + spread_m - o_m) / d_m
+            ta = ti.math.clamp(ti.min(t0, t1), t_in, t_out)
+            tb = ti.math.clamp(ti.max(t0, t1), t_in, t_out)
+            u_lo = o_u + ti.min(d_u * ta, d_u * tb) - pad
+            v_lo = o_v + ti.min(d_v * ta, d_v * tb) - pad
+            c = (e_m * slab
+                 + e_u * (int(ti.floor(u_lo / h)) + a)
+                 + e_v * (int(ti.floor(v_lo / h)) + b))
+
+            for grid in ti.static(self.grids):
+                start, end = grid.bucket_range(grid.hash_cell(c))
+                for slot in range(start, end):
+                    i = grid.sorted_ids[slot]
+                    # Colliding cells share buckets: stamp so each agent is hit once
+                    if ti.atomic_max(self.blast_stamp[i], blast_id) < blast_id:
+                        self.blast_agent(i, ray_origin, ray_dir)
+
+    # wake_flag: 0 = in the static grid, 1 = that and woken by a neighbor;
+    # 2 = listed (in the active list), 3 = that and woken by a neighbor
+
+    @ti.func
+    def wake(self, i):
+        # Locked agent i joins the awake agents now (outside the step only)
+        self.is_locked[i] = 0
+        if self.wake_flag[i] >= 2:
+            ti.atomic_sub(self.lock_changes[None], 1) # Already listed
+        else:
+            self.active_ids[ti.atomic_add(self.num_active[None], 1)] = i
+        self.wake_flag[i] = ti.cast(2, self.wake_flag.dtype)
+
+    @ti.func
+    def request_wake(self, i):
+        # Inside the step other threads may be reading i: queue it for the next update
+        flag = 1
+        if self.wake_flag[i] >= 2:
+            flag = 3
+        if ti.atomic_max(self.wake_flag[i], ti.cast(flag, self.wake_flag.dtype)) < flag:
+            k = ti.atomic_add(self.num_woken[None], 1)
+            if k < self.woken_ids.shape[0]:
+                self.woken_ids[k] = i # Past capacity the next update rebuilds from wake_flag
+
+    @ti.kernel
+    def list_counters(self) -> ti.types.vector(4, ti.i32):
+        # One launch instead of four field reads
+        return ti.Vector([self.num_active[None], self.lock_changes[None], self.wakes[None], self.num_woken[None]])
+
+    @ti.kernel
+    def apply_wakes(self):
+        for k in range(self.num_woken[None]):
+            i = self.woken_ids[k]
+            if self.is_locked[i] == 1: # A blast may have woken it since
+                self.wake(i)
+        self.num_woken[None] = 0
 
     @ti.kernel
+    def rebuild_active(self):
+        # Stream compaction: awake agents to the front, locked ones to the back,
+        # then the grid of locked agents; queued neighbor wakes take effect here.
+        # Frozen agents go in neither (active_ids[num_active:locked_start] is unused)
+        self.num_active[None] = 0
+        self.locked_start[None] = self.num_agents
+        for i in range(self.num_agents):
+            if self.frozen(i):
+                continue
+            if self.wake_flag[i] == 1 or self.wake_flag[i] == 3:
+                self.is_locked[i] = 0
+            if self.is_locked[i] == 0:
+                slot = ti.atomic_add(self.num_active[None], 1)
+                self.active_ids[slot] = i
+                self.wake_flag[i] = ti.cast(2, self.wake_flag.dtype)
+            else:
+                slot = ti.atomic_sub(self.locked_start[None], 1) - 1
+                self.active_ids[slot] = i
+                self.wake_flag[i] = ti.cast(0, self.wake_flag.dtype)
+        self.lock_changes[None] = 0
+        self.wakes[None] = 0
+        self.num_woken[None] = 0
+        self.static_grid.rebuild(self.locked_start[None], self.num_agents)
+
     def update(self):
-        for i in range(NUM_AGENTS):
+        if REORDER_INTERVAL > 0 and self.frame > 0 and self.frame % REORDER_INTERVAL == 0:
+            self.reorder()
+        # Queued wakes are appended to the list, unless there are too many.
+        # Listed agents that locked cost a copy per substep, a rebuild a pass
+        # over all N: drop them once they are half the list and a real share of N
+        listed, locked, wakes, woken = self.list_counters()
+        if wakes > 0 or woken > self.woken_ids.shape[0] or (
+                2 * locked > listed and locked > self.num_agents * RELIST_FRACTION):
+            self.rebuild_active()
+            listed, locked, wakes, woken = self.list_counters()
+        elif woken > 0:
+            self.apply_wakes()
+            listed, locked, wakes, woken = self.list_counters()
+        self.num_awake = int(listed - locked)
+        if self.num_awake > 0: # Fully settled: nothing moves, nothing to do
+            self.step()
+
+        self.frame += 1
+        if METRICS_INTERVAL > 0 and self.frame % METRICS_INTERVAL == 0:
+            self.metrics.compute()
+
+    # --- Tunables (BatchedPhysics reads these per instance) ---
+
+    @ti.func
+    def separation_force(self, i):
+        return SEPARATION_FORCE
+
+    @ti.func
+    def damping(self, i):
+        # Velocity kept per substep
+        return ti.static(VELOCITY_DAMPING ** PHYSICS_DT)
+
+    @ti.func
+    def snap_distance(self, i):
+        return SNAP_DISTANCE
+
+    @ti.func
+    def wake_coupling(self, i):
+        return WAKE_COUPLING
+
+    @ti.func
+    def frozen(self, i):
+        # Left out of the active list and both grids (converged batch instances)
+        return False
+
+    def reorder(self):
+        """
+        Re-sorts every per-agent field by Z-order of position (see morton.py;
+        its buffers exist only with REORDER_INTERVAL > 0).
+        Agents keep their id: agent_id / slot_of map between ids and slots.
+        """
+        self.morton.sort(*self.bounds())
+        for f in (self.pos, self.vel, self.target, self.is_locked, self.wake_flag,
+                  self.blast_stamp, self.agent_id):
+            self.morton.permute(f)
+        self.rebuild_derived()
+
+    def rebuild_derived(self):
+        # Everything the state fields determine: slot map, active list (which
+        # applies pending wakes, as the next update would), grids, transforms
+        self.update_slots()
+        self.rebuild_active()
+        self.build_grids()
+        self.sync_transforms()
+
+    @ti.kernel
+    def update_slots(self):
+        for i in range(self.num_agents):
+            self.slot_of[self.agent_id[i]] = i
+
+    @ti.kernel
+    def step(self):
+        # SUBSTEPS fixed-dt steps in one launch. Each substep reads pos, vel
+        # (and a grid built from pos) and writes pos_next, vel_next, so no
+        # thread reads state another thread is changing.
+        self.max_speed[None] = 0.0
+        for _ in ti.static(range(SUBSTEPS)):
+            self.grid.rebuild(0, self.num_active[None]) # Awake agents only; locked ones keep their grid
+            self.substep()
+            self.commit()
+
+    @ti.func
+    def substep(self):
+        # Locked agents are not in active_ids; they stay exactly where they snapped
+        for k in range(self.num_active[None]):
+            i = self.active_ids[k]
+            p_i = self.pos[i]
+            v_i = self.vel[i]
             if self.is_locked[i] == 1:
-                # If locked, stay at target exactly
-                self.pos[i] = self.target[i]
-                self.vel[i] = ti.Vector([0.0, 0.0, 0.0])
+                # Snapped in an earlier substep of this launch
+                self.pos_next[i] = p_i
+                self.vel_next[i] = v_i
                 continue
 
-            sep = ti.Vector([0.0, 0.0, 0.0])
-            
-            p_i = self.pos[i]
-            
             # 1. SEEK TARGET
             diff_target = self.target[i] - p_i
             dist_target = diff_target.norm()
+            target_force = diff_target * 0.05
             
-            # SNAP LOGIC
-            if dist_target < SNAP_DISTANCE and self.vel[i].norm() < 0.1:
-                self.is_locked[i] = 1
-                self.pos[i] = self.target[i]
-                self.vel[i] = ti.Vector([0.0, 0.0, 0.0])
+            # 2. NEIGHBORS (true neighbors from the 27 surrounding cells)
+            # Separation; a fast agent also wakes locked neighbors it brushes,
+            # and fast neighbors drag this one along
+            fast = v_i.norm() > WAKE_SPEED
+            sep = ti.Vector([0.0, 0.0, 0.0])
+            drag = ti.Vector([0.0, 0.0, 0.0])
+            found = 0
+            draggers = 0
+            c_i = self.grid.item_cell(i, p_i)
+            for offset in ti.grouped(ti.ndrange((-1, 2), (-1, 2), (-1, 2))):
+                c = c_i + offset
+                for grid, static in ti.static(zip(self.grids, (False, True))): # Awake, then locked agents
+                    start, end = grid.bucket_range(grid.hash_cell(c))
+                    for slot in range(start, end):
+                        if found >= MAX_NEIGHBORS:
+                            break
+                        other = grid.sorted_ids[slot]
+                        listed = False
+                        if ti.static(static):
+                            listed = self.wake_flag[other] >= 2 # Woken since: the awake grid has it
+                        if i != other and not listed:
+                            p_o = self.pos[other]
+                            diff = p_i - p_o
+                            dist = diff.norm()
+                            if dist < NEIGHBOR_RADIUS and grid.in_cell(other, p_o, c):
+                                # Linear falloff: full push at contact, none at the radius
+                                sep += diff.normalized() * (1.0 - dist / NEIGHBOR_RADIUS)
+                                found += 1
+                                if dist < WAKE_RADIUS:
+                                    # 1 = locked before this substep (snaps this substep are 2)
+                                    if fast and self.is_locked[other] == 1:
+                                        self.request_wake(other)
+                                    v_o = self.vel[other]
+                                    if v_o.norm() > WAKE_SPEED:
+                                        drag += (v_o - v_i) * (1.0 - dist / WAKE_RADIUS)
+                                        draggers += 1
+            if found > 0:
+                # Average, and fade out near the target: the target layout is
+                # already spaced, so separation only matters while in transit
+                sep *= SEPARATION_SCALE / found
+                sep *= ti.min(dist_target / NEIGHBOR_RADIUS, 1.0)
+
+            # SNAP LOGIC (not while something fast is passing by)
+            if dist_target < self.snap_distance(i) and v_i.norm() < 0.1 and draggers == 0:
+                self.is_locked[i] = 2 # Locked at commit
+                ti.atomic_add(self.lock_changes[None], 1)
+                self.pos_next[i] = self.target[i]
+                self.vel_next[i] = ti.Vector([0.0, 0.0, 0.0], dt=self.vel_next.dtype)
                 continue
 
-            target_force = diff_target * 0.05
-            
-            # 2. SEPARATION
-            for j in range(10): 
-                other = int(ti.random() * NUM_AGENTS)
-                if i != other:
-                    diff = p_i - self.pos[other]
-                    dist = diff.norm()
-                    if dist < NEIGHBOR_RADIUS:
-                        sep += diff.normalized() / (dist + 0.001)
-
-            self.acc[i] += (sep * SEPARATION_FORCE) + target_force
-
-        # Integration
-        for i in range(NUM_AGENTS):
-            if self.is_locked[i] == 0:
-                self.vel[i] += self.acc[i]
-                self.vel[i] *= 0.96
-                self.pos[i] += self.vel[i]
-                self.acc[i] *= 0.0
+            # 3. INTEGRATE (semi-implicit Euler, fixed dt)
+            acc = (sep * self.separation_force(i)) + target_force
+            if draggers > 0:
+                acc += drag * (self.wake_coupling(i) / draggers)
+            v_new = (v_i + acc * PHYSICS_DT) * self.damping(i)
+            self.vel_next[i] = ti.cast(v_new, self.vel_next.dtype)
+            self.pos_next[i] = fit(p_i + v_new * PHYSICS_DT)
+
+    @ti.func
+    def commit(self):
+        for k in range(self.num_active[None]):
+            i = self.active_ids[k]
+            ti.atomic_max(self.max_speed[None], (self.pos_next[i] - self.pos[i]).norm() / PHYSICS_DT)
+            self.pos[i] = self.pos_next[i]
+            self.vel[i] = self.vel_next[i]
+            if self.is_locked[i] == 2:
+                self.is_locked[i] = 1
+            self.write_translation(i)
+
+    @ti.func
+    def write_translation(self, i):
+        # Matrices stay identity apart from the translation column (set by sync_transforms)
+        if ti.static(self.use_transforms):
+            self.transforms[i][0, 3] = self.pos[i].x
+            self.transforms[i][1, 3] = self.pos[i].y
+            self.transforms[i][2, 3] = self.pos[i].z
+
+    @ti.kernel
+    def sync_transforms(self):
+        # Full rebuild; step() keeps moving agents in sync, so this is only
+        # needed after bulk position changes (spawn, restore)
+        if ti.static(self.use_transforms):
+            for i in range(self.num_agents):
+                T = ti.Matrix.identity(float, 4)
+                T[0, 3] = self.pos[i].x
+                T[1, 3] = self.pos[i].y
+                T[2, 3] = self.pos[i].z
+                self.transforms[i] = T
+
+    def memory_budget(self):
+        """{owner: {field: bytes}} for the device fields behind this swarm (see compact.report_budget)"""
+        owners = {"agents": self, "grid": self.grid, "static grid": self.static_grid,
+                  "bank": self.bank, "morton": self.morton, "metrics": self.metrics}
+        return compact.byte_budget({name: obj for name, obj in owners.items() if obj is not None})
+
+    def transient_budget(self):
+        """{owner: bytes} of device memory allocated only while it runs"""
+        return {"target assigner": self.assigner.scratch_bytes()}
+
+    def state_fields(self):
+        # Everything a step reads; the grid, transforms and *_next buffers are derived
+        return {
+            "pos": self.pos, "vel": self.vel, "target": self.target,
+            "is_locked": self.is_locked, "wake_flag": self.wake_flag,
+            "active_ids": self.active_ids, "num_active": self.num_active,
+            "lock_changes": self.lock_changes, "blast_stamp": self.blast_stamp,
+            "agent_id": self.agent_id,
+        }
+
+    def state_counters(self):
+        return {"frame": self.frame, "blast_id": self.blast_id,
+                "shape_idx": self.shape_idx, "num_awake": self.num_awake}
 
     @ti.kernel
-    def update_transforms(self):
-        for i in range(NUM_AGENTS):
-            T = ti.Matrix.identity(float, 4)
-            T[0, 3] = self.pos[i].x
-            T[1, 3] = self.pos[i].y
-            T[2, 3] = self.pos[i].z
-            self.transforms[i] = T
+    def export_frame(self, pos: ti.types.ndarray(), locked: ti.types.ndarray()):
+        # Straight into preallocated host arrays (to_numpy allocates per call), by agent id
+        for i in range(self.num_agents):
+            a = self.agent_id[i]
+            for k in ti.static(range(3)):
+                pos[a, k] = self.pos[i][k]
+            locked[a] = ti.cast(self.is_locked[i], ti.i8)
+
+    def save_state(self, path=CHECKPOINT_PATH):
+        """
+        Checkpoint to path (.npz = compressed, else a directory of .npy).
+        Agent randomness is a stateless hash of (SEED, id), so SEED plus the
+        counters is the whole RNG state.
+        """
+        meta = {"num_agents": self.num_agents, "seed": SEED, "shape": self.bank.names[self.shape_idx]}
+        meta.update(self.state_counters())
+        snapshot.save(path, {name: compact.to_numpy(f) for name, f in self.state_fields().items()}, meta)
+
+    def load_state(self, path=CHECKPOINT_PATH):
+        arrays, meta = snapshot.load(path)
+        snapshot.check_count(meta, self.num_agents)
+        if meta["shape"] not in self.bank.names:
+            raise ValueError(f"Snapshot was taken on shape '{meta['shape']}', which is not in the shape bank "
+                             f"({', '.join(self.bank.names)}); register it before loading")
+        for name, f in self.state_fields().items():
+            if name == "agent_id" and name not in arrays:
+                arrays[name] = np.arange(self.num_agents, dtype=np.int32) # Saved before reordering existed
+            compact.from_numpy(f, arrays[name]) # Bulk copy; memmapped pages are read here
+        for name in self.state_counters():
+            setattr(self, name, meta[name])
+        self.shape_idx = self.bank.index(meta["shape"]) # Bank order may differ from the saving run
+        self.rebuild_derived()
+        self.metrics.compute()
+        return meta
 
     def next_shape(self):
-        if not hasattr(self, 'shape_idx'): self.shape_idx = 0
-        self.shape_idx = (self.shape_idx + 1) % 3
-        
-        # Wake everyone up to move to new shape
-        self.wake_all()
-        
-        if self.shape_idx == 0: self.target_gen.init_sphere()
-        elif self.shape_idx == 1: self.target_gen.init_cube()
-        elif self.shape_idx == 2: self.target_gen.init_smiley()
+        self.set_shape((self.shape_idx + 1) % len(self.bank))
+
+    def set_shape(self, shape):
+        # Accepts a bank index or a registered shape name
+        if isinstance(shape, str):
+            shape = self.bank.index(shape)
+        self.shape_idx = shape
+
+        self.bank.activate(self.shape_idx)
+        self.assign_targets()
+
+        # Only agents whose slot moved away have to travel
+        self.wake_displaced()
+
+    def assign_targets(self):
+        # Pair agents with nearby slots instead of slot i -> agent i
+        if ASSIGN_TARGETS:
+            self.assigner.assign()
+        else:
+            self.targets_by_id()
+
+    @ti.kernel
+    def targets_by_id(self):
+        # Bank rows are in agent id order; move each point to its agent's slot
+        for i in range(self.num_agents):
+            self.pos_next[i] = self.target[self.agent_id[i]]
+        for i in range(self.num_agents):
+            self.target[i] = self.pos_next[i]
+
+    @ti.kernel
+    def wake_displaced(self):
+        # Locked agents sit exactly on their old target: far ones wake, near ones
+        # snap straight to the new one (moving a static-grid agent forces a rebuild)
+        for i in range(self.num_agents):
+            if self.is_locked[i] == 1:
+                dist = (self.target[i] - self.pos[i]).norm()
+                if dist > self.snap_distance(i):
+                    self.is_locked[i] = 0
+                    ti.atomic_add(self.wakes[None], 1)
+                elif dist > 0.0:
+                    ti.atomic_max(self.max_speed[None], dist / PHYSICS_DT) # For blasts before the next step
+                    self.pos[i] = self.target[i]
+                    self.write_translation(i)
+                    ti.atomic_add(self.wakes[None], 1)
 
     @ti.kernel
     def wake_all(self):
-        for i in range(NUM_AGENTS):
+        for i in range(self.num_agents):
             self.is_locked[i] = 0
+        self.wakes[None] = 1
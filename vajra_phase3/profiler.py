@@ -0,0 +1,141 @@
+import collections
+import contextlib
+import csv
+import json
+import time
+import taichi as ti
+from config import *
+
+class FrameProfiler:
+    """
+    Per-frame timing: host timers around the frame phases plus device time
+    per kernel from Taichi's kernel profiler (ti.init(kernel_profiler=True)).
+
+    Phases sync the device when they end, so GPU work is charged to the phase
+    that launched it. The last PROFILE_WINDOW frames are kept for the GUI;
+    every frame can also be written to PROFILE_DUMP (.jsonl or .csv).
+    Disabled, every call is a no-op.
+    """
+    def __init__(self, enabled=PROFILE, window=PROFILE_WINDOW, dump_path=PROFILE_DUMP, kernels=PROFILE_KERNELS):
+        self.enabled = enabled
+        self.kernels = kernels
+        self.device_timing = enabled and ti.lang.impl.current_cfg().kernel_profiler # Needs ti.init first
+        self.frames = collections.deque(maxlen=window)
+        self.frame = 0
+        self.phases = {}
+        self.frame_start = 0.0
+
+        self.dump_file = None
+        self.writer = None
+        if enabled and dump_path:
+            self.dump_file = open(dump_path, "w", newline="")
+        if self.device_timing:
+            ti.profiler.clear_kernel_profiler_info() # Drop startup kernels
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.phases = {}
+        self.frame_start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        yield
+        ti.sync()
+        self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - start) * 1e3
+
+    def end_frame(self, **extra):
+        if not self.enabled:
+            return None
+        record = {
+            "frame": self.frame,
+            "frame_ms": (time.perf_counter() - self.frame_start) * 1e3,
+            "phases": self.phases,
+            "kernels": self.kernel_times(),
+        }
+        record.update(extra)
+        self.frames.append(record)
+        self.dump(record)
+        self.frame += 1
+        return record
+
+    def kernel_times(self):
+        # Cleared every frame: queries then cover just this frame, and the
+        # profiler's record list doesn't grow without bound
+        times = {}
+        if not self.device_timing:
+            return times
+        for name in self.kernels:
+            info = ti.profiler.query_kernel_profiler_info(name)
+            if info.counter > 0:
+                times[name] = info.counter * info.avg
+        times["total"] = ti.profiler.get_kernel_profiler_total_time() * 1e3
+        ti.profiler.clear_kernel_profiler_info()
+        return times
+
+    # --- Output ---
+
+    def dump(self, record):
+        if self.dump_file is None:
+            return
+        if self.dump_file.name.endswith(".csv"):
+            row = {"frame": record["frame"], "frame_ms": record["frame_ms"]}
+            row.update({f"phase_{k}": v for k, v in record["phases"].items()})
+            row.update({f"kernel_{k}": record["kernels"].get(k, 0.0) for k in (*self.kernels, "total")})
+            row.update({k: v for k, v in record.items() if k not in ("frame", "frame_ms", "phases", "kernels")})
+            if self.writer is None:
+                # Phase / extra columns fixed by the first frame; later new ones are dropped
+                self.writer = csv.DictWriter(self.dump_file, fieldnames=list(row), extrasaction="ignore")
+                self.writer.writeheader()
+            self.writer.writerow(row)
+        else:
+            self.dump_file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        if self.dump_file is not None:
+            self.dump_file.close()
+            self.dump_file = None
+
+    def summary(self):
+        """Mean ms per phase / kernel over the window"""
+        n = len(self.frames)
+        if n == 0:
+            return {}
+        out = {"frame_ms": sum(f["frame_ms"] for f in self.frames) / n}
+        for key in ("phases", "kernels"):
+            totals = collections.defaultdict(float)
+            for f in self.frames:
+                for name, ms in f[key].items():
+                    totals[name] += ms
+            out[key] = {name: ms / n for name, ms in totals.items()}
+        return out
+
+    def histogram_lines(self, bins=PROFILE_HIST_BINS, width=24):
+        """Frame-time histogram as text rows (for the ImGui panel)"""
+        times = [f["frame_ms"] for f in self.frames]
+        if not times:
+            return []
+        lo, hi = min(times), max(times)
+        step = max((hi - lo) / bins, 1e-6)
+        counts = [0] * bins
+        for t in times:
+            counts[min(int((t - lo) / step), bins - 1)] += 1
+        peak = max(counts)
+        return [f"{lo + b * step:6.1f}ms {'#' * (counts[b] * width // peak):<{width}} {counts[b]}"
+                for b in range(bins)]
+
+    def draw(self, gui):
+        if not self.enabled or not self.frames:
+            return
+        s = self.summary()
+        gui.text(f"Frame: {s['frame_ms']:.2f} ms ({1000.0 / max(s['frame_ms'], 1e-6):.0f} fps)")
+        for name, ms in s["phases"].items():
+            gui.text(f"  {name}: {ms:.2f} ms")
+        for name, ms in sorted(s["kernels"].items(), key=lambda kv: -kv[1]):
+            gui.text(f"  [gpu] {name}: {ms:.2f} ms")
+        for line in self.histogram_lines():
+            gui.text(line)
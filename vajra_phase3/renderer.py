@@ -1,7 +1,26 @@
 import taichi as ti
 import math
+import numpy as np
+import os
 from config import *
 from mesh_data import get_rhombic_dodecahedron_data
+from culling import InstanceCuller
+
+def sub(a, b):
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+def cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+
+def normalize(a):
+    n = math.sqrt(a[0] * a[0] + a[1] * a[1] + a[2] * a[2])
+    return (a[0] / n, a[1] / n, a[2] / n)
+
+@ti.kernel
+def copy_positions(src: ti.template(), dst: ti.template()):
+    # Compact positions -> float32 points ti.ui can draw
+    for i in src:
+        dst[i] = src[i]
 
 class Renderer:
     def __init__(self):
@@ -9,6 +28,7 @@ class Renderer:
         self.canvas = self.window.get_canvas()
         self.scene = self.window.get_scene()
         self.camera = ti.ui.Camera()
+        self.camera.fov(CAMERA_FOV)
         
         self.gui = self.window.get_gui()
         
@@ -16,9 +36,11 @@ class Renderer:
         self.cam_yaw = 0.0
         self.cam_pitch = 0.0
         self.cam_dist = 15.0
-        self.cam_pos = ti.Vector([0.0, 0.0, 15.0])
-        self.cam_target = ti.Vector([0.0, 0.0, 0.0])
+        self.cam_pos = (0.0, 0.0, 15.0)
+        self.cam_target = (0.0, 0.0, 0.0)
         self.prev_mouse = None
+        self.controls = ["SPACE: Next Shape", "LMB: Blast (Raycast)", "RMB + Drag: Rotate", "W/S: Zoom",
+                         "K/L: Save/Load Checkpoint"]
         
         # Mesh
         vertices, indices = get_rhombic_dodecahedron_data()
@@ -27,6 +49,10 @@ class Renderer:
         self.mesh_indices = ti.field(dtype=ti.i32, shape=len(indices))
         self.mesh_vertices.from_numpy(vertices)
         self.mesh_indices.from_numpy(indices)
+        self.mesh_radius = float(np.linalg.norm(vertices, axis=1).max())
+        self.draw_pos = None # Float32 copy of compact positions, made on first draw
+        self.culler = None # "lod": made on first draw, sized to the swarm
+        self.drawn = (0, 0) # Meshes, particles in the last "lod" frame
 
     def update_camera(self):
         # Manual Orbit Control
@@ -60,59 +86,98 @@ class Renderer:
         y = self.cam_dist * math.sin(self.cam_pitch)
         z = self.cam_dist * math.cos(self.cam_pitch) * math.cos(self.cam_yaw)
         
-        self.cam_pos = ti.Vector([x, y, z])
+        self.cam_pos = (x, y, z)
         self.camera.position(x, y, z)
         self.camera.lookat(0, 0, 0)
         self.scene.set_camera(self.camera)
 
+    def camera_basis(self):
+        forward = normalize(sub(self.cam_target, self.cam_pos))
+        up = (0.0, 1.0, 0.0)
+        right = normalize(cross(forward, up))
+        real_up = normalize(cross(right, forward))
+        return forward, right, real_up
+
     def get_mouse_ray(self):
+        # Plain float math: this runs every frame LMB is held
         mouse = self.window.get_cursor_pos() # (0..1, 0..1)
         
         # Basis Vectors
-        forward = (self.cam_target - self.cam_pos).normalized()
-        up = ti.Vector([0.0, 1.0, 0.0])
-        right = forward.cross(up).normalized()
-        real_up = right.cross(forward).normalized()
+        forward, right, real_up = self.camera_basis()
         
         # Screen Coordinates (-1 to 1)
         # Aspect Ratio
         aspect = WINDOW_WIDTH / WINDOW_HEIGHT
-        fov = 60.0
-        tan_half_fov = math.tan(math.radians(fov) / 2.0)
+        tan_half_fov = math.tan(math.radians(CAMERA_FOV) / 2.0)
         
         screen_x = (mouse[0] - 0.5) * 2.0 * aspect * tan_half_fov
         screen_y = (mouse[1] - 0.5) * 2.0 * tan_half_fov
         
         # Ray Direction
-        ray_dir = (forward + (right * screen_x) + (real_up * screen_y)).normalized()
+        ray_dir = normalize(tuple(f + r * screen_x + u * screen_y for f, r, u in zip(forward, right, real_up)))
         
         return self.cam_pos, ray_dir
 
-    def render(self, physics):
-        self.update_camera()
-        
-        # Lighting
-        self.scene.point_light(pos=(0, 10, 10), color=(1, 1, 1))
-        self.scene.ambient_light((0.1, 0.1, 0.1))
-        
-        # Draw Agents
-        self.scene.mesh_instance(
-            self.mesh_vertices,
-            self.mesh_indices,
-            transforms=physics.transforms,
-            color=AGENT_COLOR
-        )
-        
-        self.canvas.scene(self.scene)
-        
-        # UI
-        self.gui.text("Controls:")
-        self.gui.text("SPACE: Next Shape")
-        self.gui.text("LMB: Blast (Raycast)")
-        self.gui.text("RMB + Drag: Rotate")
-        self.gui.text("W/S: Zoom")
-        
-        self.window.show()
+    def particle_positions(self, physics):
+        if physics.pos.dtype == ti.f32:
+            return physics.pos
+        if self.draw_pos is None:
+            self.draw_pos = ti.Vector.field(3, dtype=ti.f32, shape=physics.num_agents)
+        copy_positions(physics.pos, self.draw_pos)
+        return self.draw_pos
+
+    def draw_lod(self, physics):
+        if self.culler is None:
+            self.culler = InstanceCuller(physics.pos, self.mesh_radius)
+        self.drawn = self.culler.update(self.cam_pos, *self.camera_basis(), CAMERA_FOV, WINDOW_WIDTH / WINDOW_HEIGHT)
+        meshes, particles = self.drawn
+        if meshes > 0:
+            self.scene.mesh_instance(self.mesh_vertices, self.mesh_indices, transforms=self.culler.transforms,
+                                     instance_count=meshes, color=AGENT_COLOR)
+        if particles > 0:
+            self.scene.particles(self.culler.points, radius=PARTICLE_RADIUS, color=AGENT_COLOR, index_count=particles)
+
+    def render(self, physics, profiler, status=()):
+        with profiler.phase("scene"):
+            self.update_camera()
+            
+            # Lighting
+            self.scene.point_light(pos=(0, 10, 10), color=(1, 1, 1))
+            self.scene.ambient_light((0.1, 0.1, 0.1))
+            
+            # Draw Agents
+            if RENDER_MODE == "lod":
+                self.draw_lod(physics)
+            elif physics.use_transforms:
+                self.scene.mesh_instance(
+                    self.mesh_vertices,
+                    self.mesh_indices,
+                    transforms=physics.transforms,
+                    color=AGENT_COLOR
+                )
+            else:
+                self.scene.particles(self.particle_positions(physics), radius=PARTICLE_RADIUS, color=AGENT_COLOR)
+            
+            self.canvas.scene(self.scene)
+        
+        with profiler.phase("present"):
+            # UI
+            for line in status:
+                self.gui.text(line)
+            if RENDER_MODE == "lod":
+                self.gui.text(f"Drawn: {self.drawn[0]} meshes, {self.drawn[1]} particles of {physics.num_agents}")
+            m = physics.metrics.latest
+            if m is not None:
+                self.gui.text(f"Locked: {m['locked_fraction'] * 100:.1f}% | Awake: {m['awake']}")
+                if "mean_dist" in m: # Replays only carry lock states
+                    self.gui.text(f"Dist mean/max: {m['mean_dist']:.3f} / {m['max_dist']:.3f}")
+                    self.gui.text(f"Kinetic energy: {m['kinetic_energy']:.4f}")
+            self.gui.text("Controls:")
+            for line in self.controls:
+                self.gui.text(line)
+            profiler.draw(self.gui)
+            
+            self.window.show()
 
     def handle_input(self, physics):
         if self.window.is_pressed(ti.ui.SPACE):
@@ -121,5 +186,17 @@ class Renderer:
         if self.window.is_pressed(ti.ui.LMB):
             origin, direction = self.get_mouse_ray()
             physics.disrupt(origin, direction)
+
+        # Key presses (not held state): one checkpoint per press
+        for event in self.window.get_events(ti.ui.PRESS):
+            if event.key == 'k':
+                physics.save_state()
+                print(f"Saved checkpoint: {CHECKPOINT_PATH}")
+            elif event.key == 'l' and os.path.exists(CHECKPOINT_PATH):
+                try:
+                    physics.load_state()
+                    print(f"Loaded checkpoint: {CHECKPOINT_PATH}")
+                except ValueError as e: # Another swarm size or shape bank; keep running
+                    print(f"Checkpoint not loaded: {e}")
             
         return self.window.running
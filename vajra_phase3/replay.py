@@ -0,0 +1,74 @@
+"""
+Plays a recorded trajectory in the Phase 3 renderer, without physics.
+
+    python replay.py run.trj    (defaults to RECORD_PATH)
+"""
+import os
+import sys
+import types
+import numpy as np
+import taichi as ti
+from config import *
+from renderer import Renderer
+from profiler import FrameProfiler
+from startup import init_taichi
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Repo root
+from vajra_common.replay import TrajectoryPlayer, KEYS
+
+@ti.data_oriented
+class ReplayView:
+    """What Renderer.render reads from a PhysicsEngine, filled from recorded frames"""
+    def __init__(self, num_agents):
+        self.num_agents = num_agents
+        self.pos = ti.Vector.field(3, dtype=ti.f32, shape=num_agents)
+        self.transforms = None
+        self.use_transforms = RENDER_MODE == "mesh"
+        if self.use_transforms:
+            self.transforms = ti.Matrix.field(4, 4, dtype=ti.f32, shape=num_agents)
+        self.metrics = types.SimpleNamespace(latest=None)
+
+    @ti.kernel
+    def load(self, pos: ti.types.ndarray()):
+        for i in range(self.num_agents):
+            self.pos[i] = ti.Vector([pos[i, 0], pos[i, 1], pos[i, 2]])
+            if ti.static(self.use_transforms):
+                T = ti.Matrix.identity(float, 4)
+                T[0, 3] = self.pos[i].x
+                T[1, 3] = self.pos[i].y
+                T[2, 3] = self.pos[i].z
+                self.transforms[i] = T
+
+    def show(self, arrays):
+        self.load(arrays["pos"])
+        locked = int(np.count_nonzero(arrays["locked"]))
+        self.metrics.latest = {"locked_fraction": locked / self.num_agents, "awake": self.num_agents - locked}
+
+def main(path):
+    init_taichi(ti.gpu)
+    player = TrajectoryPlayer(path, cache_bytes=REPLAY_CACHE_BYTES, prefetch=REPLAY_PREFETCH)
+    view = ReplayView(player.reader.channels["pos"][1][0])
+    renderer = Renderer()
+    renderer.controls = KEYS.split(" | ") + ["RMB + Drag: Rotate", "W/S: Zoom"]
+    profiler = FrameProfiler()
+
+    while renderer.window.running:
+        profiler.begin_frame()
+
+        # Input: playback keys only, no blasts / shape switches
+        with profiler.phase("input"):
+            for event in renderer.window.get_events(ti.ui.PRESS):
+                player.handle_key(event.key.lower())
+
+        # Decode (usually a cache hit: the prefetch thread runs ahead)
+        with profiler.phase("decode"):
+            frame, arrays = player.advance()
+            view.show(arrays)
+
+        renderer.render(view, profiler, status=[player.status()])
+        profiler.end_frame(frame=frame)
+
+    profiler.close()
+    player.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else RECORD_PATH)
@@ -0,0 +1,300 @@
+"""
+Signed-distance shapes filled with voxels on the FCC lattice.
+
+The rhombic dodecahedron in mesh_data (tips at +-1, corners at +-0.5) is the
+Voronoi cell of the FCC lattice: integer sites (i, j, k) with i + j + k even.
+Scaled by VOXEL_SIZE, agents on those sites tile space with no gaps and no
+overlap. An SDF shape is filled with exactly N such sites.
+"""
+import numpy as np
+import taichi as ti
+from config import *
+
+EMIT_RUNS = 4096 # Runs of consecutive lattice sites emitted in parallel
+
+# --- Shapes ---
+# Each node has eval(p) (a ti.func, negative inside) and bounds() -> (lo, hi).
+# Nodes are compile-time kernel templates: a new tree compiles new kernels.
+
+@ti.data_oriented
+class Sphere:
+    def __init__(self, radius, center=(0.0, 0.0, 0.0)):
+        self.radius = float(radius)
+        self.center = ti.Vector(list(center))
+
+    @ti.func
+    def eval(self, p):
+        return (p - self.center).norm() - self.radius
+
+    def bounds(self):
+        c = np.array(self.center.to_list())
+        return c - self.radius, c + self.radius
+
+@ti.data_oriented
+class Box:
+    def __init__(self, half_extents, center=(0.0, 0.0, 0.0)):
+        self.half = ti.Vector(list(half_extents))
+        self.center = ti.Vector(list(center))
+
+    @ti.func
+    def eval(self, p):
+        q = ti.abs(p - self.center) - self.half
+        return ti.max(q, 0.0).norm() + ti.min(ti.max(q.x, ti.max(q.y, q.z)), 0.0)
+
+    def bounds(self):
+        c, h = np.array(self.center.to_list()), np.array(self.half.to_list())
+        return c - h, c + h
+
+@ti.data_oriented
+class Torus:
+    # Ring in the xz plane, around the y axis
+    def __init__(self, major, minor, center=(0.0, 0.0, 0.0)):
+        self.major = float(major)
+        self.minor = float(minor)
+        self.center = ti.Vector(list(center))
+
+    @ti.func
+    def eval(self, p):
+        q = p - self.center
+        ring = ti.Vector([q.xz.norm() - self.major, q.y])
+        return ring.norm() - self.minor
+
+    def bounds(self):
+        c = np.array(self.center.to_list())
+        r = self.major + self.minor
+        return c - np.array([r, self.minor, r]), c + np.array([r, self.minor, r])
+
+@ti.data_oriented
+class Union:
+    def __init__(self, a, b):
+        self.a, self.b = a, b
+
+    @ti.func
+    def eval(self, p):
+        return ti.min(self.a.eval(p), self.b.eval(p))
+
+    def bounds(self):
+        (la, ha), (lb, hb) = self.a.bounds(), self.b.bounds()
+        return np.minimum(la, lb), np.maximum(ha, hb)
+
+@ti.data_oriented
+class Intersection:
+    def __init__(self, a, b):
+        self.a, self.b = a, b
+
+    @ti.func
+    def eval(self, p):
+        return ti.max(self.a.eval(p), self.b.eval(p))
+
+    def bounds(self):
+        (la, ha), (lb, hb) = self.a.bounds(), self.b.bounds()
+        return np.maximum(la, lb), np.minimum(ha, hb)
+
+@ti.data_oriented
+class Difference:
+    # a minus b
+    def __init__(self, a, b):
+        self.a, self.b = a, b
+
+    @ti.func
+    def eval(self, p):
+        return ti.max(self.a.eval(p), -self.b.eval(p))
+
+    def bounds(self):
+        return self.a.bounds()
+
+@ti.data_oriented
+class SmoothUnion:
+    # Polynomial smooth min; k is the blend width in world units
+    def __init__(self, a, b, k):
+        self.a, self.b = a, b
+        self.k = float(k)
+
+    @ti.func
+    def eval(self, p):
+        da, db = self.a.eval(p), self.b.eval(p)
+        h = ti.math.clamp(0.5 + 0.5 * (db - da) / self.k, 0.0, 1.0)
+        return db + (da - db) * h - self.k * h * (1.0 - h)
+
+    def bounds(self):
+        (la, ha), (lb, hb) = self.a.bounds(), self.b.bounds()
+        return np.minimum(la, lb) - self.k, np.maximum(ha, hb) + self.k
+
+# --- Lattice fill ---
+
+@ti.data_oriented
+class SDFGenerator:
+    """
+    Fills an SDF with exactly NUM_AGENTS FCC sites, written to target.
+
+    1. Histogram the depth (-sdf) of every inside site.
+    2. Find the depth bin where the deepest sites add up to N.
+    3. Emit every site deeper than that bin, plus just enough from it.
+    So the N sites are the shape shrunk to an exact voxel count. With
+    auto-fit the shape is first scaled until it holds ~N sites, so the
+    threshold lands on the surface.
+
+    The emit is parallel over EMIT_RUNS runs of consecutive sites: each run
+    counts its deeper and threshold-bin sites, a prefix sum over the runs
+    gives every run its output offsets, and each run writes its sites in
+    order. Output is in site order (the threshold bin's first sites make
+    the cut), the same on every run whatever the thread timing.
+    """
+    def __init__(self, target):
+        self.target = target
+        self.hist = ti.field(dtype=ti.i32, shape=SDF_HIST_BINS)
+        self.inside = ti.field(dtype=ti.i32, shape=())
+        self.threshold_bin = ti.field(dtype=ti.i32, shape=())
+        self.below = ti.field(dtype=ti.i32, shape=()) # Sites deeper than the threshold bin
+        self.run_below = ti.field(dtype=ti.i32, shape=EMIT_RUNS) # Per run: sites deeper than the threshold bin,
+        self.run_edge = ti.field(dtype=ti.i32, shape=EMIT_RUNS) # sites in it; then the offsets of both
+
+    def lattice_box(self, sdf, scale):
+        lo, hi = sdf.bounds()
+        lo = np.floor(lo * scale / VOXEL_SIZE).astype(np.int64) - 1
+        hi = np.ceil(hi * scale / VOXEL_SIZE).astype(np.int64) + 1
+        dims = hi - lo + 1
+        dims[2] = (dims[2] + 1) // 2 # Every other z per column (parity)
+        depth = 0.5 * float(np.max(hi - lo)) * VOXEL_SIZE # Deepest possible inside point
+        return ti.Vector(lo.tolist()), ti.Vector(dims.tolist()), depth
+
+    @ti.func
+    def site(self, origin, i, j, m):
+        li, lj = origin[0] + i, origin[1] + j
+        lk = origin[2] + 2 * m + ((li + lj + origin[2]) & 1) # li + lj + lk even
+        return ti.Vector([li, lj, lk]).cast(ti.f32) * VOXEL_SIZE
+
+    @ti.func
+    def depth_bin(self, d, depth):
+        return ti.math.clamp(int((d + depth) / depth * SDF_HIST_BINS), 0, SDF_HIST_BINS - 1)
+
+    @ti.func
+    def site_bin(self, sdf, origin, dims, n, scale, depth):
+        # Site n in ndrange(dims) order and its depth bin (-1 = outside)
+        m = n % dims[2]
+        j = (n // dims[2]) % dims[1]
+        i = n // (dims[1] * dims[2])
+        p = self.site(origin, i, j, m)
+        d = sdf.eval(p / scale) * scale
+        b = -1
+        if d < 0.0:
+            b = self.depth_bin(d, depth)
+        return p, b
+
+    @ti.kernel
+    def count(self, sdf: ti.template(), origin: ti.types.vector(3, ti.i32),
+              dims: ti.types.vector(3, ti.i32), scale: ti.f32, depth: ti.f32):
+        for b in range(SDF_HIST_BINS):
+            self.hist[b] = 0
+        self.inside[None] = 0
+        for i, j, m in ti.ndrange(dims[0], dims[1], dims[2]):
+            p = self.site(origin, i, j, m)
+            d = sdf.eval(p / scale) * scale
+            if d < 0.0:
+                ti.atomic_add(self.inside[None], 1)
+                ti.atomic_add(self.hist[self.depth_bin(d, depth)], 1)
+
+        # Threshold: first bin (deepest first) where the running total reaches N
+        self.threshold_bin[None] = SDF_HIST_BINS - 1
+        self.below[None] = 0
+        total = 0
+        found = 0
+        ti.loop_config(serialize=True)
+        for b in range(SDF_HIST_BINS):
+            if found == 0 and total + self.hist[b] >= NUM_AGENTS:
+                self.threshold_bin[None] = b
+                self.below[None] = total
+                found = 1
+            total += self.hist[b]
+
+    @ti.kernel
+    def emit(self, sdf: ti.template(), origin: ti.types.vector(3, ti.i32),
+             dims: ti.types.vector(3, ti.i32), scale: ti.f32, depth: ti.f32):
+        total = dims[0] * dims[1] * dims[2]
+        run = (total + EMIT_RUNS - 1) // EMIT_RUNS
+        threshold = self.threshold_bin[None]
+
+        # 1. Count per run
+        for r in range(EMIT_RUNS):
+            below = 0
+            edge = 0
+            for n in range(r * run, ti.min((r + 1) * run, total)):
+                _, b = self.site_bin(sdf, origin, dims, n, scale, depth)
+                if b >= 0 and b < threshold:
+                    below += 1
+                elif b == threshold:
+                    edge += 1
+            self.run_below[r] = below
+            self.run_edge[r] = edge
+
+        # 2. Exclusive prefix sums over the runs (short and serial)
+        below_total = 0
+        edge_total = 0
+        ti.loop_config(serialize=True)
+        for r in range(EMIT_RUNS):
+            below, edge = self.run_below[r], self.run_edge[r]
+            self.run_below[r] = below_total
+            self.run_edge[r] = edge_total
+            below_total += below
+            edge_total += edge
+
+        # 3. Each run writes its sites in order: deeper ones from 0, threshold-bin
+        #    ones from below while they fit (the first in site order make the cut)
+        for r in range(EMIT_RUNS):
+            k_below = self.run_below[r]
+            k_edge = self.run_edge[r]
+            for n in range(r * run, ti.min((r + 1) * run, total)):
+                p, b = self.site_bin(sdf, origin, dims, n, scale, depth)
+                if b >= 0 and b < threshold:
+                    self.target[k_below] = p
+                    k_below += 1
+                elif b == threshold:
+                    if k_edge < NUM_AGENTS - self.below[None]:
+                        self.target[self.below[None] + k_edge] = p
+                    k_edge += 1
+
+    def count_at(self, sdf, scale):
+        origin, dims, depth = self.lattice_box(sdf, scale)
+        self.count(sdf, origin, dims, scale, depth)
+        return self.inside[None]
+
+    def fit_scale(self, sdf):
+        # Initial guess: assume the shape fills half its box (FCC: 2 * VOXEL_SIZE^3 per site)
+        lo, hi = sdf.bounds()
+        box_sites = float(np.prod(hi - lo)) / (2.0 * VOXEL_SIZE ** 3)
+        scale = (NUM_AGENTS / max(0.5 * box_sites, 1e-9)) ** (1.0 / 3.0)
+
+        # Bracket then bisect: flat faces add whole lattice layers at once, so
+        # the slack band can be unreachable; keep the tightest scale holding N
+        small, large = None, None
+        for _ in range(SDF_FIT_ITERS):
+            inside = self.count_at(sdf, scale)
+            if inside >= NUM_AGENTS:
+                large = scale
+                if inside <= NUM_AGENTS * (1.0 + SDF_FIT_SLACK):
+                    return scale # The histogram is left counted at this scale
+            else:
+                small = scale
+            if small is not None and large is not None:
+                scale = (small * large) ** 0.5
+            else:
+                # Sites grow with scale^3; aim for the middle of the slack band
+                ratio = NUM_AGENTS * (1.0 + SDF_FIT_SLACK / 2) / max(inside, 1)
+                scale *= min(ratio, 64.0) ** (1.0 / 3.0)
+        scale = large if large is not None else scale
+        self.count_at(sdf, scale)
+        return scale
+
+    def fill(self, sdf, scale=None):
+        """Writes NUM_AGENTS sites into target; returns the scale used"""
+        if scale is None and SDF_AUTO_FIT:
+            scale = self.fit_scale(sdf)
+        else:
+            scale = 1.0 if scale is None else scale
+            self.count_at(sdf, scale)
+        if self.inside[None] < NUM_AGENTS:
+            raise ValueError(f"SDF holds {self.inside[None]} voxels at scale {scale:.3f}, "
+                             f"need {NUM_AGENTS}; enable SDF_AUTO_FIT or pass a larger scale")
+        origin, dims, depth = self.lattice_box(sdf, scale)
+        self.emit(sdf, origin, dims, scale, depth)
+        return scale
@@ -0,0 +1,143 @@
+import os
+import numpy as np
+import taichi as ti
+from config import *
+from targets import TargetGenerator
+from target_import import load_points
+from sdf import SDFGenerator, SmoothUnion, Sphere, Torus
+import compact
+from compact import fit
+
+@ti.data_oriented
+class ShapeBank:
+    """
+    Precomputed target layouts, one row of NUM_AGENTS points per shape.
+    Shapes are generated (or loaded) once; switching is a single device-side
+    row copy into the live target field.
+
+    In compact storage the rows stay in host memory instead (float32, clamped
+    like fit()) and a switch uploads one row: the device keeps no bank rows.
+
+    Register shapes with register(name, fill), where fill() writes NUM_AGENTS
+    points into bank.staging (e.g. a bank.generator kernel), or with
+    register_points(name, array) for an (NUM_AGENTS, 3) array, or with
+    register_file(path) for an OBJ / PLY / .npy source (see target_import),
+    or with register_sdf(name, shape) for a solid voxel fill (see sdf).
+    """
+    def __init__(self, target, capacity=SHAPE_BANK_CAPACITY):
+        self.target = target
+        self.capacity = capacity
+        self.names = []
+        if COMPACT_STORAGE:
+            self.shapes = None
+            self.host_rows = [] # (NUM_AGENTS, 3) float32 per shape
+        else:
+            self.shapes = compact.pos_field((capacity, NUM_AGENTS))
+            self.host_rows = None
+        self.staging = ti.Vector.field(3, dtype=ti.f32, shape=NUM_AGENTS)
+        self.generator = TargetGenerator(self.staging)
+        self.sdf_generator = SDFGenerator(self.staging)
+
+    def __len__(self):
+        return len(self.names)
+
+    def index(self, name):
+        return self.names.index(name)
+
+    def _next_row(self, name):
+        if name in self.names:
+            return self.names.index(name)
+        if len(self.names) >= self.capacity:
+            raise ValueError(f"Shape bank is full ({self.capacity} shapes); raise SHAPE_BANK_CAPACITY")
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def register(self, name, fill):
+        fill() # First: a fill that raises leaves the bank as it was
+        row = self._next_row(name)
+        self.store(row)
+        return row
+
+    def register_points(self, name, points):
+        points = np.ascontiguousarray(points, dtype=np.float32)
+        if points.shape != (NUM_AGENTS, 3):
+            raise ValueError(f"Shape '{name}' has {points.shape} points, expected ({NUM_AGENTS}, 3)")
+        row = self._next_row(name)
+        self.store(row, points)
+        return row
+
+    def register_file(self, path, name=None, mode="surface"):
+        points = load_points(path, NUM_AGENTS, mode) # Memory-mapped once cached
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+        return self.register_points(name, points)
+
+    def register_sdf(self, name, shape, scale=None):
+        return self.register(name, lambda: self.sdf_generator.fill(shape, scale))
+
+    def store(self, row, points=None):
+        # points=None: from staging
+        if self.host_rows is None:
+            if points is None:
+                self.store_staging(row)
+            else:
+                self.store_points(row, points)
+            return
+        if points is None:
+            points = self.staging.to_numpy()
+        points = np.clip(points, -COMPACT_EXTENT, COMPACT_EXTENT) # fit() on the host
+        if row < len(self.host_rows):
+            self.host_rows[row] = points
+        else:
+            self.host_rows.append(points)
+
+    def activate(self, row):
+        """Makes shape row the live target"""
+        if self.host_rows is None:
+            self.activate_row(row)
+        else:
+            compact.from_numpy(self.target, self.host_rows[row])
+
+    @ti.kernel
+    def store_staging(self, row: ti.i32):
+        for i in range(NUM_AGENTS):
+            self.shapes[row, i] = fit(self.staging[i])
+
+    @ti.kernel
+    def store_points(self, row: ti.i32, points: ti.types.ndarray()):
+        for i in range(NUM_AGENTS):
+            self.shapes[row, i] = fit(ti.Vector([points[i, 0], points[i, 1], points[i, 2]]))
+
+    @ti.kernel
+    def activate_row(self, row: ti.i32):
+        for i in range(NUM_AGENTS):
+            self.target[i] = self.shapes[row, i]
+
+    def register_builtin(self):
+        self.register("Sphere", self.generator.init_sphere)
+        self.register("Cube", self.generator.init_cube)
+        self.register("Smiley", self.generator.init_smiley)
+        self.register_sdf("Solid Blob", SmoothUnion(Sphere(0.8), Torus(1.2, 0.3), 0.3))
+
+    # --- Disk ---
+
+    @ti.kernel
+    def fetch(self, row: ti.i32):
+        for i in range(NUM_AGENTS):
+            self.staging[i] = self.shapes[row, i]
+
+    def save(self, path):
+        # Row by row through staging: works for packed rows too
+        shapes = np.zeros((len(self.names), NUM_AGENTS, 3), dtype=np.float32)
+        for row in range(len(self.names)):
+            if self.host_rows is None:
+                self.fetch(row)
+                shapes[row] = self.staging.to_numpy()
+            else:
+                shapes[row] = self.host_rows[row]
+        np.savez(path, names=np.array(self.names), shapes=shapes)
+
+    def load(self, path):
+        data = np.load(path)
+        for name, points in zip(data["names"], data["shapes"]):
+            self.register_points(str(name), points)
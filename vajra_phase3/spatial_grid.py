@@ -0,0 +1,203 @@
+import taichi as ti
+from config import *
+
+GROUP_STRIDE = 1 << 16 # Cells between groups along x, far beyond any swarm
+
+def next_pow2(n):
+    p = 1
+    while p < n:
+        p *= 2
+    return p
+
+@ti.func
+def inclusive_scan(counts: ti.template(), ends: ti.template(), block_sum: ti.template(), num_blocks):
+    """
+    Blocked inclusive prefix sum of the first num_blocks * GRID_SCAN_BLOCK
+    counts into ends. Call from the top level of a kernel: per-block totals,
+    a short serial scan over the totals, then a per-block scan seeded with
+    the block offset. block_sum needs num_blocks entries.
+    """
+    for b in range(num_blocks):
+        total = 0
+        for k in range(GRID_SCAN_BLOCK):
+            total += counts[b * GRID_SCAN_BLOCK + k]
+        block_sum[b] = total
+
+    ti.loop_config(serialize=True)
+    for b in range(num_blocks):
+        if b > 0:
+            block_sum[b] += block_sum[b - 1]
+
+    for b in range(num_blocks):
+        running = 0
+        if b > 0:
+            running = block_sum[b - 1]
+        for k in range(GRID_SCAN_BLOCK):
+            h = b * GRID_SCAN_BLOCK + k
+            running += counts[h]
+            ends[h] = running
+
+@ti.data_oriented
+class SpatialGrid:
+    """
+    Hashed uniform grid (cell list) over a position field.
+    Cells are NEIGHBOR_RADIUS wide, so every neighbor of an agent lives in
+    the 3x3x3 block of cells around it. The world is unbounded: cell
+    coordinates are hashed into a power-of-two bucket table.
+
+    Build = count agents per bucket -> blocked prefix sum -> scatter ids
+    (-> id-sort each bucket when DETERMINISTIC).
+    Bucket h then owns sorted_ids[cell_start[h] : cell_start[h] + cell_count[h]].
+
+    With ids, a build covers only items ids[begin:end] (rebuild(begin, end))
+    and sizes its bucket table to them, so it costs O(end - begin), not
+    O(N). Grids over disjoint ranges of the same ids can share cell_of
+    (shared=other grid); it is only used while building.
+
+    With group_size > 0, items i // group_size are separate worlds sharing
+    one table: each group's cells sit GROUP_STRIDE cells apart along x, so
+    groups never see each other's items, and each group hashes into its own
+    equal slice of the table, so one group's lookups stay close in memory.
+    """
+    def __init__(self, pos, cell_size=NEIGHBOR_RADIUS, group_size=0, ids=None, shared=None):
+        self.pos = pos
+        self.num_items = pos.shape[0]
+        self.group_size = group_size
+        self.ids = ids
+        self.has_ids = ids is not None
+        self.inv_cell_size = ti.field(dtype=ti.f32, shape=())
+        self.table_size = next_pow2(max(GRID_TABLE_FACTOR * self.num_items, GRID_SCAN_BLOCK))
+        self.group_slots = 1 # Table slices: a power of 2 >= the number of groups
+        if group_size > 0:
+            self.group_slots = next_pow2(-(-self.num_items // group_size))
+            self.table_size = max(next_pow2(GRID_TABLE_FACTOR * group_size) * self.group_slots, GRID_SCAN_BLOCK)
+        self.num_blocks = self.table_size // GRID_SCAN_BLOCK
+        self.table_mask = ti.field(dtype=ti.i32, shape=()) # Buckets in use - 1, set per build
+        self.slice_size = ti.field(dtype=ti.i32, shape=()) # Buckets per group slice, set per build
+
+        self.cell_count = ti.field(dtype=ti.i32, shape=self.table_size)
+        self.cell_start = ti.field(dtype=ti.i32, shape=self.table_size)
+        self.block_sum = ti.field(dtype=ti.i32, shape=self.num_blocks)
+        if shared is None:
+            self.cell_of = ti.field(dtype=ti.i32, shape=self.num_items) # Bucket of each agent
+        else:
+            self.cell_of = shared.cell_of
+        self.sorted_ids = ti.field(dtype=ti.i32, shape=self.num_items)
+        self.bounds_lo = ti.Vector.field(3, dtype=ti.f32, shape=()) # AABB of pos at build time
+        self.bounds_hi = ti.Vector.field(3, dtype=ti.f32, shape=())
+        self.table_mask[None] = self.table_size - 1
+        self.slice_size[None] = self.table_size // self.group_slots
+        self.set_cell_size(cell_size)
+
+    def set_cell_size(self, cell_size):
+        self.cell_size = cell_size
+        self.inv_cell_size[None] = 1.0 / cell_size
+
+    # --- Helpers (usable from any kernel) ---
+
+    @ti.func
+    def cell_coord(self, p):
+        return ti.floor(p * self.inv_cell_size[None]).cast(ti.i32)
+
+    @ti.func
+    def item_cell(self, i, p):
+        # Cell of item i at p, shifted into its group's part of the world
+        c = self.cell_coord(p)
+        if ti.static(self.group_size > 0):
+            c.x += (i // self.group_size) * GROUP_STRIDE
+        return c
+
+    @ti.func
+    def hash_cell(self, c):
+        # Classic 3-prime spatial hash; i32 overflow wraps, mask keeps it in range
+        x = c.x
+        base = 0
+        if ti.static(self.group_size > 0):
+            g = (x + GROUP_STRIDE // 2) // GROUP_STRIDE # Group back from the shifted cell
+            x -= g * GROUP_STRIDE
+            base = g * self.slice_size[None]
+        h = (x * 73856093) ^ (c.y * 19349663) ^ (c.z * 83492791)
+        if ti.static(self.group_size > 0):
+            h = base + (h & (self.slice_size[None] - 1))
+        return h & self.table_mask[None]
+
+    @ti.func
+    def bucket_range(self, h):
+        start = self.cell_start[h]
+        return start, start + self.cell_count[h]
+
+    @ti.func
+    def item(self, k):
+        i = k
+        if ti.static(self.has_ids):
+            i = self.ids[k]
+        return i
+
+    def bounds(self):
+        # AABB of the last build; inverted (+-1e30) when it was empty
+        return self.bounds_lo[None], self.bounds_hi[None]
+
+    @ti.func
+    def in_cell(self, i, p, c):
+        # Buckets are shared by colliding cells; filter by the real cell
+        return (self.item_cell(i, p) == c).all()
+
+    # --- Build ---
+
+    @ti.kernel
+    def build(self):
+        self.rebuild(0, self.num_items)
+
+    @ti.func
+    def rebuild(self, begin, end):
+        # Call from the top level of a kernel (fused into the physics step)
+        # 0. A table of ~GRID_TABLE_FACTOR buckets per item in the range
+        size = GRID_SCAN_BLOCK
+        if ti.static(self.group_size > 0):
+            # Equal slices, each big enough for the whole range in one group
+            slice_size = 1
+            while slice_size < GRID_TABLE_FACTOR * ti.min(end - begin, self.group_size):
+                slice_size *= 2
+            size = ti.max(size, slice_size * self.group_slots)
+            self.slice_size[None] = size // self.group_slots
+        else:
+            while size < self.table_size and size < GRID_TABLE_FACTOR * (end - begin):
+                size *= 2
+        self.table_mask[None] = size - 1
+
+        # 1. Count agents per bucket
+        for h in range(size):
+            self.cell_count[h] = 0
+        self.bounds_lo[None] = ti.Vector([1e30, 1e30, 1e30])
+        self.bounds_hi[None] = ti.Vector([-1e30, -1e30, -1e30])
+        for k in range(begin, end):
+            i = self.item(k)
+            h = self.hash_cell(self.item_cell(i, self.pos[i]))
+            self.cell_of[i] = h
+            ti.atomic_add(self.cell_count[h], 1)
+            ti.atomic_min(self.bounds_lo[None], self.pos[i])
+            ti.atomic_max(self.bounds_hi[None], self.pos[i])
+
+        # 2. Prefix sum (inclusive: cell_start[h] is the end of bucket h)
+        inclusive_scan(self.cell_count, self.cell_start, self.block_sum, size // GRID_SCAN_BLOCK)
+
+        # 3. Scatter: decrementing the bucket end leaves cell_start at the bucket start
+        for k in range(begin, end):
+            i = self.item(k)
+            slot = ti.atomic_sub(self.cell_start[self.cell_of[i]], 1) - 1
+            self.sorted_ids[slot] = i
+
+        # 4. Scatter order depends on thread timing; sort each bucket by id so
+        #    neighbor loops (and their float sums) always run in the same order
+        if ti.static(DETERMINISTIC):
+            for h in range(size):
+                start, end = self.bucket_range(h)
+                for a in range(start + 1, end):
+                    id_a = self.sorted_ids[a]
+                    b = a
+                    while b > start:
+                        if self.sorted_ids[b - 1] < id_a:
+                            break
+                        self.sorted_ids[b] = self.sorted_ids[b - 1]
+                        b -= 1
+                    self.sorted_ids[b] = id_a
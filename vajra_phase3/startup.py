@@ -0,0 +1,65 @@
+import time
+import taichi as ti
+from config import *
+import compact
+
+def init_taichi(arch=ti.gpu, **kwargs):
+    """ti.init with the project-local offline cache; returns seconds taken"""
+    start = time.perf_counter()
+    ti.init(arch=arch, kernel_profiler=PROFILE,
+            offline_cache=OFFLINE_CACHE, offline_cache_file_path=OFFLINE_CACHE_DIR, **kwargs)
+    return time.perf_counter() - start
+
+def timed(timings, name, fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    ti.sync()
+    timings[name] = time.perf_counter() - start
+
+def warmup(physics):
+    """
+    Runs every cold path once so its kernels compile (or load from the
+    offline cache) now rather than on the first frame / blast / shape
+    switch, then puts the simulation back exactly as it was.
+    Returns {path: seconds}.
+    """
+    timings = {}
+    fields = {name: compact.to_numpy(f) for name, f in physics.state_fields().items()}
+    counters = physics.state_counters()
+
+    # 1. Frame: rebuild_active, step (grid + substeps), metrics
+    timed(timings, "wake_all", physics.wake_all)
+    timed(timings, "update", physics.update)
+    timed(timings, "metrics", physics.metrics.compute, True)
+
+    # 2. Blast: both paths, with rays that hit nothing
+    far = (1e6, 1e6, 1e6)
+    timed(timings, "disrupt_all", physics.disrupt_all, far, (1.0, 0.0, 0.0))
+    timed(timings, "disrupt_cells", physics.disrupt_cells, far, (1.0, 0.0, 0.0), 0,
+          (1, 0, 0), (0, 1, 0), (0, 0, 1), 0, 0, 0, 0, 0.0, 0.0, 0.0, 0.0)
+
+    # 3. Shape switch: bank activate, target assignment, wake_displaced
+    timed(timings, "set_shape", physics.set_shape, (physics.shape_idx + 1) % len(physics.bank))
+    timed(timings, "sync_transforms", physics.sync_transforms)
+
+    # 4. Z-order re-sort, when on
+    if REORDER_INTERVAL > 0:
+        timed(timings, "reorder", physics.reorder)
+
+    # 5. Restore; the active list, grids and transforms are rebuilt from the restored state
+    for name, f in physics.state_fields().items():
+        compact.from_numpy(f, fields[name])
+    for name, value in counters.items():
+        setattr(physics, name, value)
+    physics.rebuild_derived()
+    physics.metrics.compute()
+    return timings
+
+def report(timings, prefix="[startup]"):
+    for name, seconds in timings.items():
+        if isinstance(seconds, dict):
+            total = sum(seconds.values())
+            parts = ", ".join(f"{k} {v * 1e3:.0f}ms" for k, v in seconds.items())
+            print(f"{prefix} {name}: {total:.2f}s ({parts})")
+        else:
+            print(f"{prefix} {name}: {seconds:.2f}s")
@@ -0,0 +1,107 @@
+"""
+Headless Phase 3 parameter sweep: every combination of the --grid values
+runs as one instance of a BatchedPhysics, all stepped by the same kernels.
+
+    python sweep.py --agents 2048 --grid SEPARATION_FORCE=0.5,1,2,4 \
+        --grid VELOCITY_DAMPING=0.9,0.96 --grid SNAP_DISTANCE=0.03,0.05 \
+        --out sweep.jsonl
+
+Tunables: SEPARATION_FORCE, VELOCITY_DAMPING (friction), SNAP_DISTANCE,
+WAKE_COUPLING. One JSON line per instance goes to --out (or stdout).
+Converged instances are frozen, so they stop costing frame time.
+--serial steps the same instances one at a time instead, for comparison
+(B separate launches per frame against one batched launch).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Repo root
+from vajra_common.sweep import literal, parse_grid
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--arch", default="cpu", help="cpu, gpu, cuda, vulkan, metal, ...")
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads (0 = Taichi default)")
+    parser.add_argument("--agents", type=int, default=None, help="NUM_AGENTS per instance (default: config)")
+    parser.add_argument("--grid", action="append", default=[], metavar="KEY=V1,V2,...",
+                        help="Values of one tunable (repeatable; the sweep is every combination)")
+    parser.add_argument("--shape", default=None, help="Bank shape to converge on (default: the first)")
+    parser.add_argument("--max-frames", type=int, default=5000, help="Give up converging after this many frames")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Config override for every instance, e.g. --set SUBSTEPS=4 (repeatable)")
+    parser.add_argument("--serial", action="store_true", help="One instance at a time (a batch of 1 each)")
+    parser.add_argument("--out", default=None, help="JSON-lines file (default: stdout)")
+    return parser.parse_args(argv)
+
+def sweep(params, args):
+    import taichi as ti
+    from batch import BatchedPhysics, run_until_converged
+
+    start = time.perf_counter()
+    physics = BatchedPhysics(params)
+    if args.shape is not None:
+        physics.set_shape(args.shape)
+    ti.sync()
+    init_s = time.perf_counter() - start
+
+    # Keep kernel compiles out of the timing: the step, and the paths a
+    # converging run takes later (no-ops here)
+    physics.apply_wakes()
+    physics.freeze(physics.frozen_mask)
+    physics.update()
+    ti.sync()
+    start = time.perf_counter()
+    frames, metrics, converged_at = run_until_converged(physics, max_frames=args.max_frames)
+    ti.sync()
+    return init_s, time.perf_counter() - start, frames + 1, metrics, converged_at
+
+def main(argv=None):
+    args = parse_args(argv)
+    import config
+    if args.agents is not None:
+        config.NUM_AGENTS = args.agents
+    for item in args.set:
+        key, value = item.split("=", 1)
+        if not hasattr(config, key):
+            raise KeyError(f"Unknown config key: {key}")
+        setattr(config, key, literal(value))
+
+    import taichi as ti
+    from startup import init_taichi
+    init_kwargs = {}
+    if args.threads > 0:
+        init_kwargs["cpu_max_num_threads"] = args.threads
+    init_taichi(getattr(ti, args.arch), **init_kwargs)
+
+    params = parse_grid(args.grid)
+    if args.serial:
+        runs = [sweep([p], args) for p in params]
+    else:
+        runs = [sweep(params, args)]
+    init_s = sum(run[0] for run in runs)
+    step_s = sum(run[1] for run in runs)
+    frames = sum(run[2] for run in runs)
+    metrics = [m for run in runs for m in run[3]]
+    converged_at = [f for run in runs for f in run[4]]
+
+    out = open(args.out, "a") if args.out else sys.stdout
+    for b, (p, m, f) in enumerate(zip(params, metrics, converged_at)):
+        result = {"instance": b, "params": p, "agents": config.NUM_AGENTS, "overrides": args.set,
+                  "converged": f is not None, "frames": f}
+        result.update(m)
+        out.write(json.dumps(result) + "\n")
+        print(f"{b:>4}  {json.dumps(p):<60} " + (f"{f:>6} frames" if f is not None else "   not converged") +
+              f"  locked {m['locked_fraction']:.3f}  mean dist {m['mean_dist']:.4f}", file=sys.stderr)
+    if args.out:
+        out.close()
+    # Cost of advancing every running instance one frame: one launch per
+    # frame batched, one per instance serial
+    frame_ms = 1e3 * (sum(run[1] / run[2] for run in runs) if args.serial else step_s / frames)
+    print(f"{len(params)} instances x {config.NUM_AGENTS} agents ({'serial' if args.serial else 'batched'}): "
+          f"{init_s:.2f}s init, {step_s:.2f}s stepping over {frames} frames, "
+          f"{frame_ms:.2f} ms per frame of all instances", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Arbitrary target shapes from OBJ / PLY meshes or .npy point clouds.
+
+Sources are resampled to exactly NUM_AGENTS evenly spread points, centered and
+scaled to TARGET_IMPORT_RADIUS, and cached in TARGET_CACHE_DIR as .npy files
+keyed by (source file, agent count, mode). A cached shape is memory-mapped, so
+reloading a large model costs no resampling and no copy.
+"""
+import hashlib
+import os
+import numpy as np
+from config import *
+
+# --- Readers ---
+
+def read_obj(path):
+    vertices, faces = [], []
+    with open(path, "r", errors="ignore") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "v":
+                vertices.append([float(x) for x in parts[1:4]])
+            elif parts[0] == "f":
+                # "f 1 2 3", "f 1/1/1 2/2/2 ...", negative = relative to the end
+                idx = [int(p.split("/")[0]) for p in parts[1:]]
+                idx = [i - 1 if i > 0 else len(vertices) + i for i in idx]
+                for k in range(1, len(idx) - 1): # Fan-triangulate polygons
+                    faces.append([idx[0], idx[k], idx[k + 1]])
+    return np.array(vertices, dtype=np.float64), np.array(faces, dtype=np.int64).reshape(-1, 3)
+
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+
+def read_ply(path):
+    with open(path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise ValueError(f"{path} is not a PLY file")
+        fmt, elements = None, []
+        while True:
+            line = f.readline().decode("ascii", errors="ignore").split()
+            if not line:
+                continue
+            if line[0] == "format":
+                fmt = line[1]
+            elif line[0] == "element":
+                elements.append((line[1], int(line[2]), []))
+            elif line[0] == "property":
+                elements[-1][2].append(line[1:])
+            elif line[0] == "end_header":
+                break
+
+        vertices = np.zeros((0, 3))
+        faces = np.zeros((0, 3), dtype=np.int64)
+        if fmt == "ascii":
+            rows = f.read().decode("ascii").split("\n")
+            cursor = 0
+            for name, count, props in elements:
+                block = [r.split() for r in rows[cursor:cursor + count]]
+                cursor += count
+                if name == "vertex":
+                    names = [p[-1] for p in props]
+                    cols = [names.index(c) for c in ("x", "y", "z")]
+                    vertices = np.array([[float(r[c]) for c in cols] for r in block])
+                elif name == "face":
+                    tris = []
+                    for r in block:
+                        n = int(r[0])
+                        idx = [int(x) for x in r[1:1 + n]]
+                        tris.extend([idx[0], idx[k], idx[k + 1]] for k in range(1, n - 1))
+                    faces = np.array(tris, dtype=np.int64).reshape(-1, 3)
+            return vertices, faces
+
+        endian = "<" if fmt == "binary_little_endian" else ">"
+        for name, count, props in elements:
+            if all(p[0] != "list" for p in props):
+                dtype = np.dtype([(p[1], endian + PLY_TYPES[p[0]]) for p in props])
+                data = np.frombuffer(f.read(dtype.itemsize * count), dtype=dtype)
+                if name == "vertex":
+                    vertices = np.stack([data["x"], data["y"], data["z"]], axis=1).astype(np.float64)
+            elif name == "face" and len(props) == 1:
+                # Fast path: every face is a triangle
+                _, count_t, index_t, _ = props[0]
+                dtype = np.dtype([("n", endian + PLY_TYPES[count_t]), ("idx", endian + PLY_TYPES[index_t], 3)])
+                start = f.tell()
+                data = np.frombuffer(f.read(dtype.itemsize * count), dtype=dtype)
+                if len(data) == count and (data["n"] == 3).all():
+                    faces = data["idx"].astype(np.int64)
+                else:
+                    f.seek(start)
+                    faces = _read_binary_polygons(f, count, endian, count_t, index_t)
+            else:
+                raise ValueError(f"Unsupported PLY element layout: {name}")
+        return vertices, faces
+
+def _read_binary_polygons(f, count, endian, count_t, index_t):
+    count_dt = np.dtype(endian + PLY_TYPES[count_t])
+    index_dt = np.dtype(endian + PLY_TYPES[index_t])
+    tris = []
+    for _ in range(count):
+        n = int(np.frombuffer(f.read(count_dt.itemsize), dtype=count_dt)[0])
+        idx = np.frombuffer(f.read(index_dt.itemsize * n), dtype=index_dt)
+        tris.extend([idx[0], idx[k], idx[k + 1]] for k in range(1, n - 1))
+    return np.array(tris, dtype=np.int64).reshape(-1, 3)
+
+# --- Resampling ---
+
+def morton_order(points, bits=10):
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-12)
+    q = np.clip(((points - lo) / extent * (1 << bits)).astype(np.int64), 0, (1 << bits) - 1)
+    key = np.zeros(len(points), dtype=np.int64)
+    for bit in range(bits):
+        for axis in range(3):
+            key |= ((q[:, axis] >> bit) & 1) << (3 * bit + axis)
+    return np.argsort(key, kind="stable")
+
+def resample_points(points, num_points, rng):
+    """Exactly num_points, evenly spread: stratified picks along a Z-order curve"""
+    points = np.asarray(points, dtype=np.float64)
+    order = morton_order(points)
+    if len(points) >= num_points:
+        # One shared offset keeps picks distinct even when len(points) ~ num_points
+        strata = (np.arange(num_points) + rng.random()) * (len(points) / num_points)
+        return points[order[strata.astype(np.int64)]]
+    # Too few points: repeat along the curve with a jitter of ~ the point spacing
+    extent = np.prod(np.maximum(np.ptp(points, axis=0), 1e-9))
+    spacing = (extent / len(points)) ** (1.0 / 3.0)
+    picks = order[(np.arange(num_points) * len(points)) // num_points]
+    jitter = (rng.random((num_points, 3)) - 0.5) * spacing * 0.5
+    jitter[np.r_[True, picks[1:] != picks[:-1]]] = 0.0 # First copy stays exact
+    return points[picks] + jitter
+
+def sample_surface(vertices, faces, num_points, rng):
+    """Area-weighted stratified triangle picks + low-discrepancy barycentrics"""
+    a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    area = 0.5 * np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    cdf = np.cumsum(area)
+    strata = (np.arange(num_points) + rng.random(num_points)) / num_points * cdf[-1]
+    tri = np.minimum(np.searchsorted(cdf, strata), len(faces) - 1)
+
+    # R2 sequence (golden ratio in 2D), folded into the triangle
+    g = 1.32471795724474602596
+    n = np.arange(num_points) + rng.integers(1 << 16)
+    u = (0.5 + n / g) % 1.0
+    v = (0.5 + n / (g * g)) % 1.0
+    flip = u + v > 1.0
+    u[flip], v[flip] = 1.0 - u[flip], 1.0 - v[flip]
+    return a[tri] + (b[tri] - a[tri]) * u[:, None] + (c[tri] - a[tri]) * v[:, None]
+
+def mesh_volume(vertices, faces):
+    a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    return abs(np.einsum("ij,ij->i", a, np.cross(b, c)).sum()) / 6.0
+
+def lattice_inside(vertices, faces, spacing):
+    """Lattice points inside a closed mesh (ray parity along +z per column)"""
+    lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+    # Columns slightly off the half-cell so rays do not run through shared edges
+    xs = np.arange(lo[0] + spacing * 0.5013, hi[0], spacing)
+    ys = np.arange(lo[1] + spacing * 0.4987, hi[1], spacing)
+    hits_col, hits_z = [], []
+    tris = vertices[faces]
+    for t in tris:
+        (x0, y0, z0), (x1, y1, z1), (x2, y2, z2) = t
+        ix = np.nonzero((xs >= min(x0, x1, x2)) & (xs <= max(x0, x1, x2)))[0]
+        iy = np.nonzero((ys >= min(y0, y1, y2)) & (ys <= max(y0, y1, y2)))[0]
+        if len(ix) == 0 or len(iy) == 0:
+            continue
+        det = (y1 - y2) * (x0 - x2) + (x2 - x1) * (y0 - y2)
+        if abs(det) < 1e-18:
+            continue # Edge-on to the rays
+        px, py = np.meshgrid(xs[ix], ys[iy], indexing="ij")
+        l0 = ((y1 - y2) * (px - x2) + (x2 - x1) * (py - y2)) / det
+        l1 = ((y2 - y0) * (px - x2) + (x0 - x2) * (py - y2)) / det
+        l2 = 1.0 - l0 - l1
+        inside = (l0 >= 0) & (l1 >= 0) & (l2 > 0)
+        gx, gy = np.meshgrid(ix, iy, indexing="ij")
+        hits_col.append((gx[inside] * len(ys) + gy[inside]))
+        hits_z.append((l0 * z0 + l1 * z1 + l2 * z2)[inside])
+    if not hits_col:
+        return np.zeros((0, 3))
+
+    col = np.concatenate(hits_col)
+    z = np.concatenate(hits_z)
+    order = np.lexsort((z, col))
+    col, z = col[order], z[order]
+    points = []
+    starts = np.r_[0, np.nonzero(np.diff(col))[0] + 1, len(col)]
+    for s, e in zip(starts[:-1], starts[1:]):
+        zs = z[s:e]
+        cx, cy = xs[col[s] // len(ys)], ys[col[s] % len(ys)]
+        for z_in, z_out in zip(zs[0::2], zs[1::2]): # Entry/exit pairs
+            zz = np.arange(np.ceil(z_in / spacing) * spacing, z_out, spacing)
+            points.append(np.stack([np.full_like(zz, cx), np.full_like(zz, cy), zz], axis=1))
+    return np.concatenate(points) if points else np.zeros((0, 3))
+
+def sample_volume(vertices, faces, num_points, rng):
+    spacing = (mesh_volume(vertices, faces) / (num_points * 1.2)) ** (1.0 / 3.0)
+    for _ in range(6):
+        points = lattice_inside(vertices, faces, spacing)
+        if len(points) >= num_points:
+            return resample_points(points, num_points, rng)
+        spacing *= 0.8
+    raise ValueError("Mesh has too little enclosed volume; is it closed? Try mode='surface'")
+
+def fit_to_swarm(points):
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    center = (lo + hi) / 2.0
+    half = max(float(np.max(hi - lo)) / 2.0, 1e-12)
+    return (points - center) * (TARGET_IMPORT_RADIUS / half)
+
+# --- Cache ---
+
+def cache_path(path, num_points, mode):
+    st = os.stat(path)
+    ident = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{num_points}|{mode}|{TARGET_IMPORT_RADIUS}"
+    digest = hashlib.sha1(ident.encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(TARGET_CACHE_DIR, f"{stem}-{num_points}-{mode}-{digest}.npy")
+
+def load_points(path, num_points=NUM_AGENTS, mode="surface"):
+    """
+    (num_points, 3) float32 targets from a mesh or point cloud.
+    mode: 'surface' or 'volume' for meshes; point clouds are taken as given.
+    Returns a read-only memory map when the shape is already cached.
+    """
+    cached = cache_path(path, num_points, mode)
+    if os.path.exists(cached):
+        return np.load(cached, mmap_mode="r")
+
+    rng = np.random.default_rng(0)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        points = resample_points(np.load(path, mmap_mode="r").reshape(-1, 3), num_points, rng)
+    else:
+        if ext == ".obj":
+            vertices, faces = read_obj(path)
+        elif ext == ".ply":
+            vertices, faces = read_ply(path)
+        else:
+            raise ValueError(f"Unsupported target file: {path}")
+        if len(faces) == 0: # Vertex-only PLY/OBJ: treat as a point cloud
+            points = resample_points(vertices, num_points, rng)
+        elif mode == "volume":
+            points = sample_volume(vertices, faces, num_points, rng)
+        else:
+            points = sample_surface(vertices, faces, num_points, rng)
+
+    points = fit_to_swarm(points).astype(np.float32)
+    os.makedirs(TARGET_CACHE_DIR, exist_ok=True)
+    tmp = cached + ".tmp.npy"
+    np.save(tmp, points)
+    os.replace(tmp, cached)
+    return np.load(cached, mmap_mode="r")
@@ -0,0 +1,43 @@
+import os
+import sys
+import numpy as np
+from config import *
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Repo root
+from vajra_common import snapshot
+
+STATES = ("LIQUID", "SOLID")
+NUM_FACES = 6
+
+def state_arrays(voxels):
+    # Face latches are stored as flat face indices (voxel * 6 + face), -1 = open
+    index = {id(f): k for k, f in enumerate(f for v in voxels for f in v.faces)}
+    return {
+        "pos": np.array([(v.pos.x, v.pos.y) for v in voxels]),
+        "vel": np.array([(v.vel.x, v.vel.y) for v in voxels]),
+        "state": np.array([STATES.index(v.state) for v in voxels], dtype=np.int8),
+        "face_locked": np.array([[f.is_locked for f in v.faces] for v in voxels]),
+        "face_partner": np.array([[index.get(id(f.connected_neighbor), -1) for f in v.faces] for v in voxels],
+                                 dtype=np.int32),
+    }
+
+def set_state_arrays(voxels, arrays):
+    faces = [f for v in voxels for f in v.faces]
+    pos, vel, state, locked, partner = (arrays[k].tolist() for k in
+                                        ("pos", "vel", "state", "face_locked", "face_partner"))
+    for i, voxel in enumerate(voxels):
+        voxel.pos.update(*pos[i])
+        voxel.vel.update(*vel[i])
+        voxel.acc.update(0, 0) # Always cleared at the end of a frame
+        voxel.state = STATES[state[i]]
+        for k, face in enumerate(voxel.faces):
+            face.is_locked = locked[i][k]
+            face.connected_neighbor = faces[partner[i][k]] if partner[i][k] >= 0 else None
+
+def save_state(voxels, path=CHECKPOINT_PATH):
+    snapshot.save(path, state_arrays(voxels), {"num_agents": len(voxels), "rng": snapshot.rng_state()})
+
+def load_state(voxels, path=CHECKPOINT_PATH):
+    arrays, meta = snapshot.load(path)
+    snapshot.check_count(meta, len(voxels))
+    set_state_arrays(voxels, arrays)
+    snapshot.set_rng_state(meta["rng"])
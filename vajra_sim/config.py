@@ -1,3 +1,5 @@
+import os
+
 # --- PHYSICAL CONSTANTS ---
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 800
@@ -26,3 +28,14 @@ COLOR_LIQUID = (200, 200, 255)
 COLOR_SOLID = (255, 140, 0) # Vajra Gold
 COLOR_FACE_ACTIVE = (0, 255, 0) # Green when communicating
 DEBUG_MODE = True # Press 'D' to toggle
+
+# --- CHECKPOINTS ---
+# K saves, L loads (.npz = compressed, else a directory of .npy)
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoint.npz")
+
+# --- RECORDING ---
+RECORD_PATH = None # Trajectory file (pos + state per frame); None = off
+RECORD_EVERY = 1
+
+# --- SPLIT MODE ---
+SPLIT_SIM_RATE = 60 # --split: voxel steps per second in their own process (0 = unthrottled)
@@ -8,6 +8,11 @@ class Face:
         self.angle_offset = math.radians(angle_offset_deg)
         self.is_locked = False
         self.connected_neighbor = None # Reference to the specific face I am touching
+
+    def reset(self):
+        """Release the latch so the face can dock again"""
+        self.is_locked = False
+        self.connected_neighbor = None
     
     def get_world_position(self):
         """Calculates where this face is in the world based on parent rotation"""
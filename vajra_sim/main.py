@@ -1,21 +1,71 @@
+import os
+import argparse
 import pygame
 import sys
 import random
 from config import *
 from voxel import Voxel
+from checkpoint import STATES, save_state, load_state, state_arrays, set_state_arrays
+from tiled import TiledVoxels
+from vajra_common.trajectory import TrajectoryRecorder
+from vajra_common.replay import TrajectoryPlayer, KEYS
+from vajra_common.shared_frames import SharedFrameBuffer, RateMeter, Pacer, drain, start_process
+from vajra_common.tiles import TileEngine, parse_tiles
+from vajra_common.sweep import run_headless
+import numpy as np
+
+# Recording, replay and split mode share one frame layout
+FRAME_CHANNELS = {"pos": (np.float32, (NUM_AGENTS, 2)), "state": (np.int8, (NUM_AGENTS,)),
+                  "faces": (np.uint8, (NUM_AGENTS,))} # Latched-face bitmask
+
+def random_spawn_point():
+    return random.randint(50, SCREEN_WIDTH-50), random.randint(50, SCREEN_HEIGHT-50)
+
+def reset_voxels(voxels):
+    """Scatter the existing voxel pool back into the LIQUID state in place"""
+    for v in voxels:
+        v.reset(*random_spawn_point())
+
+def write_frame(slot, voxels):
+    for i, v in enumerate(voxels):
+        slot["pos"][i] = v.pos
+        slot["state"][i] = STATES.index(v.state)
+        slot["faces"][i] = sum(1 << k for k, f in enumerate(v.faces) if f.is_locked)
+
+def read_frame(arrays, voxels):
+    for v, pos, state, faces in zip(voxels, arrays["pos"].tolist(), arrays["state"].tolist(),
+                                    arrays["faces"].tolist()):
+        v.pos.update(pos)
+        v.state = STATES[state]
+        for k, face in enumerate(v.faces):
+            face.is_locked = bool(faces >> k & 1)
+
+def handle_key(key, voxels):
+    if key == "r": # Reset
+        reset_voxels(voxels)
+    elif key == "k":
+        save_state(voxels)
+    elif key == "l" and os.path.exists(CHECKPOINT_PATH):
+        load_state(voxels)
 
 def main():
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Project Vajra: Decentralized Face Consensus v1.0")
     clock = pygame.time.Clock()
-    
-    # Spawn Agents
+    font = pygame.font.SysFont("monospace", 15)
+
+    # Spawn Agents (allocated once; R reuses this pool)
     voxels = []
     for i in range(NUM_AGENTS):
-        v = Voxel(i, random.randint(50, SCREEN_WIDTH-50), random.randint(50, SCREEN_HEIGHT-50))
+        v = Voxel(i, *random_spawn_point())
         voxels.append(v)
 
+    recorder = None
+    if RECORD_PATH:
+        recorder = TrajectoryRecorder(RECORD_PATH, FRAME_CHANNELS, every=RECORD_EVERY, meta={"num_agents": NUM_AGENTS})
+    frame = 0
+
     running = True
     while running:
         # --- INPUT HANDLING ---
@@ -23,16 +73,14 @@ def main():
             if event.type == pygame.QUIT:
                 running = False
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r: # Reset
-                    main()
-                    return
+                handle_key(pygame.key.name(event.key), voxels)
 
         mouse_pressed = pygame.mouse.get_pressed()[0]
         mouse_pos = pygame.math.Vector2(pygame.mouse.get_pos())
 
         # --- UPDATE LOOP ---
         screen.fill(BG_COLOR)
-        
+
         # Debug Grid (Optional Visual)
         if DEBUG_MODE:
             # Draw cursor vacuum range
@@ -44,8 +92,14 @@ def main():
             v.update(voxels, mouse_pressed, mouse_pos)
             v.draw(screen)
 
+        # --- RECORD (copy only; a writer thread compresses) ---
+        frame += 1
+        slot = recorder.acquire(frame) if recorder is not None else None
+        if slot is not None:
+            write_frame(slot, voxels)
+            recorder.commit()
+
         # --- DEBUG INFO ---
-        font = pygame.font.SysFont("monospace", 15)
         solid_count = sum(1 for v in voxels if v.state == "SOLID")
         text = font.render(f"VOXELS: {NUM_AGENTS} | SOLID: {solid_count} | LIQUID: {NUM_AGENTS - solid_count}", True, (255, 255, 255))
         screen.blit(text, (10, 10))
@@ -53,8 +107,204 @@ def main():
         pygame.display.flip()
         clock.tick(60)
 
+    if recorder is not None:
+        recorder.close()
+    pygame.quit()
+    sys.exit()
+
+def replay(path):
+    """Plays a recording through Voxel.draw; no physics"""
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Project Vajra: Replay")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont("monospace", 15)
+
+    player = TrajectoryPlayer(path)
+    voxels = [Voxel(i, 0, 0) for i in range(player.reader.channels["pos"][1][0])]
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                player.handle_key(pygame.key.name(event.key))
+
+        frame, arrays = player.advance()
+        read_frame(arrays, voxels)
+        screen.fill(BG_COLOR)
+        for v in voxels:
+            v.draw(screen)
+
+        text = font.render(f"{player.status()} | {KEYS}", True, (255, 255, 255))
+        screen.blit(text, (10, 10))
+
+        pygame.display.flip()
+        clock.tick(60)
+
+    player.close()
+    pygame.quit()
+    sys.exit()
+
+def split():
+    """Draws frames published by sim_process, which steps the voxels on its own core"""
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Project Vajra: Split Mode")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont("monospace", 15)
+
+    frames = SharedFrameBuffer(FRAME_CHANNELS)
+    sim, inbox, stop = start_process(sim_process, frames)
+    meter = RateMeter()
+    voxels = [Voxel(i, 0, 0) for i in range(NUM_AGENTS)]
+    mouse = None
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                inbox.put(("key", pygame.key.name(event.key)))
+        mouse_pos, mouse_pressed = pygame.mouse.get_pos(), pygame.mouse.get_pressed()[0]
+        if (mouse_pos, mouse_pressed) != mouse: # Vacuum: only send changes
+            mouse = (mouse_pos, mouse_pressed)
+            inbox.put(("mouse",) + mouse)
+
+        seq, frame, arrays = frames.latest()
+        screen.fill(BG_COLOR)
+        if DEBUG_MODE and mouse_pressed:
+            pygame.draw.circle(screen, (50, 50, 50), mouse_pos, 60, 1)
+        if seq > 0:
+            read_frame(arrays, voxels)
+            for v in voxels:
+                v.draw(screen)
+
+        solid_count = sum(1 for v in voxels if v.state == "SOLID")
+        text = font.render(f"VOXELS: {NUM_AGENTS} | SOLID: {solid_count} | SIM: {meter.update(seq):.0f} steps/s", True, (255, 255, 255))
+        screen.blit(text, (10, 10))
+
+        pygame.display.flip()
+        clock.tick(60)
+
+    stop.set()
+    sim.join()
+    frames.close()
+    pygame.quit()
+    sys.exit()
+
+def sim_process(spec, inbox, stop):
+    """Split mode: the voxels only, publishing each step to the shared frame buffer"""
+    frames = SharedFrameBuffer(*spec)
+    voxels = [Voxel(i, *random_spawn_point()) for i in range(NUM_AGENTS)]
+    recorder = None
+    if RECORD_PATH:
+        recorder = TrajectoryRecorder(RECORD_PATH, FRAME_CHANNELS, every=RECORD_EVERY, meta={"num_agents": NUM_AGENTS})
+    pacer = Pacer(SPLIT_SIM_RATE)
+    mouse_pos, mouse_pressed = pygame.math.Vector2(0, 0), False
+    frame = 0
+    while not stop.is_set():
+        for event in drain(inbox):
+            if event[0] == "mouse":
+                mouse_pos, mouse_pressed = pygame.math.Vector2(event[1]), event[2]
+            else:
+                handle_key(event[1], voxels)
+        for v in voxels:
+            v.update(voxels, mouse_pressed, mouse_pos)
+        frame += 1
+        slot = recorder.acquire(frame) if recorder is not None else None
+        if slot is not None:
+            write_frame(slot, voxels)
+            recorder.commit()
+        write_frame(frames.back(), voxels)
+        frames.publish(frame)
+        pacer.wait()
+    if recorder is not None:
+        recorder.close()
+    frames.close()
+
+def run_tiled(tiles):
+    """Steps the voxels on one process per tile; the Voxel objects are only synced to draw"""
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption(f"Project Vajra: {tiles[0]}x{tiles[1]} Tiles")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont("monospace", 15)
+
+    voxels = [Voxel(i, *random_spawn_point()) for i in range(NUM_AGENTS)]
+    engine = TileEngine(TiledVoxels(), state_arrays(voxels), tiles)
+    meter = RateMeter()
+    recorder = None
+    if RECORD_PATH:
+        recorder = TrajectoryRecorder(RECORD_PATH, FRAME_CHANNELS, every=RECORD_EVERY, meta={"num_agents": NUM_AGENTS})
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                handle_key(pygame.key.name(event.key), voxels)
+                engine.load(state_arrays(voxels))
+
+        mouse_pos, mouse_pressed = pygame.mouse.get_pos(), pygame.mouse.get_pressed()[0]
+        engine.step((*mouse_pos, mouse_pressed))
+        set_state_arrays(voxels, engine.arrays)
+
+        screen.fill(BG_COLOR)
+        if DEBUG_MODE and mouse_pressed:
+            pygame.draw.circle(screen, (50, 50, 50), mouse_pos, 60, 1)
+        for v in voxels:
+            v.draw(screen)
+
+        slot = recorder.acquire(engine.steps) if recorder is not None else None
+        if slot is not None:
+            write_frame(slot, voxels)
+            recorder.commit()
+
+        solid_count = sum(1 for v in voxels if v.state == "SOLID")
+        text = font.render(f"VOXELS: {NUM_AGENTS} | SOLID: {solid_count} | {meter.update(engine.steps):.0f} steps/s", True, (255, 255, 255))
+        screen.blit(text, (10, 10))
+
+        pygame.display.flip()
+        clock.tick(60)
+
+    engine.close()
+    if recorder is not None:
+        recorder.close()
     pygame.quit()
     sys.exit()
 
+def headless(max_frames, vacuum_frames, done_fraction):
+    """Sweep run (vajra_common.sweep): vacuum at the screen centre for vacuum_frames, no window"""
+    voxels = [Voxel(i, *random_spawn_point()) for i in range(NUM_AGENTS)]
+    centre = pygame.math.Vector2(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+
+    def step(frame):
+        for v in voxels:
+            v.update(voxels, frame <= vacuum_frames, centre)
+
+    return run_headless(step, lambda: sum(v.state == "SOLID" for v in voxels) / len(voxels),
+                        max_frames, done_fraction, "solid")
+
+def tiled():
+    """Tile benchmark (vajra_common.tiles): the model and a start state"""
+    return TiledVoxels(), state_arrays([Voxel(i, *random_spawn_point()) for i in range(NUM_AGENTS)])
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replay", metavar="TRAJECTORY", help="Play a recording instead of simulating")
+    parser.add_argument("--split", action="store_true", help="Voxels in their own process")
+    parser.add_argument("--tiles", type=parse_tiles, metavar="COLSxROWS",
+                        help="Step the voxels on one process per screen tile, e.g. 2x2")
+    args = parser.parse_args()
+    if args.replay:
+        replay(args.replay)
+    elif args.split:
+        split()
+    elif args.tiles:
+        run_tiled(args.tiles)
+    else:
+        main()
@@ -0,0 +1,134 @@
+import math
+import numpy as np
+from config import *
+from checkpoint import STATES, NUM_FACES
+from vajra_common.tiles import pair_blocks, scale_to
+
+LIQUID, SOLID = STATES.index("LIQUID"), STATES.index("SOLID")
+NONE = np.iinfo(np.int64).max
+
+class TiledVoxels:
+    """
+    Voxel.update and Face.scan in numpy, stepped by vajra_common.tiles.TileEngine.
+    Every voxel sees the others as they were at the end of the last step, so
+    the tile layout changes nothing but float rounding.
+
+    A latch is a request (my face, partner face) since the partner may live
+    in another tile. Each face ends up with at most one partner: when several
+    voxels dock onto the same face in one step, the lowest face id wins, and
+    only the winners turn solid and snap in front of their partner (resolve).
+    Faces are numbered voxel * NUM_FACES + face, as in checkpoint.py.
+    """
+    channels = {"pos": (np.float64, (2,)), "vel": (np.float64, (2,)), "state": (np.int8, ()), # Index into STATES
+                "face_locked": (np.bool_, (NUM_FACES,)), "face_partner": (np.int32, (NUM_FACES,))}
+    requests_per_agent = NUM_FACES
+
+    def __init__(self):
+        # Settings are copied here so they reach the tile processes
+        self.bounds = (SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.max_speed = MAX_SPEED
+        self.perception = VOXEL_RADIUS * 4
+        self.scan_radius = VOXEL_RADIUS * 3
+        self.face_range = FACE_RANGE
+        self.separation, self.cohesion = FORCE_SEPARATION, FORCE_COHESION
+        angles = np.radians(30 + 60 * np.arange(NUM_FACES))
+        self.look = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        self.face_offset = self.look * VOXEL_RADIUS * (math.sqrt(3) / 2) # Face centres
+        self.dock_offset = self.look * VOXEL_RADIUS * math.sqrt(3) # Centre to centre (snap_to_neighbor)
+        # Faces that count as facing each other
+        self.facing = [[m for m in range(NUM_FACES) if self.look[k] @ self.look[m] < -ALIGNMENT_TOLERANCE]
+                       for k in range(NUM_FACES)]
+        self.radius = self.perception
+        self.max_move = MAX_SPEED + NUM_FACES * FACE_RANGE # A move, then up to one snap per face
+
+    def step(self, own, cand, cur, nxt, inputs):
+        nxt["vel"][own[cur["state"][own] == SOLID]] = 0 # Freeze physics
+        live = own[cur["state"][own] == LIQUID]
+        if len(live) == 0:
+            return None
+        pos, vel = cur["pos"][live], cur["vel"][live]
+        others = cur["pos"][cand]
+
+        # 1. LIQUID PHYSICS (separation + cohesion over the perception radius)
+        acc = np.zeros_like(pos)
+        for rows in pair_blocks(len(live), len(cand)):
+            dx = pos[rows, 0, None] - others[None, :, 0]
+            dy = pos[rows, 1, None] - others[None, :, 1]
+            d2 = dx * dx + dy * dy
+            near = ((d2 < self.perception ** 2) & (live[rows, None] != cand[None])).astype(np.float64)
+            total = near.sum(1)[:, None]
+            weight = near / np.where(d2 > 0, d2, np.inf) # Weight by distance
+            sep = pos[rows] * weight.sum(1)[:, None] - weight @ others
+            coh = near @ others / np.maximum(total, 1.0) - pos[rows]
+            sep = np.where(total > 0, scale_to(sep, self.max_speed), sep)
+            coh = np.where(total > 0, scale_to(coh, self.max_speed), 0.0)
+            acc[rows] = sep * self.separation + coh * self.cohesion
+
+        vel += acc
+        speed = np.hypot(vel[:, 0], vel[:, 1])[:, None]
+        vel = np.where(speed > self.max_speed, vel * (self.max_speed / np.where(speed > 0, speed, 1.0)), vel)
+        pos += vel
+        x, y = pos[:, 0], pos[:, 1]
+        x[x > self.bounds[0]] = 0
+        x[x < 0] = self.bounds[0]
+        y[y > self.bounds[1]] = 0
+        y[y < 0] = self.bounds[1]
+
+        # 2. SIGNAL RECEIVING: vacuum
+        solid = np.zeros(len(live), dtype=bool)
+        if inputs[2]:
+            solid |= np.hypot(x - inputs[0], y - inputs[1]) < 60
+
+        # 3. SIGNAL RECEIVING: faces touching an open, facing face (first voxel, then face, in id order)
+        moved = pos.copy() # Docks are only requests here; resolve() snaps the winners
+        other_solid, other_locked = cur["state"][cand] == SOLID, cur["face_locked"][cand]
+        my_locked = cur["face_locked"][live]
+        requests = []
+        for rows in pair_blocks(len(live), len(cand)):
+            start = pos[rows].copy() # The neighbour list is taken before any snap
+            d2 = ((start[:, 0, None] - others[None, :, 0]) ** 2 + (start[:, 1, None] - others[None, :, 1]) ** 2)
+            scan = (d2 < self.scan_radius ** 2) & (live[rows, None] != cand[None])
+            block = pos[rows] # A view: snaps move the voxel for its later faces
+            for k in range(NUM_FACES):
+                best = np.full(len(block), NONE) # Candidate index * NUM_FACES + partner face
+                for m in self.facing[k]:
+                    gap = (block[:, None] + self.face_offset[k]) - (others[None] + self.face_offset[m])
+                    touch = scan & ~other_locked[None, :, m] & (np.hypot(gap[..., 0], gap[..., 1]) < self.face_range)
+                    best = np.minimum(best, np.where(touch.any(1), touch.argmax(1) * NUM_FACES + m, NONE))
+                hit = np.flatnonzero((best != NONE) & ~my_locked[rows, k]) # A latched face doesn't scan
+                j, m = best[hit] // NUM_FACES, best[hit] % NUM_FACES
+                dock = hit[other_solid[j]]
+                j, m = j[other_solid[j]], m[other_solid[j]]
+                if len(dock):
+                    # The partner is solid: request a latch, and scan the later faces as if snapped
+                    block[dock] = others[j] + self.dock_offset[m]
+                    requests.append(np.stack([live[rows.start + dock] * NUM_FACES + k, cand[j] * NUM_FACES + m], axis=1))
+
+        nxt["pos"][live] = moved
+        nxt["vel"][live] = vel
+        nxt["state"][live] = np.where(solid, SOLID, LIQUID)
+        return np.concatenate(requests) if requests else None
+
+    def resolve(self, requests, mine, nxt):
+        # One winner per partner face: the lowest requesting face
+        order = np.lexsort((requests[:, 0], requests[:, 1]))
+        requests = requests[order]
+        first = np.ones(len(requests), dtype=bool)
+        first[1:] = requests[1:, 1] != requests[:-1, 1]
+        won = requests[first]
+
+        # Winners catch the jamming and snap in front of the partner face (the last face, as in the scan)
+        dock = won[mine[won[:, 0] // NUM_FACES]]
+        dock = dock[np.argsort(dock[:, 0], kind="stable")]
+        voxel = dock[:, 0] // NUM_FACES
+        last = np.ones(len(dock), dtype=bool)
+        last[:-1] = voxel[1:] != voxel[:-1]
+        voxel, partner = voxel[last], dock[last, 1]
+        nxt["state"][voxel] = SOLID
+        nxt["pos"][voxel] = nxt["pos"][partner // NUM_FACES] + self.dock_offset[partner % NUM_FACES]
+
+        for me, partner in ((won[:, 0], won[:, 1]), (won[:, 1], won[:, 0])):
+            keep = mine[me // NUM_FACES]
+            voxel, face = me[keep] // NUM_FACES, me[keep] % NUM_FACES
+            nxt["face_locked"][voxel, face] = True
+            nxt["face_partner"][voxel, face] = partner[keep]
@@ -8,8 +8,7 @@ class Voxel:
     def __init__(self, id, x, y):
         self.id = id
         self.pos = pygame.math.Vector2(x, y)
-        angle = random.uniform(0, math.pi * 2)
-        self.vel = pygame.math.Vector2(math.cos(angle), math.sin(angle))
+        self.vel = pygame.math.Vector2(0, 0)
         self.acc = pygame.math.Vector2(0, 0)
         
         self.state = "LIQUID" # or "SOLID"
@@ -20,6 +19,18 @@ class Voxel:
         for i in range(6):
             self.faces.append(Face(self, 30 + (i * 60)))
 
+        self.reset(x, y)
+
+    def reset(self, x, y):
+        """Return this voxel to a fresh LIQUID state without reallocating it"""
+        self.pos.update(x, y)
+        angle = random.uniform(0, math.pi * 2)
+        self.vel.update(math.cos(angle), math.sin(angle))
+        self.acc.update(0, 0)
+        self.state = "LIQUID"
+        for face in self.faces:
+            face.reset()
+
     def apply_force(self, force):
         self.acc += force
 